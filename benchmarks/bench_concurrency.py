@@ -0,0 +1,71 @@
+import threading
+import time
+import numpy as np
+import pydacq.rolling_buffer
+#bench_concurrency.py
+
+"""
+###############################################################################
+RollingBuffer writer latency under reader contention
+
+one writer calls add_new in a tight loop while N readers pull get_all,
+reports add_new latency percentiles per lock strategy
+
+run from the repo root with pydacq importable:
+  python benchmarks/bench_concurrency.py
+"""
+
+def bench_contention( concurrency, readers, length = 10000, dimensions = 64,
+    duration = 1.0 ):
+  """
+  -----------------------------------------------------------------------------
+  add_new latencies in microseconds and total reads, 1 writer N readers
+  """
+  rbuffer = pydacq.rolling_buffer.RollingBuffer( concurrency )
+  rbuffer.reset( length, dimensions, ring = True )
+  frame = np.random.rand( dimensions )
+
+  running = [ True ]
+  reads = [ 0 ] * readers
+
+  def read_loop( n ):
+    while running[0]:
+      rbuffer.get_all()
+      reads[n] += 1
+
+  threads = [ threading.Thread( target = read_loop, args = ( n, ) )
+    for n in range( readers ) ]
+  for thread in threads:
+    thread.start()
+
+  latencies = []
+  stop_at = time.time() + duration
+  i = 0
+  while time.time() < stop_at:
+    start = time.time()
+    rbuffer.add_new( i, frame )
+    latencies.append( time.time() - start )
+    i += 1
+
+  running[0] = False
+  for thread in threads:
+    thread.join()
+
+  return np.array( latencies ) * 1e6, sum( reads )
+
+def main():
+  print( '%8s %8s %10s %10s %10s %10s %10s' % ( 'strategy', 'readers',
+    'inserts', 'p50 us', 'p99 us', 'max us', 'reads' ) )
+
+  for concurrency in ( 'lock', 'rwlock', 'seqlock' ):
+    for readers in ( 0, 1, 4, 8 ):
+      latencies, reads = bench_contention( concurrency, readers )
+      print( '%8s %8d %10d %10.1f %10.1f %10.1f %10d' % (
+        concurrency, readers, len( latencies ),
+        np.percentile( latencies, 50 ),
+        np.percentile( latencies, 99 ),
+        np.max( latencies ),
+        reads ) )
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,93 @@
+import socket
+import threading
+import time
+import pydacq.acquisition_manager
+import pydacq.polling_acquisition
+#bench_manager.py
+
+"""
+###############################################################################
+Many socket sources, a PollingAquisition each vs. one AcquisitionManager
+
+the same total message rate, sent at an even pace, is spread over more and
+more sources, reports threads used and the latency from send to write
+(p50 / p99)
+
+run from the repo root with pydacq importable:
+  python benchmarks/bench_manager.py
+"""
+
+def percentile( values, p ):
+  values = sorted( values )
+  return values[ min( len( values ) - 1, int( len( values ) * p / 100.0 ) ) ]
+
+def bench_sources( method, count, rate = 5000, rounds = 20 ):
+  """
+  -----------------------------------------------------------------------------
+  ( threads, p50, p99 ) send to write latency in ms, rate messages/s in all
+  """
+  pairs = [ socket.socketpair() for i in range( count ) ]
+  latencies = []
+  lock = threading.Lock()
+
+  def write_fn( packet ):
+    now = time.time()
+    lock.acquire()
+    latencies.extend( now - float( sent ) for sent in
+      packet.decode( 'ascii' ).split( ';' ) if sent )
+    lock.release()
+
+  threads = threading.active_count()
+  if method == 'per_source':
+    sources = []
+    for reader, writer in pairs:
+      reader.settimeout( 0.1 )
+      pacq = pydacq.polling_acquisition.PollingAquisition()
+      pacq.setup( 100 )
+      pacq.read = ( lambda reader: lambda: reader.recv( 4096 ) )( reader )
+      pacq.write = write_fn
+      pacq.start()
+      sources.append( pacq )
+  else:
+    manager = pydacq.acquisition_manager.AcquisitionManager( workers = 4 )
+    for reader, writer in pairs:
+      manager.add( ( lambda reader: lambda: reader.recv( 4096 ) )( reader ),
+        write_fn, fileobj = reader )
+    manager.start()
+  threads = threading.active_count() - threads
+
+  # every source in turn, count / rate s apart, spread evenly rather than in
+  # one burst, so the load per ms is the same at every source count
+  began = time.time()
+  for i in range( rounds * count ):
+    wait = began + i / float( rate ) - time.time()
+    if wait > 0:
+      time.sleep( wait )
+    pairs[ i % count ][1].send( ( '%.6f;' % time.time() ).encode( 'ascii' ) )
+  time.sleep( 0.2 )
+
+  if method == 'per_source':
+    for pacq in sources:
+      pacq._keep_running = False
+    for pacq in sources:
+      pacq.stop()
+  else:
+    manager.stop()
+  for pair in pairs:
+    for end in pair:
+      end.close()
+
+  return threads, 1e3 * percentile( latencies, 50 ), \
+    1e3 * percentile( latencies, 99 )
+
+def main():
+  print( '%12s %8s %8s %10s %10s' % ( 'method', 'sources', 'threads',
+    'p50 ms', 'p99 ms' ) )
+
+  for count in ( 10, 100, 400 ):
+    for method in ( 'per_source', 'manager' ):
+      threads, p50, p99 = bench_sources( method, count )
+      print( '%12s %8d %8d %10.3f %10.3f' % ( method, count, threads, p50, p99 ) )
+
+if __name__ == '__main__':
+  main()
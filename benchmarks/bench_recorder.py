@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+import numpy as np
+import pydacq.recorder
+#bench_recorder.py
+
+"""
+###############################################################################
+Recording throughput, a file write per packet vs. the chunked Recorder
+
+reports frames per second and MB/s for a few frame sizes
+
+run from the repo root with pydacq importable:
+  python benchmarks/bench_recorder.py
+"""
+
+def bench_recording( method, shape, frames = 20000 ):
+  """
+  -----------------------------------------------------------------------------
+  frames per second and MB/s written
+  """
+  path = os.path.join( tempfile.gettempdir(), 'bench_recorder_%d' % os.getpid() )
+  frame = np.random.rand( *np.atleast_1d( shape ) )
+
+  start = time.time()
+  if method == 'per_packet':
+    # what a naive write() callback does, unbuffered
+    with open( path, 'wb', 0 ) as f:
+      for i in range( frames ):
+        f.write( np.float64( i ).tobytes() )
+        f.write( frame.tobytes() )
+  else:
+    recorder = pydacq.recorder.Recorder( path )
+    recorder.open( shape )
+    for i in range( frames ):
+      recorder.add_new( i, frame )
+    recorder.close()
+  elapsed = time.time() - start
+
+  megabytes = frames * ( 8 + frame.nbytes ) / 1e6
+  for leftover in ( path, pydacq.recorder.index_path( path ) ):
+    if os.path.exists( leftover ):
+      os.remove( leftover )
+  return frames / elapsed, megabytes / elapsed
+
+def main():
+  print( '%12s %8s %14s %10s' % ( 'method', 'shape', 'frames/s', 'MB/s' ) )
+
+  for shape in ( 4, 64, 1024 ):
+    for method in ( 'per_packet', 'recorder' ):
+      rate, bandwidth = bench_recording( method, shape )
+      print( '%12s %8d %14.0f %10.1f' % ( method, shape, rate, bandwidth ) )
+
+if __name__ == '__main__':
+  main()
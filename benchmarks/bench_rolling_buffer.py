@@ -0,0 +1,96 @@
+import time
+import numpy as np
+import pydacq.rolling_buffer
+#bench_rolling_buffer.py
+
+"""
+###############################################################################
+RollingBuffer insert/read throughput, roll vs. ring storage, and the add
+cost of rolling_stats
+
+run from the repo root with pydacq importable:
+  python benchmarks/bench_rolling_buffer.py
+"""
+
+def bench_add_new( length, dimensions, ring, inserts = 2000 ):
+  """
+  -----------------------------------------------------------------------------
+  inserts per second for add_new
+  """
+  rbuffer = pydacq.rolling_buffer.RollingBuffer()
+  rbuffer.reset( length, dimensions, ring = ring )
+  frame = np.random.rand( *np.atleast_1d( dimensions ) )
+
+  start = time.time()
+  for i in range( inserts ):
+    rbuffer.add_new( i, frame )
+  elapsed = time.time() - start
+
+  return inserts / elapsed
+
+def bench_get_all( length, dimensions, ring, reads = 50 ):
+  """
+  -----------------------------------------------------------------------------
+  mean get_all latency in ms
+  """
+  rbuffer = pydacq.rolling_buffer.RollingBuffer()
+  rbuffer.reset( length, dimensions, ring = ring )
+  frame = np.random.rand( *np.atleast_1d( dimensions ) )
+
+  # get_all cost does not depend on fill level, a few items will do
+  for i in range( 100 ):
+    rbuffer.add_new( i, frame )
+
+  start = time.time()
+  for i in range( reads ):
+    rbuffer.get_all()
+  elapsed = time.time() - start
+
+  return 1000.0 * elapsed / reads
+
+def bench_rolling_stats( length, dimensions, inserts = 20000 ):
+  """
+  -----------------------------------------------------------------------------
+  ( mean, max ) add_new latency in ms on a ring with rolling_stats, the max
+  shows any stall at a block boundary
+  """
+  rbuffer = pydacq.rolling_buffer.RollingBuffer()
+  rbuffer.reset( length, dimensions, ring = True, rolling_stats = True )
+  frame = np.random.rand( *np.atleast_1d( dimensions ) )
+
+  # fill it, then time adds that evict
+  rbuffer.add_many( np.arange( length ), np.random.rand( length, dimensions ) )
+  worst = 0
+  start = time.time()
+  for i in range( inserts ):
+    began = time.time()
+    rbuffer.add_new( length + i, frame )
+    worst = max( worst, time.time() - began )
+  elapsed = time.time() - start
+
+  return 1000.0 * elapsed / inserts, 1000.0 * worst
+
+def main():
+  print( '%8s %6s %6s %14s %14s' %
+    ( 'length', 'dims', 'mode', 'inserts/s', 'get_all ms' ) )
+
+  for length in ( 1000, 10000, 100000 ):
+    for dimensions in ( 4, 64 ):
+      for ring in ( False, True ):
+        # keep the slow roll path short on big buffers
+        inserts = 50 if ( length > 10000 and not ring ) else 2000
+        print( '%8d %6d %6s %14.0f %14.3f' % (
+          length, dimensions, 'ring' if ring else 'roll',
+          bench_add_new( length, dimensions, ring, inserts ),
+          bench_get_all( length, dimensions, ring ) ) )
+
+  print( '' )
+  print( '%8s %6s %14s %14s' %
+    ( 'length', 'dims', 'stats add ms', 'stats max ms' ) )
+  for length in ( 1000, 10000, 100000 ):
+    for dimensions in ( 4, 64 ):
+      print( '%8d %6d %14.4f %14.3f' % ( ( length, dimensions ) +
+        bench_rolling_stats( length, dimensions ) ) )
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,313 @@
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+import numpy as np
+import pydacq.metrics
+import pydacq.polling_acquisition
+import pydacq.rolling_buffer
+#bench_suite.py
+
+"""
+###############################################################################
+Hot path benchmark suite with machine readable results
+
+sweeps RollingBuffer length, frame dimensions, frame dtype and reader count,
+and the poll -> queue -> write pipeline over producer rate and transport.
+Reports inserts/s, read latency, end to end latency percentiles and memory,
+pure CPython, no hardware needed.
+
+run from the repo root with pydacq importable:
+  python benchmarks/bench_suite.py --output before.json
+  python benchmarks/bench_suite.py --output after.json --compare before.json
+
+--quick runs a reduced sweep, e.g. as a smoke test
+"""
+
+# sweeps, ( full, quick )
+LENGTHS    = ( ( 1000, 10000, 100000 ), ( 1000, ) )
+DIMENSIONS = ( ( 4, 64, ( 32, 32 ) ), ( 4, ( 8, 8 ) ) )
+DTYPES     = ( ( 'int16', 'float32', 'float64' ), ( 'float64', ) )
+READERS    = ( ( 0, 1, 4 ), ( 0, 2 ) )
+RATES      = ( ( 1000, 10000, 0 ), ( 1000, 0 ) ) # packets/s, 0 unthrottled
+
+# keys identifying a result, everything else is a measurement
+PARAMETERS = ( 'bench', 'length', 'dimensions', 'dtype', 'mode',
+  'concurrency', 'readers', 'rate', 'transport' )
+
+# measurements where smaller is better, for --compare
+LOWER_IS_BETTER = ( '_us', '_bytes', 'overflows', '_depth' )
+
+def latency_summary( prefix, seconds ):
+  """
+  -----------------------------------------------------------------------------
+  p50 / p99 / max of latencies in seconds, as microseconds keyed by prefix
+  """
+  microseconds = np.asarray( seconds ) * 1e6
+  if not len( microseconds ):
+    microseconds = np.zeros( 1 )
+  return {
+    prefix + '_p50_us' : float( np.percentile( microseconds, 50 ) ),
+    prefix + '_p99_us' : float( np.percentile( microseconds, 99 ) ),
+    prefix + '_max_us' : float( np.max( microseconds ) ),
+  }
+
+def bench_buffer( length, dimensions, dtype, ring, duration ):
+  """
+  -----------------------------------------------------------------------------
+  add_new rate, get_latest / get_all latency and memory of one buffer
+  """
+  rbuffer = pydacq.rolling_buffer.RollingBuffer()
+  rbuffer.reset( length, dimensions, ring = ring, dtype = dtype )
+  frame = ( 100 * np.random.rand( *np.atleast_1d( dimensions ) ) ).astype(
+    dtype )
+  clock = pydacq.metrics.clock
+
+  # inserts, the roll path is O(length) so stop on time rather than count
+  inserts = 0
+  start = clock()
+  while inserts < 100 or clock() - start < duration:
+    rbuffer.add_new( inserts, frame )
+    inserts += 1
+  elapsed = clock() - start
+
+  latest = []
+  for i in range( 1000 ):
+    began = clock()
+    rbuffer.get_latest()
+    latest.append( clock() - began )
+
+  get_all = []
+  start = clock()
+  while len( get_all ) < 5 or clock() - start < duration:
+    began = clock()
+    rbuffer.get_all()
+    get_all.append( clock() - began )
+
+  result = {
+    'inserts_per_s' : inserts / elapsed,
+    'buffer_bytes'  : int( rbuffer._timestamps.nbytes + rbuffer._data.nbytes ),
+  }
+  result.update( latency_summary( 'get_latest', latest ) )
+  result.update( latency_summary( 'get_all', get_all ) )
+  return result
+
+def bench_readers( concurrency, readers, length, dimensions, duration ):
+  """
+  -----------------------------------------------------------------------------
+  add_new latency with N threads pulling get_all, and their read rate
+  """
+  rbuffer = pydacq.rolling_buffer.RollingBuffer( concurrency )
+  rbuffer.reset( length, dimensions, ring = True )
+  frame = np.random.rand( *np.atleast_1d( dimensions ) )
+  clock = pydacq.metrics.clock
+
+  running = [ True ]
+  reads = [ 0 ] * readers
+
+  def read_loop( n ):
+    while running[0]:
+      rbuffer.get_all()
+      reads[n] += 1
+
+  threads = [ threading.Thread( target = read_loop, args = ( n, ) )
+    for n in range( readers ) ]
+  for thread in threads:
+    thread.start()
+
+  latencies = []
+  start = clock()
+  while clock() - start < duration:
+    began = clock()
+    rbuffer.add_new( len( latencies ), frame )
+    latencies.append( clock() - began )
+  elapsed = clock() - start
+
+  running[0] = False
+  for thread in threads:
+    thread.join()
+
+  result = {
+    'inserts_per_s' : len( latencies ) / elapsed,
+    'reads_per_s'   : sum( reads ) / elapsed,
+  }
+  result.update( latency_summary( 'add_new', latencies ) )
+  return result
+
+def bench_pipeline( transport, rate, dimensions, duration ):
+  """
+  -----------------------------------------------------------------------------
+  read -> queue -> write through a PollingAquisition at a producer rate
+
+  every packet carries its read time, write measures the end to end latency
+  """
+  clock = pydacq.metrics.clock
+  shape = tuple( np.atleast_1d( dimensions ) )
+  size = int( np.prod( shape ) )
+  latencies = []
+  due = [ None ]
+
+  def read():
+    if rate:
+      # pace the producer, sleeping keeps the GIL free for the consumer
+      due[0] = max( due[0] or clock(), clock() - 0.01 ) + 1.0 / rate
+      wait = due[0] - clock()
+      if wait > 0:
+        time.sleep( wait )
+    packet = np.empty( size + 1 )
+    packet[0] = clock()
+    return packet
+
+  def write_batch( packets ):
+    now = clock()
+    for packet in packets:
+      latencies.append( now - packet[0] )
+
+  pacq = pydacq.polling_acquisition.PollingAquisition()
+  pacq.setup( 10000, batch_size = 64,
+    shape = ( size + 1 ) if transport == 'ring' else None )
+  pacq.read = read
+  pacq.write_batch = write_batch
+
+  pacq.start()
+  time.sleep( duration )
+  stats = pacq.stats()
+  pacq.stop()
+
+  result = {
+    'read_per_s'       : stats[ 'read_rate' ],
+    'written_per_s'    : stats[ 'write_rate' ],
+    'overflows'        : stats[ 'overflows' ],
+    'peak_queue_depth' : stats[ 'peak_queue_depth' ],
+  }
+  result.update( latency_summary( 'end_to_end', latencies ) )
+  return result
+
+def run_suite( quick = False, duration = None, report = None ):
+  """
+  -----------------------------------------------------------------------------
+  run every sweep, returns the list of results
+
+  report( result ) is called as each result comes in
+  """
+  pick = 1 if quick else 0
+  if duration is None:
+    duration = 0.05 if quick else 0.5
+  report = report or ( lambda result: None )
+  results = []
+
+  def add( parameters, measurements ):
+    # round trip through JSON so keys compare equal to loaded results
+    result = json.loads( json.dumps( parameters ) )
+    result.update( measurements )
+    results.append( result )
+    report( result )
+
+  for length in LENGTHS[ pick ]:
+    for dimensions in DIMENSIONS[ pick ]:
+      for dtype in DTYPES[ pick ]:
+        for mode in ( 'roll', 'ring' ):
+          add( { 'bench' : 'buffer', 'length' : length,
+              'dimensions' : dimensions, 'dtype' : dtype, 'mode' : mode },
+            bench_buffer( length, dimensions, dtype, mode == 'ring',
+              duration ) )
+
+  for concurrency in ( 'lock', 'rwlock', 'seqlock' ):
+    for readers in READERS[ pick ]:
+      add( { 'bench' : 'readers', 'concurrency' : concurrency,
+          'readers' : readers, 'length' : LENGTHS[ pick ][0],
+          'dimensions' : 64 },
+        bench_readers( concurrency, readers, LENGTHS[ pick ][0], 64,
+          duration ) )
+
+  for transport in ( 'queue', 'ring' ):
+    for rate in RATES[ pick ]:
+      add( { 'bench' : 'pipeline', 'transport' : transport, 'rate' : rate,
+          'dimensions' : 64 },
+        bench_pipeline( transport, rate, 64, 2 * duration ) )
+
+  return results
+
+def environment():
+  """
+  -----------------------------------------------------------------------------
+  what the results were measured on
+  """
+  return {
+    'time'     : time.strftime( '%Y-%m-%dT%H:%M:%S' ),
+    'python'   : platform.python_version(),
+    'impl'     : platform.python_implementation(),
+    'numpy'    : np.__version__,
+    'platform' : platform.platform(),
+    'machine'  : platform.machine(),
+  }
+
+def result_key( result ):
+  """
+  -----------------------------------------------------------------------------
+  parameters identifying a result, comparable across runs
+  """
+  return tuple( str( result.get( name ) ) for name in PARAMETERS )
+
+def compare( results, baseline ):
+  """
+  -----------------------------------------------------------------------------
+  print measurements that changed by more than 10% against a baseline run
+  """
+  previous = dict( ( result_key( result ), result ) for result in baseline )
+  print( '\nchanges against baseline (ratio new/old, + better, - worse)' )
+  for result in results:
+    old = previous.get( result_key( result ) )
+    if old is None:
+      continue
+    for name in sorted( result ):
+      if name in PARAMETERS or not old.get( name ):
+        continue
+      ratio = result[ name ] / float( old[ name ] )
+      if abs( ratio - 1 ) < 0.1:
+        continue
+      lower = name.endswith( LOWER_IS_BETTER )
+      better = ( ratio < 1 ) == lower
+      print( '  %s %-60s %-20s %8.2f' % ( '+' if better else '-',
+        describe( result ), name, ratio ) )
+
+def describe( result ):
+  """
+  -----------------------------------------------------------------------------
+  short one line description of the parameters of a result
+  """
+  return ' '.join( '%s=%s' % ( name, result[ name ] )
+    for name in PARAMETERS if name in result )
+
+def print_result( result ):
+  measurements = ' '.join( '%s=%.4g' % ( name, result[ name ] )
+    for name in sorted( result ) if name not in PARAMETERS )
+  print( '%s\n    %s' % ( describe( result ), measurements ) )
+  sys.stdout.flush()
+
+def main():
+  parser = argparse.ArgumentParser(
+    description = 'RollingBuffer and PollingAquisition hot path benchmarks' )
+  parser.add_argument( '--quick', action = 'store_true',
+    help = 'reduced sweep' )
+  parser.add_argument( '--duration', type = float,
+    help = 'seconds per measurement' )
+  parser.add_argument( '--output', help = 'write results as JSON' )
+  parser.add_argument( '--compare', help = 'JSON results to compare with' )
+  args = parser.parse_args()
+
+  results = run_suite( args.quick, args.duration, print_result )
+
+  if args.output:
+    with open( args.output, 'w' ) as output:
+      json.dump( { 'environment' : environment(), 'quick' : args.quick,
+        'results' : results }, output, indent = 1, sort_keys = True )
+
+  if args.compare:
+    with open( args.compare ) as baseline:
+      compare( results, json.load( baseline )[ 'results' ] )
+
+if __name__ == '__main__':
+  main()
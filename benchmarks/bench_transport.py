@@ -0,0 +1,61 @@
+import Queue
+import threading
+import time
+import numpy as np
+import pydacq.packet_ring
+#bench_transport.py
+
+"""
+###############################################################################
+Packet transport between the polling threads, Queue.Queue vs. PacketRing
+
+one producer thread puts same shaped numpy packets, the consumer takes
+them one by one (get) or in blocks (get_many), reports packets per second
+
+run from the repo root with pydacq importable:
+  python benchmarks/bench_transport.py
+"""
+
+def bench_transport( transport, shape, packets = 50000, size = 1000,
+    batch = 256 ):
+  """
+  -----------------------------------------------------------------------------
+  packets per second through the transport
+  """
+  if transport == 'queue':
+    channel = Queue.Queue( maxsize = size )
+  else:
+    channel = pydacq.packet_ring.PacketRing( size, shape )
+
+  packet = np.random.rand( *np.atleast_1d( shape ) )
+
+  def produce():
+    for i in range( packets ):
+      channel.put( packet, True, 1.0 )
+
+  producer = threading.Thread( target = produce )
+
+  start = time.time()
+  producer.start()
+  received = 0
+  while received < packets:
+    if transport == 'ring_many':
+      received += len( channel.get_many( batch, 1.0 ) )
+    else:
+      channel.get( True, 1.0 )
+      received += 1
+  producer.join()
+  elapsed = time.time() - start
+
+  return packets / elapsed
+
+def main():
+  print( '%10s %8s %14s' % ( 'transport', 'shape', 'packets/s' ) )
+
+  for shape in ( 4, 64, 1024 ):
+    for transport in ( 'queue', 'ring', 'ring_many' ):
+      print( '%10s %8d %14.0f' % ( transport, shape,
+        bench_transport( transport, shape ) ) )
+
+if __name__ == '__main__':
+  main()
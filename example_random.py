@@ -51,7 +51,7 @@ curve2 = randplot.plot(pen='r')
 
 
 def update():
-    ts_arr, data_arr = Buffer.get_all()
+    ts_arr, data_arr = Buffer.get_snapshot()
     curve1.setData( data_arr[:,0] )
     curve2.setData( data_arr[:,1] )
 
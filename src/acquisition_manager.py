@@ -0,0 +1,642 @@
+import heapq
+import select
+import socket
+import threading
+import multiprocessing.pool
+try:
+  import Queue
+except ImportError:
+  import queue as Queue
+#acquisition_manager.py
+
+try:
+  from . import metrics
+  from .polling_acquisition import PollingAquisition
+except ( ImportError, ValueError ):
+  import metrics
+  from polling_acquisition import PollingAquisition
+
+class ManagedSource( PollingAquisition ):
+  """
+  #############################################################################
+  One source of an AcquisitionManager, see AcquisitionManager.add
+
+  a PollingAquisition without threads of its own, the manager's workers
+  call read when its file object is readable (or its period is due),
+  publish into its queue and ship batches out to write / write_batch. It
+  keeps its own queue, overflow policy, counters and stats().
+  """
+
+  _data_in_timeout  = 0 # ms, a worker never waits for queue space
+  _block_timeout    = 100 # ms per wait for space under 'block'
+  _read_fn          = None
+  _write_fn         = None
+  _write_batch_fn   = None
+  _fileobj          = None # read when this is readable
+  _period           = None # ms between reads of a polled source
+  _backoff          = None # ms, current read error backoff
+  _registered       = False # in the manager's selector
+  _removed          = False
+  _draining         = False # a worker is shipping its queue out
+  _drain_lock       = None
+  _schedule_delay   = None # histogram of time from ready / due to read
+
+  def __init__( self, read, write = None, write_batch = None, fileobj = None,
+      period = None ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._read_fn = read
+    self._write_fn = write
+    self._write_batch_fn = write_batch
+    self._fileobj = fileobj
+    self._period = period
+    self._drain_lock = threading.Lock()
+    self._schedule_delay = metrics.Histogram()
+    pass
+
+  def setup( self, size = None, batch_size = None, overflow = None ):
+    """
+    ---------------------------------------------------------------------------
+    setup function, queue size, batching and overflow policy, 'block'
+    holds the worker that read the packet until there is space
+    """
+    if not PollingAquisition.setup( self, size, batch_size, 0,
+        overflow = overflow ):
+      return False
+    # a put that cannot wait would spin under 'block', the other policies
+    # never hold a worker
+    self._data_in_timeout = self._block_timeout \
+      if self._overflow_policy == 'block' else 0
+    return True
+
+  def start( self ):
+
+    self._keep_running = True
+    self._data_in_running = False
+    self._running = True
+    self._stop_event = threading.Event()
+    self._backoff = self._backoff_min
+
+    self._reset_counters()
+    self._schedule_delay.reset()
+
+    pass
+
+  def stop( self ):
+    self._keep_running = False
+    if self._stop_event:
+      self._stop_event.set()
+    self._running = False
+    pass
+
+  def stats( self ):
+    """
+    ---------------------------------------------------------------------------
+    PollingAquisition.stats plus schedule_delay, the time from the source
+    becoming readable (or due) to a worker reading it
+    """
+    stats = PollingAquisition.stats( self )
+    stats[ 'schedule_delay' ] = self._schedule_delay.summary()
+    return stats
+
+  def read( self ):
+    return self._read_fn()
+
+  def write( self, packet ):
+    if self._write_fn:
+      self._write_fn( packet )
+
+  def write_batch( self, packets ):
+    if self._write_batch_fn:
+      self._write_batch_fn( packets )
+    else:
+      PollingAquisition.write_batch( self, packets )
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _read_once( self, ready ):
+    """
+    ---------------------------------------------------------------------------
+    one read, published into the queue, False if read failed
+    """
+    began = metrics.clock()
+    self._schedule_delay.add( began - ready )
+    try:
+      packet = self.read()
+    except:
+      self._count( '_read_errors' )
+      return False
+    self._read_time.add( metrics.clock() - began )
+
+    if packet is not None:
+      for subscription in self._subscriptions:
+        subscription._publish( packet )
+      self._publish( packet )
+    return True
+
+  def _take( self ):
+    """
+    ---------------------------------------------------------------------------
+    up to batch_size queued packets without waiting
+    """
+    packets = []
+    while len( packets ) < self._batch_size:
+      try:
+        packets.append( self._queue.get_nowait() )
+      except Queue.Empty:
+        break
+    return self._unstamp( packets )
+
+
+class _Poller():
+  """
+  #############################################################################
+  The part of a selector the manager needs, on select.epoll where there is
+  one (Linux), select.poll (no limit on file descriptor numbers) or
+  select.select otherwise, so it runs on Python 2 and 3 alike
+
+  with epoll a oneshot registration stays registered but reports once,
+  until whoever read it calls rearm, which takes effect right away even
+  while another thread is waiting in select. Without epoll oneshot is
+  False and the caller unregisters a reported file object instead
+  """
+
+  oneshot = False # register( oneshot = True ) and rearm are supported
+  _epoll = None # select.epoll object
+  _poll  = None # select.poll object, None for both to use select.select
+  _data  = None # fd -> data handed back by select
+  _fds   = None # id( fileobj ) -> fd, a closed fileobj has no fileno
+
+  def __init__( self ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._data = {}
+    self._fds = {}
+    if hasattr( select, 'epoll' ):
+      self._epoll = select.epoll()
+      self.oneshot = True
+    elif hasattr( select, 'poll' ):
+      self._poll = select.poll()
+    pass
+
+  def register( self, fileobj, data, oneshot = False ):
+    """
+    ---------------------------------------------------------------------------
+    wait for fileobj to become readable, raises if it is closed or already
+    registered, oneshot only applies where self.oneshot is True
+    """
+    fd = fileobj if isinstance( fileobj, int ) else fileobj.fileno()
+    if fd < 0:
+      raise ValueError( 'closed file object' )
+    if fd in self._data:
+      raise KeyError( fd )
+    if self._epoll is not None:
+      self._epoll.register( fd, self._events( oneshot ) )
+    elif self._poll is not None:
+      self._poll.register( fd, select.POLLIN )
+    self._data[ fd ] = data
+    self._fds[ id( fileobj ) ] = fd
+
+  def rearm( self, fileobj ):
+    """
+    ---------------------------------------------------------------------------
+    report a oneshot registered fileobj again the next time it is readable,
+    safe to call from any thread, raises if it is closed or not registered
+    """
+    self._epoll.modify( self._fds[ id( fileobj ) ], self._events( True ) )
+
+  def unregister( self, fileobj ):
+    fd = self._fds.pop( id( fileobj ) )
+    del self._data[ fd ]
+    if self._epoll is not None:
+      self._epoll.unregister( fd )
+    elif self._poll is not None:
+      self._poll.unregister( fd )
+
+  def select( self, timeout = None ):
+    """
+    ---------------------------------------------------------------------------
+    data of the readable file objects, waits up to timeout s, None forever
+    """
+    try:
+      if self._epoll is not None:
+        # rounded up to the next ms like poll, a due timer is not polled
+        # for in a busy loop
+        timeout = -1 if timeout is None else int( 1000 * timeout + 1 ) / 1e3
+        fds = [ fd for fd, event in self._epoll.poll( timeout ) ]
+      elif self._poll is not None:
+        if timeout is not None:
+          # in ms, rounded up so a due timer is not polled for in a busy loop
+          timeout = int( 1000 * timeout ) + 1
+        fds = [ fd for fd, event in self._poll.poll( timeout ) ]
+      else:
+        fds = select.select( list( self._data ), [], [], timeout )[0]
+    except ( select.error, IOError, OSError, ValueError ):
+      if self._epoll is not None or self._poll is not None:
+        # interrupted
+        return []
+      # a closed fd, hand them all out, reading the closed one fails
+      fds = list( self._data )
+    return [ self._data[ fd ] for fd in fds if fd in self._data ]
+
+  def close( self ):
+    if self._epoll is not None:
+      self._epoll.close()
+    self._data = {}
+    self._fds = {}
+    self._epoll = None
+    self._poll = None
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _events( self, oneshot ):
+    if oneshot:
+      return select.EPOLLIN | select.EPOLLONESHOT
+    return select.EPOLLIN
+
+
+class AcquisitionManager():
+  """
+  #############################################################################
+  Many acquisition sources on one selector thread and a small worker pool
+
+  instead of two threads per PollingAquisition, sources with a file object
+  (socket, pipe, serial port) are registered with a selector and read by a
+  pool worker when they become readable, polled sources are read every
+  `period` ms. A source is never read or written by two workers at once,
+  so its packets stay in order, and each source keeps its own queue,
+  overflow policy and stats. The thread count depends on workers only (plus
+  the selector thread and the pool's own handler threads), not on the
+  number of sources, latency grows only once the workers are saturated.
+
+  With epoll (Linux) a source stays registered and the worker that read it
+  rearms it itself, elsewhere it is handed back to the selector thread
+  after every read.
+  """
+
+  _workers      = 4
+  _sources      = () # ManagedSource per source, replaced on change
+  _running      = False
+  _keep_running = False
+
+  # selector thread
+  _thread       = None
+  _selector     = None
+  _wakeup       = None # socketpair, a byte on it ends a select early
+  _timers       = None # heap of ( due, count, source ), selector thread only
+  _timer_count  = 0 # tie breaker for equal due times
+  _pending      = None # ( due, source ) handed to the selector thread
+  _pending_lock = None
+
+  # workers
+  _pool         = None
+  _busy         = 0 # tasks submitted and not finished
+  _idle         = None # condition, notified when a task finishes
+
+  def __init__( self, workers = None ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    if workers:
+      self._workers = workers
+    self._pending = []
+    self._pending_lock = threading.Lock()
+    self._idle = threading.Condition()
+    pass
+
+  def __del__( self ):
+    """
+    ---------------------------------------------------------------------------
+    Make sure the threads stop
+    """
+    self.stop()
+    pass
+
+  def add( self, read, write = None, write_batch = None, fileobj = None,
+      period = None, size = None, batch_size = None, overflow = None ):
+    """
+    ---------------------------------------------------------------------------
+    add a source, returns its ManagedSource, None for bad settings
+
+    read() is called when fileobj is readable, or every period ms if there
+    is no fileobj, and may return None when it has nothing. Packets go
+    through the source's own queue of `size` to write( packet ), or to
+    write_batch( packets ) with batch_size > 1, see PollingAquisition.setup
+    """
+    if ( fileobj is None ) == ( period is None ):
+      return None
+    source = ManagedSource( read, write, write_batch, fileobj, period )
+    if not source.setup( size, batch_size, overflow ):
+      return None
+
+    # replaced, not changed, stats may be iterating the old one
+    self._sources = self._sources + ( source, )
+    if self._running:
+      source.start()
+      self._rearm( source, metrics.clock() )
+    return source
+
+  def remove( self, source ):
+    """
+    ---------------------------------------------------------------------------
+    stop reading a source, packets already queued are still written
+    """
+    if source not in self._sources:
+      return False
+    self._sources = tuple( other for other in self._sources
+      if other is not source )
+    source._removed = True
+    if self._running:
+      # the selector thread drops it from the selector
+      self._rearm( source, 0 )
+    source.stop()
+    return True
+
+  def sources( self ):
+    return self._sources
+
+  def start( self ):
+
+    self._keep_running = True
+    self._running = True
+
+    self._selector = _Poller()
+    self._wakeup = socket.socketpair()
+    for end in self._wakeup:
+      end.setblocking( False )
+    self._selector.register( self._wakeup[0], None )
+    self._timers = []
+    self._pending = []
+    self._pool = multiprocessing.pool.ThreadPool( self._workers )
+
+    now = metrics.clock()
+    for source in self._sources:
+      source.start()
+      self._rearm( source, now )
+
+    self._thread = threading.Thread( target = self._select_loop )
+    self._thread.daemon = True
+    self._thread.start()
+
+    pass
+
+  def stop( self ):
+    if not self._running:
+      return
+    self._keep_running = False
+    self._wake()
+
+    if self._thread:
+      self._thread.join()
+    self._thread = None
+
+    # reads in flight still publish, their packets still get written
+    self._idle.acquire()
+    while self._busy:
+      self._idle.wait()
+    self._idle.release()
+    self._pool.close()
+    self._pool.join()
+    self._pool = None
+
+    for source in self._sources:
+      source.stop()
+      source._registered = False
+    self._selector.close()
+    for end in self._wakeup:
+      end.close()
+    self._selector = None
+    self._wakeup = None
+
+    self._running = False
+    pass
+
+  def stats( self ):
+    """
+    ---------------------------------------------------------------------------
+    worker and source counts, and per source stats(), in add order
+    """
+    return {
+      'workers' : self._workers,
+      'sources' : [ source.stats() for source in self._sources ],
+    }
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _select_loop( self ):
+    """
+    ---------------------------------------------------------------------------
+    loop that waits for readable sources and due timers, hands them to the
+    workers and takes sources back when the workers are done with them
+    """
+    while self._keep_running:
+      timeout = None
+      if self._timers:
+        timeout = max( 0, self._timers[0][0] - metrics.clock() )
+
+      ready = []
+      events = self._selector.select( timeout )
+      now = metrics.clock()
+      for source in events:
+        if source is None:
+          self._clear_wakeup()
+          continue
+        if not self._selector.oneshot:
+          # one worker at a time, the source comes back through _rearm
+          self._unregister( source )
+        ready.append( ( source, now ) )
+
+      self._pending_lock.acquire()
+      pending, self._pending = self._pending, []
+      self._pending_lock.release()
+      for due, source in pending:
+        if source._removed:
+          if source._registered:
+            self._unregister( source )
+        elif source._fileobj is not None and due <= now:
+          self._register( source, now )
+        else:
+          self._timer_count += 1
+          heapq.heappush( self._timers, ( due, self._timer_count, source ) )
+
+      now = metrics.clock()
+      while self._timers and self._timers[0][0] <= now:
+        due, count, source = heapq.heappop( self._timers )
+        if source._removed:
+          continue
+        if source._fileobj is not None:
+          self._register( source, now )
+        else:
+          ready.append( ( source, due ) )
+
+      # a task per source, a slow one does not hold up the others
+      for source, due in ready:
+        self._submit( self._service, source, due )
+    pass
+
+  def _register( self, source, now ):
+    """
+    ---------------------------------------------------------------------------
+    wait for a source to become readable, a oneshot registration is kept
+    and only rearmed
+    """
+    try:
+      if source._registered:
+        self._selector.rearm( source._fileobj )
+      else:
+        self._selector.register( source._fileobj, source, oneshot = True )
+        source._registered = True
+    except ( ValueError, KeyError, IOError, OSError ):
+      # e.g. closed, try again after the backoff
+      source._count( '_read_errors' )
+      self._timer_count += 1
+      heapq.heappush( self._timers, ( now + source._backoff / 1000.0,
+        self._timer_count, source ) )
+      source._backoff = min( 2 * source._backoff, source._backoff_max )
+
+  def _unregister( self, source ):
+    try:
+      self._selector.unregister( source._fileobj )
+    except ( ValueError, KeyError, IOError, OSError ):
+      # closed by its owner meanwhile
+      pass
+    source._registered = False
+
+  def _service( self, source, ready ):
+    """
+    ---------------------------------------------------------------------------
+    read a source, hand it back for the next read, then ship its queue out
+    """
+    if not self._keep_running or source._removed:
+      return
+
+    read = source._read_once( ready )
+    now = metrics.clock()
+    if read:
+      source._backoff = source._backoff_min
+      due = now if source._period is None else \
+        max( ready + source._period / 1000.0, now )
+    else:
+      due = now + source._backoff / 1000.0
+      source._backoff = min( 2 * source._backoff, source._backoff_max )
+
+    # hand the source back first, it can be read again while this worker
+    # writes, then write here unless another worker already is
+    if self._keep_running and not ( due <= now and
+        self._rearm_readable( source ) ):
+      self._rearm( source, due )
+    if self._claim_drain( source ):
+      self._drain( source )
+
+  def _rearm_readable( self, source ):
+    """
+    ---------------------------------------------------------------------------
+    have the selector report a source with a file object again, straight
+    from the worker that read it, True if the selector supports that
+    """
+    if source._fileobj is None or not self._selector.oneshot:
+      return False
+    try:
+      self._selector.rearm( source._fileobj )
+      return True
+    except ( ValueError, KeyError, IOError, OSError ):
+      # removed or closed meanwhile, left to the selector thread
+      return False
+
+  def _claim_drain( self, source ):
+    """
+    ---------------------------------------------------------------------------
+    True if the caller is now the one worker shipping the source's queue out
+    """
+    source._drain_lock.acquire()
+    try:
+      if source._draining or not source._queue.qsize():
+        return False
+      source._draining = True
+      return True
+    finally:
+      source._drain_lock.release()
+
+  def _drain( self, source ):
+    """
+    ---------------------------------------------------------------------------
+    write out batches until the source's queue is empty, by the worker
+    that claimed it
+    """
+    while True:
+      packets = source._take()
+      if len( packets ):
+        source._ship( packets )
+
+      # packets published after the check get a drain of their own
+      source._drain_lock.acquire()
+      try:
+        if not source._queue.qsize():
+          source._draining = False
+          return
+      finally:
+        source._drain_lock.release()
+
+  def _submit( self, function, *args ):
+    """
+    ---------------------------------------------------------------------------
+    run function( *args ) on a worker, counted until it finishes
+    """
+    self._idle.acquire()
+    self._busy += 1
+    self._idle.release()
+    self._pool.apply_async( self._run, ( function, ) + args )
+
+  def _run( self, function, *args ):
+    try:
+      function( *args )
+    finally:
+      self._idle.acquire()
+      self._busy -= 1
+      self._idle.notify_all()
+      self._idle.release()
+
+  def _rearm( self, source, due ):
+    """
+    ---------------------------------------------------------------------------
+    hand a source back to the selector thread, to be read from `due` on
+    """
+    self._pending_lock.acquire()
+    idle = not self._pending
+    self._pending.append( ( due, source ) )
+    self._pending_lock.release()
+    if idle:
+      # otherwise a wakeup is on its way already
+      self._wake()
+
+  def _wake( self ):
+    """
+    ---------------------------------------------------------------------------
+    end the selector thread's wait right away
+    """
+    try:
+      self._wakeup[1].send( b'\0' )
+    except ( socket.error, TypeError ):
+      # a full socketpair wakes it just as well, or it is already stopped
+      pass
+
+  def _clear_wakeup( self ):
+    try:
+      while self._wakeup[0].recv( 4096 ):
+        pass
+    except socket.error:
+      pass
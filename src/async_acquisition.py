@@ -0,0 +1,165 @@
+import asyncio
+#async_acquisition.py
+
+class AsyncPollingAquisition():
+  """
+  #############################################################################
+  asyncio counterpart of PollingAquisition
+
+  read() and write() are coroutines run as two tasks on the caller's event
+  loop with a bounded asyncio.Queue between them, so one loop can service
+  many sources (sockets etc.) without two OS threads each. Python 3 only.
+  """
+
+  """
+  *****************
+  VARIABLES
+  """
+
+  # operational vars
+  _queue_size       = 1000 # number of items to queue
+  _data_in_timeout  = 100 # ms
+  _backoff_min      = 1 # ms to back off after a read/write error
+  _backoff_max      = 100 # ms, backoff doubles per error up to this
+  _queue            = None
+
+  # tasks
+  _data_in_task     = None
+  _data_out_task    = None
+
+  # run flags
+  _keep_running     = None
+  _running          = None
+
+  # tracking
+  _packets_read     = 0
+  _packets_written  = 0
+
+  _overflows        = 0
+  _read_errors      = 0
+  _write_errors     = 0
+
+  """
+  *****************
+  API
+  """
+
+  def setup( self, size = None ):
+    """
+    ---------------------------------------------------------------------------
+    setup function, establish
+    """
+    if size:
+      self._queue_size = size
+
+    self._packets_read     = 0
+    self._overflows        = 0
+    self._read_errors      = 0
+    self._write_errors     = 0
+
+    return True
+
+  async def start( self ):
+    """
+    ---------------------------------------------------------------------------
+    start the read and write tasks on the running event loop
+    """
+    self._keep_running = True
+    self._running = True
+
+    self._packets_read     = 0
+    self._packets_written  = 0
+    self._overflows        = 0
+    self._read_errors      = 0
+    self._write_errors     = 0
+
+    # the queue binds to the running loop, so it is made here
+    self._queue = asyncio.Queue( maxsize = self._queue_size )
+
+    self._data_in_task = asyncio.ensure_future( self._data_in_loop() )
+    self._data_out_task = asyncio.ensure_future( self._data_out_loop() )
+
+  async def stop( self ):
+    """
+    ---------------------------------------------------------------------------
+    cancel the tasks and wait for them to finish
+    """
+    self._keep_running = False
+
+    tasks = [ task for task in ( self._data_in_task, self._data_out_task )
+      if task ]
+    for task in tasks:
+      task.cancel()
+    await asyncio.gather( *tasks, return_exceptions = True )
+
+    self._data_in_task = None
+    self._data_out_task = None
+    self._running = False
+
+  """
+  *****************
+  OVERRIDES
+  """
+
+  async def read( self ):
+    return 0
+
+  async def write( self, packet ):
+    return 0
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  async def _data_in_loop( self ):
+    """
+    ---------------------------------------------------------------------------
+    task that polls for data
+    """
+    backoff = self._backoff_min
+    while self._keep_running:
+      try:
+
+        packet = await self.read()
+        backoff = self._backoff_min
+        try:
+          self._queue.put_nowait( packet )
+        except asyncio.QueueFull:
+          # only pay for a timeout when the queue is actually full
+          try:
+            await asyncio.wait_for( self._queue.put( packet ),
+              self._data_in_timeout / 1000.0 )
+          except asyncio.TimeoutError:
+            # drop the packet and poll on
+            self._overflows += 1
+            continue
+        self._packets_read += 1
+
+      except asyncio.CancelledError:
+        raise
+      except Exception:
+        self._read_errors += 1
+        await asyncio.sleep( backoff / 1000.0 )
+        backoff = min( 2 * backoff, self._backoff_max )
+
+  async def _data_out_loop( self ):
+    """
+    ---------------------------------------------------------------------------
+    task that ships data out to destination
+    """
+    backoff = self._backoff_min
+    while self._keep_running:
+      packet = await self._queue.get()
+      try:
+        await self.write( packet )
+        self._packets_written += 1
+        backoff = self._backoff_min
+      except asyncio.CancelledError:
+        raise
+      except Exception:
+        self._write_errors += 1
+        await asyncio.sleep( backoff / 1000.0 )
+        backoff = min( 2 * backoff, self._backoff_max )
+      finally:
+        self._queue.task_done()
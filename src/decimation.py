@@ -0,0 +1,217 @@
+import numpy as np
+#decimation.py
+
+def merge_points( timestamps, mins, maxs, n_points ):
+  """
+  -----------------------------------------------------------------------------
+  envelope points, newest first, merged in runs of neighbours down to at
+  most n_points, each keeps the newest timestamp of its run
+  """
+  if len( timestamps ) <= n_points:
+    return timestamps, mins, maxs
+  run = -( -len( timestamps ) // n_points )
+  starts = np.arange( 0, len( timestamps ), run )
+  return (
+    timestamps[ starts ],
+    np.minimum.reduceat( mins, starts, axis = 0 ),
+    np.maximum.reduceat( maxs, starts, axis = 0 )
+  )
+
+class MinMaxTiers():
+  """
+  #############################################################################
+  Incrementally maintained min/max envelope of a rolling buffer
+
+  tier k keeps, per block of factor**(k+1) consecutive items, the element
+  wise min and max and the timestamp of the newest item. Items are folded
+  into tier 0, a completed block is folded into the next tier up, so an add
+  costs one min/max per item plus a share of the coarser tiers. Blocks are
+  addressed by the global item index, the same for roll and ring storage.
+  """
+
+  _factor  = 8
+  _length  = None # items held by the buffer
+  _sizes   = None # items per block, per tier
+  _slots   = None # blocks kept, per tier
+  _tiers   = None # per tier ( timestamps, mins, maxs ), slot indexed
+
+  def __init__( self, length, item_shape, factor = 8, timestamp_dtype = float ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor, tiers up to the block size that still fits the buffer,
+    timestamps are kept in the buffer's timestamp dtype
+    """
+    self._factor = factor
+    self._length = length
+    self._sizes = []
+    self._slots = []
+    self._tiers = []
+
+    size = factor
+    while size <= length:
+      # a block may straddle each end of the buffer
+      slots = length // size + 2
+      self._sizes.append( size )
+      self._slots.append( slots )
+      self._tiers.append( (
+        np.zeros( slots, dtype = timestamp_dtype ),
+        np.zeros( ( slots, ) + tuple( item_shape ) ),
+        np.zeros( ( slots, ) + tuple( item_shape ) ) ) )
+      size *= factor
+    pass
+
+  def add( self, index, timestamps, block ):
+    """
+    ---------------------------------------------------------------------------
+    fold in consecutive items, oldest first, the first has global `index`
+    """
+    if not len( timestamps ):
+      return
+    children = ( index, timestamps, block, block )
+    for tier in range( len( self._tiers ) ):
+      children = self._fold( tier, *children )
+      if children is None:
+        break
+
+  def add_one( self, index, timestamp, item ):
+    """
+    ---------------------------------------------------------------------------
+    fold in a single item with global `index`, the add_new fast path
+    """
+    if not self._tiers:
+      return
+    timestamps, mins, maxs = self._tiers[0]
+    slot = ( index // self._factor ) % self._slots[0]
+    if index % self._factor:
+      low = mins[ slot ]
+      high = maxs[ slot ]
+      np.minimum( low, item, out = low )
+      np.maximum( high, item, out = high )
+    else:
+      mins[ slot ] = item
+      maxs[ slot ] = item
+    timestamps[ slot ] = timestamp
+
+    if index % self._factor == self._factor - 1 and len( self._tiers ) > 1:
+      # the block is complete, cascade it up
+      children = ( index // self._factor, timestamps[ slot:slot + 1 ],
+        mins[ slot:slot + 1 ], maxs[ slot:slot + 1 ] )
+      for tier in range( 1, len( self._tiers ) ):
+        children = self._fold( tier, *children )
+        if children is None:
+          break
+
+  def envelope( self, count, n_points ):
+    """
+    ---------------------------------------------------------------------------
+    ( timestamps, mins, maxs ) of at most n_points blocks, newest first
+
+    count is the number of items added so far, if even the coarsest tier
+    needs more than n_points blocks neighbouring blocks of it are merged
+    into n_points points. None if a tier would not
+    reduce the buffer below n_points, read the items themselves then. The
+    oldest block is left out once items of it have rolled off the buffer.
+    """
+    oldest = max( 0, count - self._length )
+    for tier, size in enumerate( self._sizes ):
+      first = ( oldest + size - 1 ) // size
+      last = ( count - 1 ) // size
+      if last - first + 1 <= n_points:
+        break
+    else:
+      if not self._sizes:
+        return None
+    if count - oldest <= n_points or last < first:
+      return None
+
+    timestamps, mins, maxs = self._tiers[ tier ]
+    slots = np.arange( last, first - 1, -1 ) % self._slots[ tier ]
+    timestamps = timestamps[ slots ]
+    mins = mins[ slots ]
+    maxs = maxs[ slots ]
+
+    # the newest block only holds completed children, fold in the partial
+    # blocks below it, each nested in the one above
+    newest_min = None
+    for lower in range( tier, -1, -1 ):
+      size = self._sizes[ lower ]
+      child = self._sizes[ lower - 1 ] if lower else 1
+      block = ( count - 1 ) // size
+      if ( count - block * size ) // child == 0:
+        # no child completed yet, the slot holds an older block
+        continue
+      lower_timestamps, lower_mins, lower_maxs = self._tiers[ lower ]
+      slot = block % self._slots[ lower ]
+      if newest_min is None:
+        newest_min = lower_mins[ slot ].copy()
+        newest_max = lower_maxs[ slot ].copy()
+      else:
+        np.minimum( newest_min, lower_mins[ slot ], out = newest_min )
+        np.maximum( newest_max, lower_maxs[ slot ], out = newest_max )
+      newest_time = lower_timestamps[ slot ]
+    mins[0] = newest_min
+    maxs[0] = newest_max
+    timestamps[0] = newest_time
+
+    # more blocks than n_points only in the coarsest tier
+    return merge_points( timestamps, mins, maxs, n_points )
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _fold( self, tier, start, timestamps, mins, maxs ):
+    """
+    ---------------------------------------------------------------------------
+    fold consecutive children, the first numbered `start`, into a tier
+
+    returns the tier's blocks completed by them as children of the next
+    tier, None if none completed
+    """
+    factor = self._factor
+    tier_timestamps, tier_mins, tier_maxs = self._tiers[ tier ]
+    slot_count = self._slots[ tier ]
+
+    if len( timestamps ) == 1:
+      # single child, no segmenting needed
+      slot = ( start // factor ) % slot_count
+      if start % factor:
+        np.minimum( tier_mins[ slot ], mins[0], out = tier_mins[ slot ] )
+        np.maximum( tier_maxs[ slot ], maxs[0], out = tier_maxs[ slot ] )
+      else:
+        tier_mins[ slot ] = mins[0]
+        tier_maxs[ slot ] = maxs[0]
+      tier_timestamps[ slot ] = timestamps[0]
+      if start % factor != factor - 1:
+        return None
+      return ( start // factor, tier_timestamps[ slot:slot + 1 ],
+        tier_mins[ slot:slot + 1 ], tier_maxs[ slot:slot + 1 ] )
+
+    # split the children at block boundaries
+    count = len( timestamps )
+    offset = ( -start ) % factor
+    starts = np.arange( offset, count, factor )
+    if offset:
+      starts = np.concatenate( ( [ 0 ], starts ) )
+    ends = np.append( starts[ 1: ], count )
+    blocks = ( start + starts ) // factor
+    slots = blocks % slot_count
+
+    segment_mins = np.minimum.reduceat( mins, starts, axis = 0 )
+    segment_maxs = np.maximum.reduceat( maxs, starts, axis = 0 )
+    if start % factor:
+      # the first segment continues a block already in the tier
+      np.minimum( segment_mins[0], tier_mins[ slots[0] ], out = segment_mins[0] )
+      np.maximum( segment_maxs[0], tier_maxs[ slots[0] ], out = segment_maxs[0] )
+    tier_mins[ slots ] = segment_mins
+    tier_maxs[ slots ] = segment_maxs
+    tier_timestamps[ slots ] = timestamps[ ends - 1 ]
+
+    # every segment but a short last one completes its block
+    complete = len( starts ) if ( start + count ) % factor == 0 else \
+      len( starts ) - 1
+    if not complete:
+      return None
+    return ( blocks[0], timestamps[ ends[ :complete ] - 1 ],
+      segment_mins[ :complete ], segment_maxs[ :complete ] )
@@ -0,0 +1,229 @@
+import socket
+import numpy as np
+#line_reader.py
+
+try:
+  from .polling_acquisition import PollingAquisition
+except ( ImportError, ValueError ):
+  from polling_acquisition import PollingAquisition
+
+class LineParser():
+  """
+  #############################################################################
+  Reassemble a byte stream into lines and parse them in bulk
+
+  feed( data ) keeps the unfinished last line for the next call and parses
+  every complete line of the chunk at once: one split into fields, one
+  reshape into rows, one float conversion of the selected columns. Lines
+  with the wrong number of fields or unparsable values are counted and
+  left out.
+  """
+
+  _separator   = b','
+  _columns     = None # field indices to keep, None for all
+  _fields      = None # fields per line, learned from the lines if not given
+  _learn       = True # _fields was not given, learn it again after reset
+  _partial     = b'' # bytes after the last newline
+  _max_partial = 1 << 20 # bytes, a longer unfinished line is dropped
+  _bad_lines   = 0
+
+  def __init__( self, columns = None, separator = ',', fields = None ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._separator = separator.encode( 'ascii' ) \
+      if not isinstance( separator, bytes ) else separator
+    self._columns = list( columns ) if columns is not None else None
+    self._fields = fields
+    self._learn = fields is None
+    self._partial = b''
+    self._bad_lines = 0
+    pass
+
+  def feed( self, data ):
+    """
+    ---------------------------------------------------------------------------
+    parse the lines completed by data, returns a (n, columns) float block
+    """
+    buffered = self._partial + data
+    end = buffered.rfind( b'\n' )
+    if end < 0:
+      if len( buffered ) > self._max_partial:
+        # not a line protocol, or a lost newline, start over
+        self._bad_lines += 1
+        buffered = b''
+      self._partial = buffered
+      return self._empty()
+    self._partial = buffered[ end + 1: ]
+
+    lines = np.array( buffered[ :end ].replace( b'\r', b'' ).split( b'\n' ) )
+    lines = lines[ np.char.str_len( lines ) > 0 ]
+    if not len( lines ):
+      return self._empty()
+
+    separators = np.char.count( lines, self._separator )
+    if self._fields is None:
+      # the most common count, a first line cut off mid way does not decide
+      fields = int( np.bincount( separators ).argmax() ) + 1
+      if self._columns is not None and not all( -fields <= column < fields
+          for column in self._columns ):
+        # too few fields for the columns, learn from the next lines
+        self._bad_lines += len( lines )
+        return self._empty()
+      self._fields = fields
+    matching = separators == self._fields - 1
+    self._bad_lines += int( len( lines ) - np.count_nonzero( matching ) )
+    if not matching.any():
+      return self._empty()
+    if not matching.all():
+      lines = lines[ matching ]
+
+    fields = np.array( self._separator.join( lines ).split(
+      self._separator ) ).reshape( len( lines ), self._fields )
+    if self._columns is not None:
+      fields = fields[ :, self._columns ]
+    return self._to_float( fields )
+
+  def pending( self ):
+    """
+    ---------------------------------------------------------------------------
+    bytes of the unfinished line waiting for its newline
+    """
+    return len( self._partial )
+
+  def bad_lines( self ):
+    return self._bad_lines
+
+  def reset( self ):
+    """
+    ---------------------------------------------------------------------------
+    drop the unfinished line, e.g. after a reconnect, and the learned
+    number of fields
+    """
+    self._partial = b''
+    if self._learn:
+      self._fields = None
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _empty( self ):
+    width = len( self._columns ) if self._columns is not None else \
+      ( self._fields or 0 )
+    return np.zeros( ( 0, width ) )
+
+  def _to_float( self, fields ):
+    """
+    ---------------------------------------------------------------------------
+    rows of byte strings as floats, rows that do not parse are left out
+    """
+    try:
+      return fields.astype( float )
+    except ValueError:
+      pass
+
+    # rare, find the bad rows one by one
+    rows = []
+    for row in fields:
+      try:
+        rows.append( row.astype( float ) )
+      except ValueError:
+        self._bad_lines += 1
+    if not rows:
+      return np.zeros( ( 0, fields.shape[1] ) )
+    return np.array( rows )
+
+
+class SocketAquisition( PollingAquisition ):
+  """
+  #############################################################################
+  PollingAquisition reading a text line protocol from a TCP or UDP socket
+
+  every read receives up to chunk_size bytes and returns all complete lines
+  in them as one (n, columns) block, so write gets batches of samples (use
+  RollingBuffer.add_many there). A read that times out returns None and
+  queues nothing. A closed TCP connection is a read error, the reader
+  backs off and reconnects.
+  """
+
+  _address     = None # ( host, port ), connected to for TCP, bound for UDP
+  _udp         = False
+  _chunk_size  = 65536 # bytes per recv
+  _socket      = None
+  _parser      = None
+
+  def __init__( self, address, columns = None, separator = ',', udp = False,
+      chunk_size = None ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor, columns picks the fields to keep from each line
+    """
+    PollingAquisition.__init__( self )
+    self._address = address
+    self._udp = udp
+    if chunk_size:
+      self._chunk_size = chunk_size
+    self._parser = LineParser( columns, separator )
+    pass
+
+  def connect( self ):
+    """
+    ---------------------------------------------------------------------------
+    open the socket, False if that failed
+    """
+    self.shutdown()
+    try:
+      if self._udp:
+        self._socket = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+        self._socket.bind( self._address )
+      else:
+        self._socket = socket.create_connection( self._address,
+          self._data_in_timeout / 1000.0 )
+    except socket.error:
+      self._socket = None
+      return False
+
+    # a read returns at least every _data_in_timeout so stop is noticed
+    self._socket.settimeout( self._data_in_timeout / 1000.0 )
+    self._parser.reset()
+    return True
+
+  def start( self ):
+    if self._socket is None:
+      self.connect()
+    PollingAquisition.start( self )
+
+  def bad_lines( self ):
+    return self._parser.bad_lines()
+
+  """
+  *****************
+  OVERRIDES
+  """
+
+  def read( self ):
+    if self._socket is None and not self.connect():
+      raise IOError( 'cannot connect to %s:%d' % tuple( self._address ) )
+
+    try:
+      data = self._socket.recv( self._chunk_size )
+    except socket.timeout:
+      return None
+    if not data and not self._udp:
+      # the peer closed the connection, reconnect on the next read
+      self.shutdown()
+      raise IOError( 'connection closed' )
+
+    block = self._parser.feed( data )
+    if not len( block ):
+      return None
+    return block
+
+  def shutdown( self ):
+    if self._socket is not None:
+      self._socket.close()
+    self._socket = None
+    return True
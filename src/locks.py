@@ -0,0 +1,159 @@
+import threading as th
+import time
+#locks.py
+
+"""
+###############################################################################
+Lock strategies for shared data structures
+
+All locks share the writer interface acquire() / release() and the reader
+interface acquire_read() / release_read(). The SeqLock adds an optimistic
+reader interface read_begin() / read_retry( sequence ).
+"""
+
+class MutexLock:
+  """
+  #############################################################################
+  Plain mutex, readers and writers all take turns
+  """
+
+  _lock = None
+
+  def __init__( self ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._lock = th.Lock()
+    pass
+
+  def acquire( self ):
+    self._lock.acquire()
+
+  def release( self ):
+    self._lock.release()
+
+  def acquire_read( self ):
+    self._lock.acquire()
+
+  def release_read( self ):
+    self._lock.release()
+
+
+class ReadWriteLock:
+  """
+  #############################################################################
+  Readers-writer lock, any number of readers or a single writer
+
+  waiting writers keep new readers out, so a steady stream of readers can
+  not starve the writer
+  """
+
+  _condition       = None
+  _readers         = 0     # readers currently holding the lock
+  _writer          = False # True while a writer holds the lock
+  _writers_waiting = 0     # writers queued for the lock
+
+  def __init__( self ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._condition = th.Condition( th.Lock() )
+    self._readers = 0
+    self._writer = False
+    self._writers_waiting = 0
+    pass
+
+  def acquire( self ):
+    self._condition.acquire()
+    self._writers_waiting += 1
+    while self._writer or self._readers:
+      self._condition.wait()
+    self._writers_waiting -= 1
+    self._writer = True
+    self._condition.release()
+
+  def release( self ):
+    self._condition.acquire()
+    self._writer = False
+    self._condition.notify_all()
+    self._condition.release()
+
+  def acquire_read( self ):
+    self._condition.acquire()
+    while self._writer or self._writers_waiting:
+      self._condition.wait()
+    self._readers += 1
+    self._condition.release()
+
+  def release_read( self ):
+    self._condition.acquire()
+    self._readers -= 1
+    if not self._readers:
+      self._condition.notify_all()
+    self._condition.release()
+
+
+class SeqLock:
+  """
+  #############################################################################
+  Sequence lock for a single writer and optimistic readers
+
+  the writer bumps the sequence to odd before and to even after writing,
+  readers never block the writer, they copy and retry if the sequence moved
+  """
+
+  _lock     = None # serializes writers
+  _sequence = 0
+
+  def __init__( self ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._lock = th.Lock()
+    self._sequence = 0
+    pass
+
+  def acquire( self ):
+    self._lock.acquire()
+    self._sequence += 1
+
+  def release( self ):
+    self._sequence += 1
+    self._lock.release()
+
+  def read_begin( self ):
+    """
+    ---------------------------------------------------------------------------
+    wait for any write in progress to finish, return the sequence to check
+    """
+    sequence = self._sequence
+    while sequence & 1:
+      # yield to the writer
+      time.sleep( 0 )
+      sequence = self._sequence
+    return sequence
+
+  def read_retry( self, sequence ):
+    """
+    ---------------------------------------------------------------------------
+    True if a writer got in since read_begin and the read must be repeated
+    """
+    return self._sequence != sequence
+
+  def acquire_read( self ):
+    # blocking readers fall back to the writer lock
+    self._lock.acquire()
+
+  def release_read( self ):
+    self._lock.release()
+
+
+# lock strategies by name
+LOCKS = {
+  'lock'    : MutexLock,
+  'rwlock'  : ReadWriteLock,
+  'seqlock' : SeqLock,
+}
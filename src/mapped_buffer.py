@@ -0,0 +1,105 @@
+import os
+import numpy as np
+#mapped_buffer.py
+
+try:
+  from . import shared_buffer
+  from .shared_buffer import SharedRollingBuffer
+except ( ImportError, ValueError ):
+  import shared_buffer
+  from shared_buffer import SharedRollingBuffer
+
+class MappedRollingBuffer( SharedRollingBuffer ):
+  """
+  #############################################################################
+  Ring mode RollingBuffer persisted in a memory mapped file
+
+  same layout as SharedRollingBuffer, header (head, count, dimensions)
+  followed by timestamps and data, but in a file of the caller's choice that
+  outlives the process. reset( length, dimensions ) creates the file, open()
+  reopens it for writing with its contents intact, e.g. after a crash,
+  attach() maps it read only. Cold pages are left to the OS to page out,
+  reads go through the page cache, get_views() never copies.
+  """
+
+  def __init__( self, path ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    SharedRollingBuffer.__init__( self, os.path.basename( path ) )
+    self._path = path
+    pass
+
+  def open( self ):
+    """
+    ---------------------------------------------------------------------------
+    reopen an existing buffer file for writing, keeps its contents
+
+    a write cut short (the seqlock was left odd) is undone, the slots it
+    covered are zeroed and no longer held, returns False if the file is
+    missing or not a buffer
+    """
+    self.close()
+
+    if not os.path.exists( self._path ):
+      return False
+
+    self._map = np.memmap( self._path, dtype = np.uint8, mode = 'r+' )
+    header = self._map[ :8 * shared_buffer.HEADER_SIZE ].view( np.int64 )
+    if header[ shared_buffer.MAGIC ] != shared_buffer.MAGIC_VALUE:
+      self._map = None
+      return False
+
+    self._owner = True
+    self._layout_from( header )
+    # a write cut short leaves the seqlock odd
+    if header[ shared_buffer.SEQUENCE ] & 1:
+      self._drop_torn()
+    self._reset_stats()
+
+    return True
+
+  def flush( self ):
+    """
+    ---------------------------------------------------------------------------
+    write dirty pages back to the file
+    """
+    if self._map is not None and self._owner:
+      self._map.flush()
+
+  def close( self ):
+    """
+    ---------------------------------------------------------------------------
+    flush and drop the mapping, the file is kept
+    """
+    self.flush()
+    self._owner = False
+    SharedRollingBuffer.close( self )
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _drop_torn( self ):
+    """
+    ---------------------------------------------------------------------------
+    undo a write cut short, back to the position before it, with the slots
+    it covered zeroed and no longer held, then make the seqlock even
+    """
+    header = self._header
+    count = int( header[ shared_buffer.PENDING_COUNT ] )
+    self._head = int( header[ shared_buffer.PENDING_HEAD ] )
+    self._rollcount = int( header[ shared_buffer.PENDING_ROLLCOUNT ] )
+
+    slots = ( self._head + np.arange( count ) ) % self._length
+    self._timestamps[ slots ] = 0
+    self._data[ slots ] = 0
+    # the slots held the oldest items, if the buffer had wrapped that far
+    self._first = max( self._first, self._rollcount - self._length + count )
+
+    header[ shared_buffer.HEAD ] = self._head
+    header[ shared_buffer.ROLLCOUNT ] = self._rollcount
+    header[ shared_buffer.FIRST ] = self._first
+    header[ shared_buffer.SEQUENCE ] += 1
@@ -0,0 +1,137 @@
+import math
+import time
+import numpy as np
+#metrics.py
+
+"""
+###############################################################################
+Cheap always-on instrumentation
+
+Histogram keeps fixed power of two buckets, adding a sample is a frexp and
+a few list updates, no allocation and no lock. Concurrent adds from several
+threads may very rarely lose a sample, which is fine for statistics.
+"""
+
+# highest resolution clock available
+clock = getattr( time, 'perf_counter', time.time )
+
+# bucket i counts samples up to RESOLUTION * 2**i seconds
+RESOLUTION = 1e-6 # 1 us
+BUCKETS    = 32   # up to ~36 minutes, the last bucket takes everything above
+
+# storage slots after the bucket counts
+COUNT = BUCKETS
+TOTAL = BUCKETS + 1
+MAX   = BUCKETS + 2
+SLOTS = BUCKETS + 3
+
+# percentiles reported by summary()
+PERCENTILES = ( 50, 90, 99 )
+
+class Histogram():
+  """
+  #############################################################################
+  Fixed bucket latency histogram, in seconds
+
+  storage is any sequence of SLOTS floats, a list by default, pass a
+  multiprocessing.RawArray( 'd', SLOTS ) to fill it from another process
+  """
+
+  _storage = None
+
+  def __init__( self, storage = None ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    if storage is None:
+      storage = [ 0.0 ] * SLOTS
+    self._storage = storage
+    pass
+
+  def add( self, seconds ):
+    """
+    ---------------------------------------------------------------------------
+    count one sample
+    """
+    storage = self._storage
+    # frexp exponent e puts the sample in ( 2**(e-1), 2**e ] resolutions
+    bucket = math.frexp( seconds / RESOLUTION )[1]
+    if bucket < 0:
+      bucket = 0
+    elif bucket >= BUCKETS:
+      bucket = BUCKETS - 1
+    storage[ bucket ] += 1
+    storage[ COUNT ] += 1
+    storage[ TOTAL ] += seconds
+    if seconds > storage[ MAX ]:
+      storage[ MAX ] = seconds
+
+  def add_many( self, samples ):
+    """
+    ---------------------------------------------------------------------------
+    count an array of samples at once
+    """
+    if isinstance( samples, list ) and len( samples ) < 16:
+      # a few samples, e.g. one packet, cost less than the numpy set up
+      for seconds in samples:
+        self.add( seconds )
+      return
+    samples = np.asarray( samples, dtype = float )
+    if not len( samples ):
+      return
+    storage = self._storage
+    buckets = np.clip( np.frexp( samples / RESOLUTION )[1], 0, BUCKETS - 1 )
+    counts = np.bincount( buckets, minlength = BUCKETS )
+    for bucket in np.flatnonzero( counts ):
+      storage[ bucket ] += float( counts[ bucket ] )
+    storage[ COUNT ] += len( samples )
+    storage[ TOTAL ] += float( samples.sum() )
+    if samples.max() > storage[ MAX ]:
+      storage[ MAX ] = float( samples.max() )
+
+  def reset( self ):
+    """
+    ---------------------------------------------------------------------------
+    forget all samples
+    """
+    for slot in range( SLOTS ):
+      self._storage[ slot ] = 0.0
+
+  def count( self ):
+    return int( self._storage[ COUNT ] )
+
+  def total( self ):
+    return self._storage[ TOTAL ]
+
+  def percentile( self, percent ):
+    """
+    ---------------------------------------------------------------------------
+    upper bound of the bucket holding the percent-th sample, 0 if empty
+    """
+    count = self._storage[ COUNT ]
+    if not count:
+      return 0.0
+    rank = count * percent / 100.0
+    seen = 0
+    for bucket in range( BUCKETS ):
+      seen += self._storage[ bucket ]
+      if seen >= rank:
+        # never report more than the largest sample
+        return min( RESOLUTION * 2 ** bucket, self._storage[ MAX ] )
+    return self._storage[ MAX ]
+
+  def summary( self ):
+    """
+    ---------------------------------------------------------------------------
+    dict of count, mean, max and the PERCENTILES as 'p50' etc., in seconds
+    """
+    count = self.count()
+    summary = {
+      'count' : count,
+      'mean'  : self.total() / count if count else 0.0,
+      'max'   : self._storage[ MAX ],
+    }
+    for percent in PERCENTILES:
+      summary[ 'p%d' % percent ] = self.percentile( percent )
+    return summary
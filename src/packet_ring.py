@@ -0,0 +1,317 @@
+try:
+  import Queue
+except ImportError:
+  import queue as Queue
+import ctypes
+import multiprocessing
+import threading
+import time
+import numpy as np
+#packet_ring.py
+
+try:
+  from . import metrics
+except ( ImportError, ValueError ):
+  import metrics
+
+# slots of the index array
+WRITE = 0 # total packets put, owned by the producer
+READ  = 1 # total packets taken, owned by the consumer
+DONE  = 2 # total packets marked done, owned by the consumer
+WAKE  = 3 # bumped by interrupt(), ends every wait in progress
+
+# slots of the waiting flags
+CONSUMER = 0
+PRODUCER = 1
+
+class PacketRing():
+  """
+  #############################################################################
+  Preallocated fixed shape packet ring, single producer / single consumer
+
+  Drop in for the Queue.Queue calls made by PollingAquisition. Packets are
+  copied into a preallocated numpy array, so nothing is allocated or boxed
+  per packet. The producer only moves the WRITE index, the consumer only
+  moves READ, so no lock is taken on put or get. Events are only used to
+  wake a side that is actually waiting.
+  """
+
+  _size         = None # number of packet slots
+  _packets      = None # (size,)+shape storage
+  _stamps       = None # (size,) metrics.clock() of each put
+  _taken        = None # stamps of the packets handed out last
+  _indices      = None # WRITE, READ, DONE and WAKE counters
+  _overwrite    = False # full ring overwrites the oldest packets
+
+  # wakeups, only set when the other side announced it is waiting
+  _not_empty    = None
+  _not_full     = None
+  _waiting      = None # CONSUMER and PRODUCER waiting flags
+
+  def __init__( self, size, shape, dtype = float, overwrite = False ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+
+    overwrite = True never blocks the producer, a full ring overwrites its
+    oldest packets and the consumer skips past what it missed
+    """
+    # an overwrite ring keeps one spare slot for the producer to write into
+    # while the consumer still reads the `size` newest packets
+    self._size = size + 1 if overwrite else size
+    self._overwrite = overwrite
+    self._allocate( ( self._size, ) + tuple( np.atleast_1d( shape ) ),
+      np.dtype( dtype ) )
+    pass
+
+  """
+  *****************
+  PRODUCER
+  """
+
+  def put( self, packet, block = True, timeout = None ):
+    """
+    ---------------------------------------------------------------------------
+    copy a packet into the next free slot, raises Queue.Full on timeout
+    """
+    if not self._overwrite and \
+        self._indices[ WRITE ] - self._indices[ READ ] >= self._size:
+      if not block or not self._wait( self._not_full, PRODUCER,
+          self._is_full, timeout ):
+        raise Queue.Full
+
+    slot = self._indices[ WRITE ] % self._size
+    self._packets[ slot ] = packet
+    self._stamps[ slot ] = metrics.clock()
+
+    # publish the slot only after it is written
+    self._indices[ WRITE ] += 1
+
+    if self._waiting[ CONSUMER ]:
+      self._not_empty.set()
+
+  def put_nowait( self, packet ):
+    return self.put( packet, False )
+
+  """
+  *****************
+  CONSUMER
+  """
+
+  def get( self, block = True, timeout = None ):
+    """
+    ---------------------------------------------------------------------------
+    copy of the oldest packet, raises Queue.Empty on timeout
+    """
+    if self._indices[ WRITE ] == self._indices[ READ ]:
+      if not block or not self._wait( self._not_empty, CONSUMER,
+          self._is_empty, timeout ):
+        raise Queue.Empty
+
+    packet = self._take( 1 )[0]
+
+    if self._waiting[ PRODUCER ]:
+      self._not_full.set()
+
+    return packet
+
+  def get_nowait( self ):
+    return self.get( False )
+
+  def get_many( self, max_count, timeout = None, wait = 0 ):
+    """
+    ---------------------------------------------------------------------------
+    up to max_count oldest packets as one (n,)+shape block
+
+    waits up to timeout for the first packet (raises Queue.Empty), then up
+    to wait seconds for the block to fill
+    """
+    if self._indices[ WRITE ] == self._indices[ READ ]:
+      if not self._wait( self._not_empty, CONSUMER,
+          self._is_empty, timeout ):
+        raise Queue.Empty
+
+    # give more packets a chance to arrive
+    deadline = time.time() + wait
+    while self._indices[ WRITE ] - self._indices[ READ ] < max_count:
+      remaining = deadline - time.time()
+      if remaining <= 0:
+        break
+      written = self._indices[ WRITE ]
+      self._wait( self._not_empty, CONSUMER,
+        lambda: self._indices[ WRITE ] == written, remaining )
+
+    block = self._take( max_count )
+
+    if self._waiting[ PRODUCER ]:
+      self._not_full.set()
+
+    return block
+
+  def last_stamps( self ):
+    """
+    ---------------------------------------------------------------------------
+    metrics.clock() put times of the packets handed out by the last get or
+    get_many, oldest first
+    """
+    return self._taken
+
+  def task_done( self ):
+    self._indices[ DONE ] += 1
+
+  def join( self ):
+    """
+    ---------------------------------------------------------------------------
+    wait until every packet put so far was taken and marked done
+    """
+    while self._indices[ DONE ] < self._indices[ WRITE ]:
+      time.sleep( 0.001 )
+
+  def qsize( self ):
+    if self._overwrite:
+      return min( self._indices[ WRITE ] - self._indices[ READ ],
+        self._size - 1 )
+    return self._indices[ WRITE ] - self._indices[ READ ]
+
+  def interrupt( self ):
+    """
+    ---------------------------------------------------------------------------
+    end any put or get wait in progress, as if it had timed out
+    """
+    self._indices[ WAKE ] += 1
+    self._not_empty.set()
+    self._not_full.set()
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _allocate( self, storage_shape, dtype ):
+    """
+    ---------------------------------------------------------------------------
+    packet storage, indices and wakeups, private to this process
+    """
+    self._packets = np.zeros( storage_shape, dtype = dtype )
+    self._stamps = np.zeros( storage_shape[0] )
+    self._indices = [ 0, 0, 0, 0 ]
+    self._waiting = [ False, False ]
+    self._not_empty = threading.Event()
+    self._not_full = threading.Event()
+
+  def _take( self, max_count ):
+    """
+    ---------------------------------------------------------------------------
+    copy up to max_count of the oldest packets and hand their slots back
+
+    an overwrite ring may lap the consumer, it then skips ahead and repeats
+    the copy if the producer reached the copied slots in the meantime
+    """
+    while True:
+      read = self._indices[ READ ]
+      written = self._indices[ WRITE ]
+      if self._overwrite and written - read >= self._size:
+        # lapped, skip to the oldest slot the producer is not about to reuse
+        read = written - self._size + 1
+
+      count = min( max_count, written - read )
+      block = self._copy_out( self._packets, read, count )
+      stamps = self._copy_out( self._stamps, read, count )
+
+      if not self._overwrite or \
+          self._indices[ WRITE ] - read < self._size:
+        break
+
+    # skipped packets are done, they will never be taken
+    self._indices[ DONE ] += read - self._indices[ READ ]
+
+    # hand the slots back only after they are copied
+    self._indices[ READ ] = read + count
+    self._taken = stamps
+    return block
+
+  def _copy_out( self, storage, read, count ):
+    """
+    ---------------------------------------------------------------------------
+    copy of count slots of storage starting at index read
+    """
+    start = read % self._size
+    first = min( count, self._size - start )
+
+    # one copy for the whole block, two slices if it wraps
+    if first == count:
+      return storage[ start:start + count ].copy()
+    return np.concatenate( ( storage[ start: ], storage[ :count - first ] ) )
+
+  def _is_empty( self ):
+    return self._indices[ WRITE ] == self._indices[ READ ]
+
+  def _is_full( self ):
+    return self._indices[ WRITE ] - self._indices[ READ ] >= self._size
+
+  def _wait( self, event, side, still_waiting, timeout ):
+    """
+    ---------------------------------------------------------------------------
+    sleep on event until still_waiting() turns False, True if it did
+
+    the flag is raised before the condition is checked again, so a wakeup
+    from the other side can not slip in between
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    wake = self._indices[ WAKE ]
+    event.clear()
+    self._waiting[ side ] = True
+    try:
+      while still_waiting():
+        if self._indices[ WAKE ] != wake:
+          return False
+        if deadline is None:
+          event.wait()
+        else:
+          remaining = deadline - time.time()
+          if remaining <= 0:
+            return False
+          event.wait( remaining )
+        event.clear()
+      return True
+    finally:
+      self._waiting[ side ] = False
+
+
+class SharedPacketRing( PacketRing ):
+  """
+  #############################################################################
+  PacketRing in shared memory, producer and consumer in different processes
+
+  storage, indices and waiting flags live in multiprocessing.RawArray blocks,
+  packets are copied in and out, never pickled. Create it before forking
+  the producer process.
+  """
+
+  _context = None # multiprocessing module or context to allocate from
+
+  def __init__( self, size, shape, dtype = float, overwrite = False,
+      context = None ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._context = context or multiprocessing
+    PacketRing.__init__( self, size, shape, dtype, overwrite )
+    pass
+
+  def _allocate( self, storage_shape, dtype ):
+    """
+    ---------------------------------------------------------------------------
+    packet storage, indices and wakeups, shared between processes
+    """
+    storage = self._context.RawArray( ctypes.c_char,
+      int( np.prod( storage_shape ) ) * dtype.itemsize )
+    self._packets = np.frombuffer( storage, dtype = dtype ).reshape(
+      storage_shape )
+    self._stamps = np.frombuffer( self._context.RawArray( ctypes.c_double,
+      storage_shape[0] ), dtype = np.float64 )
+    self._indices = self._context.RawArray( ctypes.c_longlong, 4 )
+    self._waiting = self._context.RawArray( ctypes.c_int, 2 )
+    self._not_empty = self._context.Event()
+    self._not_full = self._context.Event()
@@ -0,0 +1,321 @@
+import multiprocessing
+import multiprocessing.pool
+import numpy as np
+#pipeline.py
+
+"""
+###############################################################################
+Vectorized processing stages between read() and write()
+
+a Pipeline runs its stages in order on a whole (n,)+channels block at a
+time. Batches go through one after another, so stateful stages (filters,
+decimation) carry their state from one batch into the next and the output
+keeps the input order. With workers, a large block is split between the
+workers of a thread (or process) pool inside each stage: rows for scaling,
+derived channels and FIR filters, channels for IIR filters, and the pieces
+are joined back in order.
+
+the work functions are module level so a process pool can pickle them, a
+Derive function must be module level too when processes = True
+"""
+
+def _split( block, pieces ):
+  """
+  -----------------------------------------------------------------------------
+  ( start, end ) row ranges cutting block into about equal pieces
+  """
+  bounds = np.linspace( 0, len( block ), pieces + 1 ).astype( int )
+  return [ ( bounds[i], bounds[ i + 1 ] ) for i in range( pieces )
+    if bounds[ i + 1 ] > bounds[i] ]
+
+def _scale_rows( args ):
+  block, gain, offset = args
+  return block * gain + offset
+
+def _derive_rows( args ):
+  block, function = args
+  derived = np.asarray( function( block ), dtype = float )
+  return np.concatenate( ( block, derived.reshape( len( block ), -1 ) ), 1 )
+
+def _fir_rows( args ):
+  """
+  -----------------------------------------------------------------------------
+  FIR filter rows, x starts with len( taps ) - 1 rows of context
+  """
+  taps, x = args
+  context = len( taps ) - 1
+  count = len( x ) - context
+  out = np.zeros( ( count, ) + x.shape[1:] )
+  for k, tap in enumerate( taps ):
+    out += tap * x[ context - k:context - k + count ]
+  return out
+
+def _iir_columns( args ):
+  """
+  -----------------------------------------------------------------------------
+  IIR filter (n, c) columns, transposed direct form II, returns ( y, state )
+
+  the recursion runs sample by sample, vectorized over the columns
+  """
+  b, a, x, state = args
+  state = state.copy()
+  out = np.empty( x.shape )
+  order = len( state )
+  for i in range( len( x ) ):
+    value = x[i]
+    result = b[0] * value + state[0] if order else b[0] * value
+    if order > 1:
+      state[ :-1 ] = state[ 1: ] + np.outer( b[ 1:-1 ], value ) - \
+        np.outer( a[ 1:-1 ], result )
+    if order:
+      state[-1] = b[-1] * value - a[-1] * result
+    out[i] = result
+  return out, state
+
+def _map( pool, function, arguments ):
+  """
+  -----------------------------------------------------------------------------
+  function over arguments, in the pool if there is one, results in order
+  """
+  if pool is None or len( arguments ) < 2:
+    return [ function( argument ) for argument in arguments ]
+  return pool.map( function, arguments )
+
+
+class Stage():
+  """
+  #############################################################################
+  One step of a Pipeline, override process
+  """
+
+  def process( self, block, pool = None, pieces = 1 ):
+    """
+    ---------------------------------------------------------------------------
+    transform a block, oldest first, may use pool with up to pieces tasks
+    """
+    return block
+
+  def reset( self ):
+    """
+    ---------------------------------------------------------------------------
+    forget any state kept from earlier blocks
+    """
+    pass
+
+
+class Scale( Stage ):
+  """
+  #############################################################################
+  Calibration, block * gain + offset, gain and offset broadcast per channel
+  """
+
+  _gain   = 1.0
+  _offset = 0.0
+
+  def __init__( self, gain = 1.0, offset = 0.0 ):
+    self._gain = np.asarray( gain, dtype = float )
+    self._offset = np.asarray( offset, dtype = float )
+    pass
+
+  def process( self, block, pool = None, pieces = 1 ):
+    parts = _map( pool, _scale_rows, [ ( block[ start:end ], self._gain,
+      self._offset ) for start, end in _split( block, pieces ) ] )
+    return np.concatenate( parts ) if parts else _scale_rows( ( block,
+      self._gain, self._offset ) )
+
+
+class Derive( Stage ):
+  """
+  #############################################################################
+  Derived channels, appends function( block ) to the channels of a (n, c)
+  block, function returns (n,) or (n, k) computed row by row
+  """
+
+  _function = None
+
+  def __init__( self, function ):
+    self._function = function
+    pass
+
+  def process( self, block, pool = None, pieces = 1 ):
+    if np.ndim( block ) == 1:
+      block = block[ :, np.newaxis ]
+    parts = _map( pool, _derive_rows, [ ( block[ start:end ], self._function )
+      for start, end in _split( block, pieces ) ] )
+    return np.concatenate( parts ) if parts else _derive_rows( ( block,
+      self._function ) )
+
+
+class FIRFilter( Stage ):
+  """
+  #############################################################################
+  FIR filter per channel, the last len( taps ) - 1 inputs carry over to the
+  next block
+  """
+
+  _taps    = None
+  _history = None # inputs kept as context for the next block
+
+  def __init__( self, taps ):
+    self._taps = np.asarray( taps, dtype = float )
+    pass
+
+  def process( self, block, pool = None, pieces = 1 ):
+    context = len( self._taps ) - 1
+    if self._history is None or self._history.shape[1:] != block.shape[1:]:
+      self._history = np.zeros( ( context, ) + block.shape[1:] )
+
+    x = np.concatenate( ( self._history, block ) )
+    parts = _map( pool, _fir_rows, [ ( self._taps, x[ start:end + context ] )
+      for start, end in _split( block, pieces ) ] )
+    self._history = x[ len( x ) - context: ]
+    return np.concatenate( parts ) if parts else np.zeros( block.shape )
+
+  def reset( self ):
+    self._history = None
+
+
+class IIRFilter( Stage ):
+  """
+  #############################################################################
+  IIR filter per channel, coefficients b, a as for scipy.signal.lfilter,
+  the filter state carries over to the next block
+
+  each channel is a sequential recursion, large blocks are split between
+  workers by channel
+  """
+
+  _b     = None
+  _a     = None
+  _state = None # (order, channels) transposed direct form II state
+
+  def __init__( self, b, a ):
+    b = np.asarray( b, dtype = float )
+    a = np.asarray( a, dtype = float )
+    size = max( len( b ), len( a ) )
+    self._b = np.append( b, np.zeros( size - len( b ) ) ) / a[0]
+    self._a = np.append( a, np.zeros( size - len( a ) ) ) / a[0]
+    pass
+
+  def process( self, block, pool = None, pieces = 1 ):
+    flat = np.reshape( block, ( len( block ), -1 ) ).astype( float )
+    channels = flat.shape[1]
+    if self._state is None or self._state.shape[1] != channels:
+      self._state = np.zeros( ( len( self._b ) - 1, channels ) )
+
+    ranges = _split( np.empty( channels ), min( pieces, channels ) )
+    results = _map( pool, _iir_columns, [ ( self._b, self._a,
+      flat[ :, start:end ], self._state[ :, start:end ] )
+      for start, end in ranges ] )
+    out = np.concatenate( [ y for y, state in results ], 1 )
+    self._state = np.concatenate( [ state for y, state in results ], 1 )
+    return out.reshape( np.shape( block ) )
+
+  def reset( self ):
+    self._state = None
+
+
+class Decimate( Stage ):
+  """
+  #############################################################################
+  Keep every factor-th row, the phase carries over to the next block
+
+  no anti-alias filtering, put a FIRFilter in front for that
+  """
+
+  _factor = 1
+  _phase  = 0 # index of the next kept row in the next block
+
+  def __init__( self, factor ):
+    self._factor = factor
+    pass
+
+  def process( self, block, pool = None, pieces = 1 ):
+    out = block[ self._phase::self._factor ]
+    self._phase = ( self._phase - len( block ) ) % self._factor
+    return out
+
+  def reset( self ):
+    self._phase = 0
+
+
+class Pipeline():
+  """
+  #############################################################################
+  Ordered chain of Stages applied to whole batches
+
+  process( block ) runs every stage on the block in order. With workers > 1
+  blocks of at least min_rows rows are split between a pool of that many
+  threads (processes = True for a process pool, for work that holds the
+  GIL), smaller ones are not worth the hand off and run in the caller.
+  """
+
+  _stages    = ()
+  _workers   = 0
+  _processes = False
+  _min_rows  = 4096 # smallest block worth splitting
+  _pool      = None
+
+  def __init__( self, stages, workers = 0, processes = False, min_rows = None ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor, the pool is started on first use
+    """
+    self._stages = tuple( stages )
+    self._workers = workers
+    self._processes = processes
+    if min_rows is not None:
+      self._min_rows = min_rows
+    pass
+
+  def __del__( self ):
+    """
+    ---------------------------------------------------------------------------
+    Make sure the pool stops
+    """
+    self.close()
+    pass
+
+  def process( self, block ):
+    """
+    ---------------------------------------------------------------------------
+    run the stages on a (n,)+channels block, oldest first, returns the result
+    """
+    block = np.asarray( block )
+    for stage in self._stages:
+      if self._workers > 1 and len( block ) >= self._min_rows:
+        block = stage.process( block, self._get_pool(), self._workers )
+      else:
+        block = stage.process( block )
+    return block
+
+  def reset( self ):
+    """
+    ---------------------------------------------------------------------------
+    forget the state of all stages, e.g. after a gap in the data
+    """
+    for stage in self._stages:
+      stage.reset()
+
+  def close( self ):
+    """
+    ---------------------------------------------------------------------------
+    stop the pool
+    """
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+    self._pool = None
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _get_pool( self ):
+    if self._pool is None:
+      if self._processes:
+        self._pool = multiprocessing.Pool( self._workers )
+      else:
+        self._pool = multiprocessing.pool.ThreadPool( self._workers )
+    return self._pool
@@ -1,8 +1,30 @@
-import Queue
+try:
+  import Queue
+except ImportError:
+  import queue as Queue
 import threading
 import time
+import numpy as np
 #polling_acquisition.py
 
+try:
+  from . import metrics
+  from . import packet_ring
+except ( ImportError, ValueError ):
+  import metrics
+  import packet_ring
+
+# queued by stop() to wake an idle consumer, never shipped out
+_WAKEUP = object()
+
+# what the reader does with a packet when the queue is full
+OVERFLOW_POLICIES = (
+  'block',           # wait for space, never drop, memory stays bounded
+  'drop_newest',     # wait up to _data_in_timeout, then drop the new packet
+  'drop_oldest',     # drop the oldest queued packet, the consumer sees fresh data
+  'coalesce_latest', # the new packet replaces the newest queued one
+)
+
 class PollingAquisition():
   """
   #############################################################################
@@ -19,6 +41,14 @@ class PollingAquisition():
   _data_in_timeout    = 100 # ms
   _data_out_timeout   = 100 # ms
   _queue            = None 
+  _batch_size       = 1 # max packets per write_batch call, 1 calls write
+  _batch_wait       = 0 # ms to wait for a batch to fill up
+  _packet_shape     = None # fixed packet shape, selects the PacketRing transport
+  _packet_dtype     = float
+  _backoff_min      = 1 # ms to back off after a read/write error
+  _backoff_max      = 100 # ms, backoff doubles per error up to this
+  _overflow_policy  = 'drop_newest' # see OVERFLOW_POLICIES
+  _pipeline         = None # pipeline.Pipeline run on each batch before write
 
   # threads
   _data_in_thread   = None
@@ -29,12 +59,33 @@ class PollingAquisition():
   _data_in_running  = None
   _data_out_running = None
   _running          = None
+  _stop_event       = None # set by stop, ends any backoff wait at once
 
   # tracking
   _packets_read     = 0
   _packets_written  = 0
 
-  _overflows        = 0
+  _overflows        = 0 # packets lost to a full queue, any policy
+  _read_errors      = 0
+  _write_errors     = 0
+
+  # per overflow policy
+  _blocked          = 0 # puts that had to wait for space
+  _dropped_newest   = 0
+  _dropped_oldest   = 0
+  _coalesced        = 0
+
+  # instrumentation, see stats()
+  _start_time       = None # clock when the counters were reset
+  _peak_depth       = 0 # most packets seen queued at once
+  _read_time        = None # histogram of time spent in read
+  _write_time       = None # histogram of time spent in write / write_batch
+  _residency        = None # histogram of time packets spent queued
+  _process_time     = None # histogram of time spent in the pipeline
+
+  # fan out
+  _subscriptions    = () # Subscription per subscriber, replaced on change
+  _reader_fans_out  = True # False: the consumer side publishes to them
   
 
   """
@@ -42,27 +93,74 @@ class PollingAquisition():
   API
   """
   
-  def setup(self, size = None):
+  def setup(self, size = None, batch_size = None, batch_wait = None,
+      shape = None, dtype = None, backoff_min = None, backoff_max = None,
+      overflow = None, pipeline = None):
     """
     ---------------------------------------------------------------------------
     setup function, establish
+
+    batch_size > 1 drains up to that many queued packets per wakeup into
+    one write_batch call, waiting at most batch_wait ms for more to arrive
+
+    shape (and dtype) declare that read always returns a numpy array of that
+    shape, packets then travel through a preallocated PacketRing instead of
+    a Queue.Queue and batches arrive as one (n, ...) block
+
+    a failing read or write backs off backoff_min ms, doubling on each
+    further error up to backoff_max ms, the first success resets it
+
+    overflow picks what happens to packets when the queue of `size` items
+    is full, see OVERFLOW_POLICIES, coalesce_latest needs a Queue.Queue
+    (no shape), returns False for bad settings
+
+    pipeline (a pipeline.Pipeline) transforms each batch of numpy packets on
+    the consumer thread, write_batch gets its output block, write each row
     """
+    # check the overflow policy before touching anything
+    policy = overflow if overflow is not None else self._overflow_policy
+    packet_shape = shape if shape is not None else self._packet_shape
+    if policy not in OVERFLOW_POLICIES:
+      return False
+    if policy == 'coalesce_latest' and packet_shape is not None:
+      return False
+
     if size:
       self._queue_size = size
+    if batch_size:
+      self._batch_size = batch_size
+    if batch_wait is not None:
+      self._batch_wait = batch_wait
+    if shape is not None:
+      self._packet_shape = shape
+    if dtype is not None:
+      self._packet_dtype = dtype
+    if backoff_min is not None:
+      self._backoff_min = backoff_min
+    if backoff_max is not None:
+      self._backoff_max = backoff_max
+    self._overflow_policy = policy
+    if pipeline is not None:
+      self._pipeline = pipeline
 
-    self._queue = Queue.Queue( maxsize = 100 )
-    self._packets_read     = 0
-    self._overflows        = 0
+    if self._packet_shape is not None:
+      self._queue = packet_ring.PacketRing( self._queue_size,
+        self._packet_shape, self._packet_dtype,
+        self._overflow_policy == 'drop_oldest' )
+    else:
+      self._queue = Queue.Queue( maxsize = self._queue_size )
+    self._reset_counters()
 
     return  True
   
   def start( self ):
     
     self._keep_running = True
+    self._data_in_running = True
     self._running = True
+    self._stop_event = threading.Event()
 
-    self._packets_read     = 0
-    self._overflows        = 0
+    self._reset_counters()
 
     self._data_in_thread = threading.Thread( target = self._data_in_loop )
     self._data_in_thread.daemon = True 
@@ -72,23 +170,72 @@ class PollingAquisition():
     self._data_out_thread.daemon = True 
     self._data_out_thread.start()
 
+    for subscription in self._subscriptions:
+      subscription.start()
+
     pass
   
   def stop( self ):
     self._keep_running = False
+    if self._stop_event:
+      self._stop_event.set()
     
     if self._data_in_thread:
-      # wait for thread to finish
+      # wait for thread to finish, the consumer keeps draining meanwhile
+      # so a put blocked on a full queue gets through
       self._data_in_thread.join()
     self._data_in_thread = None
 
+    # the consumer may be idle waiting for a packet
+    self._wake_consumer()
+
     if self._data_out_thread:
       #wait for thread to finish
       self._data_out_thread.join()
     self._data_out_thread = None
 
+    for subscription in self._subscriptions:
+      subscription.stop()
+
     self._running = False
     pass
+
+  def subscribe( self, write = None, write_batch = None, size = None,
+      batch_size = None, batch_wait = None, overflow = None ):
+    """
+    ---------------------------------------------------------------------------
+    add an independent consumer of every packet read, returns its
+    Subscription, None for bad settings
+
+    each subscriber has its own bounded queue of `size` packets, its own
+    thread calling write( packet ), or write_batch( packets ) with
+    batch_size > 1, and its own overflow policy (see setup, default
+    drop_oldest, 'block' is refused), so a slow subscriber only overflows
+    its own queue and never holds up the reader. Packets are handed to every
+    subscriber as is, never copied, subscribers must not modify them.
+    """
+    subscription = Subscription( write, write_batch )
+    if not subscription.setup( size, batch_size, batch_wait,
+        overflow = overflow ):
+      return None
+
+    if self._running:
+      subscription.start()
+    # replaced, not changed, the reader may be iterating the old one
+    self._subscriptions = self._subscriptions + ( subscription, )
+    return subscription
+
+  def unsubscribe( self, subscription ):
+    """
+    ---------------------------------------------------------------------------
+    stop sending packets to a subscriber and stop its thread
+    """
+    if subscription not in self._subscriptions:
+      return False
+    self._subscriptions = tuple( other for other in self._subscriptions
+      if other is not subscription )
+    subscription.stop()
+    return True
   
 
   """
@@ -102,8 +249,76 @@ class PollingAquisition():
   def write( self ):
     return 0 
 
+  def write_batch( self, packets ):
+    """
+    ---------------------------------------------------------------------------
+    ship out a list of packets, oldest first, defaults to write per packet
+    (with a packet shape set, packets is one (n, ...) block)
+
+    override to handle many packets per call, stack_packets turns same
+    shaped numpy packets into one (n, ...) block for bulk sinks
+    """
+    for packet in packets:
+      self.write( packet )
+
   def shutdown( self ):
     return True  
+
+  """
+  *****************
+  STATS
+  """
+
+  def stats( self ):
+    """
+    ---------------------------------------------------------------------------
+    instrumentation since start (or setup), as a dict
+
+      elapsed                       seconds
+      packets_read, packets_written counters, read_rate / write_rate per second
+      overflows, read_errors, write_errors
+      blocked, dropped_newest,      overflows by policy, see OVERFLOW_POLICIES
+      dropped_oldest, coalesced
+      queue_depth, peak_queue_depth, queue_size
+      read_time, write_time         time per read / write (write_batch) call
+      read_busy, write_busy         fraction of elapsed spent in read / write
+      process_time, process_busy    same for the pipeline, per batch
+      residency                     time packets spent in the queue
+
+    times are histogram summaries in seconds, see metrics.Histogram, the
+    slowest stage has the highest busy fraction
+    """
+    self._init_histograms()
+    elapsed = metrics.clock() - ( self._start_time or metrics.clock() )
+    per_second = 1.0 / elapsed if elapsed > 0 else 0.0
+    depth = self._queue.qsize() if self._queue else 0
+    return {
+      'elapsed'          : elapsed,
+      'packets_read'     : self._packets_read,
+      'packets_written'  : self._packets_written,
+      'read_rate'        : self._packets_read * per_second,
+      'write_rate'       : self._packets_written * per_second,
+      'overflows'        : self._overflows,
+      'read_errors'      : self._read_errors,
+      'write_errors'     : self._write_errors,
+      'blocked'          : self._blocked,
+      'dropped_newest'   : self._dropped_newest,
+      'dropped_oldest'   : self._dropped_oldest,
+      'coalesced'        : self._coalesced,
+      'queue_depth'      : depth,
+      # the peak is taken as packets leave, the queue may be deeper by now
+      'peak_queue_depth' : max( self._peak_depth, depth ),
+      'queue_size'       : self._queue_size,
+      'read_time'        : self._read_time.summary(),
+      'write_time'       : self._write_time.summary(),
+      'read_busy'        : self._read_time.total() * per_second,
+      'write_busy'       : self._write_time.total() * per_second,
+      'process_time'     : self._process_time.summary(),
+      'process_busy'     : self._process_time.total() * per_second,
+      'residency'        : self._residency.summary(),
+      'subscribers'      : [ subscription.stats()
+        for subscription in self._subscriptions ],
+    }
   """
   *****************
   PRIVATES
@@ -130,47 +345,419 @@ class PollingAquisition():
     ---------------------------------------------------------------------------
     loop that polls for data
     """
-    while( self._keep_running ):
+    backoff = self._backoff_min
+    while( self._keep_running and not self._stop_event.is_set() ):
       try:
         
+        began = metrics.clock()
         packet = self.read()
-        self._queue.put( packet, True, self._data_in_timeout / 1000.0 )
-        self._packets_read += 1
+        self._read_time.add( metrics.clock() - began )
+
+        if packet is None:
+          # read had nothing this time, e.g. a socket timed out
+          backoff = self._backoff_min
+          continue
+
+        if self._reader_fans_out:
+          for subscription in self._subscriptions:
+            subscription._publish( packet )
+        self._publish( packet )
+        backoff = self._backoff_min
         
       except:
         #self._keep_running=False
-        self._overflows += 1
-        time.sleep( self._data_in_timeout / 1000.0)
+        self._count( '_read_errors' )
+        self._stop_event.wait( backoff / 1000.0 )
+        backoff = min( 2 * backoff, self._backoff_max )
         
         pass
       pass
+
+    self._data_in_running = False
     pass
 
+  def _publish( self, packet ):
+    """
+    ---------------------------------------------------------------------------
+    queue a packet just read and count what happened to it
+    """
+    if self._packet_shape is None:
+      # a PacketRing stamps its slots, Queue.Queue entries carry it
+      packet = ( metrics.clock(), packet )
+    outcome = self._put( packet )
+
+    if outcome != 'dropped_newest':
+      self._count( '_packets_read' )
+    if outcome:
+      self._count( '_' + outcome )
+    if outcome and outcome != 'blocked':
+      self._count( '_overflows' )
+
+  def _put( self, packet ):
+    """
+    ---------------------------------------------------------------------------
+    queue a packet following the overflow policy
+
+    returns None if there was space, otherwise what happened: 'blocked',
+    'dropped_newest', 'dropped_oldest' or 'coalesced'
+    """
+    policy = self._overflow_policy
+    timeout = self._data_in_timeout / 1000.0
+
+    if policy == 'drop_newest':
+      try:
+        self._queue.put( packet, True, timeout )
+        return None
+      except Queue.Full:
+        # put already waited its timeout, drop the packet and poll on
+        return 'dropped_newest'
+
+    if policy == 'block':
+      outcome = None
+      while not self._stop_event.is_set():
+        try:
+          self._queue.put( packet, True, timeout )
+          return outcome
+        except Queue.Full:
+          outcome = 'blocked'
+      # stopped while waiting for space
+      return 'dropped_newest'
+
+    if self._packet_shape is not None:
+      # drop_oldest, an overwrite ring never blocks the producer
+      full = self._queue.qsize() >= self._queue_size
+      self._queue.put( packet, False )
+      return 'dropped_oldest' if full else None
+
+    while True:
+      try:
+        self._queue.put_nowait( packet )
+        return None
+      except Queue.Full:
+        pass
+
+      if policy == 'coalesce_latest':
+        # swap the new packet in for the newest queued one
+        self._queue.mutex.acquire()
+        try:
+          if len( self._queue.queue ):
+            self._queue.queue[-1] = packet
+            return 'coalesced'
+        finally:
+          self._queue.mutex.release()
+        continue
+
+      # drop_oldest
+      try:
+        self._queue.get_nowait()
+        self._queue.task_done()
+      except Queue.Empty:
+        continue
+      try:
+        self._queue.put_nowait( packet )
+      except Queue.Full:
+        pass
+      return 'dropped_oldest'
+
+  def _count( self, counter ):
+    """
+    ---------------------------------------------------------------------------
+    bump one of the tracking counters
+    """
+    setattr( self, counter, getattr( self, counter ) + 1 )
+
+  def _reset_counters( self ):
+    """
+    ---------------------------------------------------------------------------
+    zero the tracking counters
+    """
+    self._packets_read     = 0
+    self._overflows        = 0
+    self._read_errors      = 0
+    self._write_errors     = 0
+    self._blocked          = 0
+    self._dropped_newest   = 0
+    self._dropped_oldest   = 0
+    self._coalesced        = 0
+
+    self._start_time       = metrics.clock()
+    self._peak_depth       = 0
+    self._init_histograms()
+    for histogram in ( self._read_time, self._write_time, self._residency,
+        self._process_time ):
+      histogram.reset()
+
+  def _init_histograms( self ):
+    """
+    ---------------------------------------------------------------------------
+    make sure this instance has its own histograms
+    """
+    if self._read_time is None:
+      self._read_time = metrics.Histogram()
+    if self._write_time is None:
+      self._write_time = metrics.Histogram()
+    if self._residency is None:
+      self._residency = metrics.Histogram()
+    if self._process_time is None:
+      self._process_time = metrics.Histogram()
+
   def _data_out_loop( self ):
     """
     ---------------------------------------------------------------------------
     loop that ships data out to destination
     """
-    while( self._keep_running ):
+    backoff = self._backoff_min
+    # keep draining while the reader may still be putting
+    while( self._keep_running or self._data_in_running ):
       try:
         
-        packet = self._queue.get( True, self._data_out_timeout / 1000.0 )
-        self.write( packet )
+        if self._batch_size > 1:
+          packets = self._get_batch()
+        else:
+          packets = [ self._queue.get( True, self._data_out_timeout / 1000.0 ) ]
+          if packets[0] is _WAKEUP:
+            self._queue.task_done()
+            continue
+          packets = self._unstamp( packets )
+
+      except Queue.Empty:
+        # nothing arrived, just wait again
+        continue
+
+      if not len( packets ):
+        continue
+
+      if self._ship( packets ):
+        backoff = self._backoff_min
+      else:
+        self._stop_event.wait( backoff / 1000.0 )
+        backoff = min( 2 * backoff, self._backoff_max )
+      pass
+    pass
+
+  def _ship( self, packets ):
+    """
+    ---------------------------------------------------------------------------
+    hand taken packets to the subscribers and write them out
+
+    returns False if the write failed, the packets are gone either way
+    """
+    if not self._reader_fans_out:
+      # rows of a block are views, still no copy per subscriber
+      for subscription in self._subscriptions:
+        for packet in packets:
+          subscription._publish( packet )
+
+    # the queue only shrinks here, so its depth peaks just before a take
+    self._peak_depth = max( self._peak_depth,
+      self._queue.qsize() + len( packets ) )
+
+    written = True
+    try:
+      
+      if self._pipeline is not None:
+        self._process( packets )
+      else:
+        began = metrics.clock()
+        if self._batch_size > 1:
+          self.write_batch( packets )
+        else:
+          self.write( packets[0] )
+        self._write_time.add( metrics.clock() - began )
+      
+      self._packets_written += len( packets )
+      
+    except:
+      self._write_errors += 1
+      written = False
+
+    for packet in packets:
+      self._queue.task_done()
+    return written
+
+  def _process( self, packets ):
+    """
+    ---------------------------------------------------------------------------
+    run a batch through the pipeline and ship out what comes out of it
+
+    batches are processed one at a time in order, so filter state follows
+    the stream, a decimating pipeline may have nothing to ship
+    """
+    block = stack_packets( packets )
+    if block is None:
+      block = np.array( packets )
+
+    began = metrics.clock()
+    block = self._pipeline.process( block )
+    self._process_time.add( metrics.clock() - began )
+    if not len( block ):
+      return
 
+    began = metrics.clock()
+    if self._batch_size > 1:
+      self.write_batch( block )
+    else:
+      for row in block:
+        self.write( row )
+    self._write_time.add( metrics.clock() - began )
+
+  def _get_batch( self ):
+    """
+    ---------------------------------------------------------------------------
+    wait for a packet, then drain whatever else arrives within batch_wait
+    """
+    if self._packet_shape is not None:
+      # the ring hands out the whole batch as one block
+      return self._unstamp( self._queue.get_many( self._batch_size,
+        self._data_out_timeout / 1000.0, self._batch_wait / 1000.0 ) )
+
+    packets = [ self._queue.get( True, self._data_out_timeout / 1000.0 ) ]
+
+    deadline = time.time() + self._batch_wait / 1000.0
+    while len( packets ) < self._batch_size:
+      remaining = deadline - time.time()
+      try:
+        if remaining > 0:
+          packets.append( self._queue.get( True, remaining ) )
+        else:
+          packets.append( self._queue.get_nowait() )
+      except Queue.Empty:
+        break
+
+    # wakeups are not data
+    wakeups = [ packet for packet in packets if packet is _WAKEUP ]
+    if wakeups:
+      for packet in wakeups:
         self._queue.task_done()
-        
-        self._packets_written +=1
-        
-      except:
-        time.sleep( self._data_out_timeout / 1000.0)
-        
-        pass
+      packets = [ packet for packet in packets if packet is not _WAKEUP ]
+
+    return self._unstamp( packets )
+
+  def _unstamp( self, packets ):
+    """
+    ---------------------------------------------------------------------------
+    record how long the taken packets were queued, strips Queue.Queue stamps
+    """
+    if self._packet_shape is not None:
+      self._residency.add_many( metrics.clock() - self._queue.last_stamps() )
+      return packets
+
+    if not packets:
+      return packets
+    now = metrics.clock()
+    self._residency.add_many( [ now - stamp for stamp, packet in packets ] )
+    return [ packet for stamp, packet in packets ]
+
+  def _wake_consumer( self ):
+    """
+    ---------------------------------------------------------------------------
+    end a consumer wait for packets right away
+    """
+    if self._queue is None:
+      return
+    if isinstance( self._queue, packet_ring.PacketRing ):
+      self._queue.interrupt()
+      return
+    try:
+      self._queue.put_nowait( _WAKEUP )
+    except Queue.Full:
+      # a full queue does not keep the consumer waiting
       pass
+
+
+class Subscription( PollingAquisition ):
+  """
+  #############################################################################
+  One subscriber of a PollingAquisition, see PollingAquisition.subscribe
+
+  a PollingAquisition without a reader thread, packets are published into
+  its queue by the acquisition's reader and shipped out by its own thread.
+  The reader never waits on a subscriber, a full queue drops its oldest
+  packet (or the newest, or coalesces), 'block' is not accepted
+  """
+
+  _data_in_timeout  = 0 # ms, the reader never waits for queue space
+  _overflow_policy  = 'drop_oldest'
+  _write_fn         = None
+  _write_batch_fn   = None
+
+  def __init__( self, write = None, write_batch = None ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._write_fn = write
+    self._write_batch_fn = write_batch
     pass
 
+  def setup( self, size = None, batch_size = None, batch_wait = None,
+      overflow = None ):
+    """
+    ---------------------------------------------------------------------------
+    setup function, queue size, batching and overflow policy, False for
+    'block', it would hold up the reader and every other subscriber
+    """
+    if overflow == 'block':
+      return False
+    return PollingAquisition.setup( self, size, batch_size, batch_wait,
+      overflow = overflow )
 
+  def start( self ):
 
+    self._keep_running = True
+    self._data_in_running = False
+    self._running = True
+    self._stop_event = threading.Event()
 
+    self._reset_counters()
 
+    self._data_out_thread = threading.Thread( target = self._data_out_loop )
+    self._data_out_thread.daemon = True
+    self._data_out_thread.start()
+
+    pass
+
+  def stop( self ):
+    self._keep_running = False
+    if self._stop_event:
+      self._stop_event.set()
+
+    # the consumer may be idle waiting for a packet
+    self._wake_consumer()
+
+    if self._data_out_thread:
+      #wait for thread to finish
+      self._data_out_thread.join()
+    self._data_out_thread = None
+
+    self._running = False
+    pass
 
+  def write( self, packet ):
+    if self._write_fn:
+      self._write_fn( packet )
+
+  def write_batch( self, packets ):
+    if self._write_batch_fn:
+      self._write_batch_fn( packets )
+    else:
+      PollingAquisition.write_batch( self, packets )
+
+
+def stack_packets( packets ):
+  """
+  -----------------------------------------------------------------------------
+  stack same shaped numpy packets into one (n, ...) array, None otherwise
+  """
+  if isinstance( packets, np.ndarray ):
+    # already a block, e.g. from a PacketRing
+    return packets
 
+  first = packets[0]
+  if not isinstance( first, np.ndarray ):
+    return None
+  for packet in packets:
+    if not isinstance( packet, np.ndarray ) or packet.shape != first.shape \
+        or packet.dtype != first.dtype:
+      return None
+  return np.stack( packets )
@@ -0,0 +1,168 @@
+import ctypes
+import multiprocessing
+import threading
+#process_acquisition.py
+
+try:
+  from . import metrics
+  from . import packet_ring
+  from .polling_acquisition import PollingAquisition
+except ( ImportError, ValueError ):
+  import metrics
+  import packet_ring
+  from polling_acquisition import PollingAquisition
+
+# counters bumped by the reader process, kept in shared memory
+_COUNTERS = ( '_packets_read', '_overflows', '_read_errors', '_blocked',
+  '_dropped_newest', '_dropped_oldest', '_coalesced' )
+
+# read() runs in a forked child, so the overrides need not be picklable
+try:
+  _context = multiprocessing.get_context( 'fork' )
+except ( AttributeError, ValueError ):
+  _context = multiprocessing
+
+class ProcessPollingAquisition( PollingAquisition ):
+  """
+  #############################################################################
+  Polling acquisition with read() in its own process
+
+  Packets travel from the reader process to the write thread through a
+  SharedPacketRing, so a CPU heavy read() does not compete with write() or
+  the UI for the GIL. read() must return numpy arrays of the shape passed
+  to setup(). Requires the fork start method (POSIX).
+  """
+
+  """
+  *****************
+  VARIABLES
+  """
+
+  # batched drain keeps the parent side counters up to date
+  _batch_size       = 64
+
+  # subscribers live in this process, the write thread publishes to them
+  _reader_fans_out  = False
+
+  # reader process
+  _data_in_process  = None
+  _stop_event       = None
+  _counters         = None # shared values of the _COUNTERS
+
+  """
+  *****************
+  API
+  """
+
+  def setup( self, size = None, batch_size = None, batch_wait = None,
+      shape = None, dtype = None, backoff_min = None, backoff_max = None,
+      overflow = None, pipeline = None ):
+    """
+    ---------------------------------------------------------------------------
+    setup function, establish the shared memory ring, shape is required
+    """
+    if shape is None and self._packet_shape is None:
+      return False
+
+    if not PollingAquisition.setup( self, size, batch_size, batch_wait, shape,
+        dtype, backoff_min, backoff_max, overflow, pipeline ):
+      return False
+
+    self._queue = packet_ring.SharedPacketRing( self._queue_size,
+      self._packet_shape, self._packet_dtype,
+      self._overflow_policy == 'drop_oldest', _context )
+
+    return True
+
+  def start( self ):
+
+    self._keep_running = True
+    self._data_in_running = True
+    self._running = True
+
+    self._reset_counters()
+
+    # counters and stop flag shared with the reader process
+    self._counters = _context.RawArray( ctypes.c_longlong, len( _COUNTERS ) )
+    self._stop_event = _context.Event()
+    self._read_time = metrics.Histogram(
+      _context.RawArray( ctypes.c_double, metrics.SLOTS ) )
+
+    self._data_in_process = _context.Process( target = self._data_in_loop )
+    self._data_in_process.daemon = True
+    self._data_in_process.start()
+
+    self._data_out_thread = threading.Thread( target = self._data_out_loop )
+    self._data_out_thread.daemon = True
+    self._data_out_thread.start()
+
+    for subscription in self._subscriptions:
+      subscription.start()
+
+    pass
+
+  def stop( self ):
+    self._keep_running = False
+
+    if self._data_in_process:
+      # ask the reader process to finish, then make sure it does
+      self._stop_event.set()
+      self._data_in_process.join( 1.0 + self._data_in_timeout / 1000.0 )
+      if self._data_in_process.is_alive():
+        self._data_in_process.terminate()
+        self._data_in_process.join()
+    self._data_in_process = None
+    self._data_in_running = False
+
+    # the consumer may be idle waiting for a packet
+    self._wake_consumer()
+
+    if self._data_out_thread:
+      #wait for thread to finish
+      self._data_out_thread.join()
+    self._data_out_thread = None
+
+    for subscription in self._subscriptions:
+      subscription.stop()
+
+    self._sync_counters()
+    self._running = False
+    pass
+
+  def stats( self ):
+    """
+    ---------------------------------------------------------------------------
+    instrumentation, with the reader process counters picked up first
+    """
+    self._sync_counters()
+    return PollingAquisition.stats( self )
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _get_batch( self ):
+    """
+    ---------------------------------------------------------------------------
+    next batch from the ring, picks up the reader process counters
+    """
+    packets = PollingAquisition._get_batch( self )
+    self._sync_counters()
+    return packets
+
+  def _sync_counters( self ):
+    """
+    ---------------------------------------------------------------------------
+    copy the reader process counters to this side
+    """
+    if self._counters is not None:
+      for index, counter in enumerate( _COUNTERS ):
+        setattr( self, counter, self._counters[ index ] )
+
+  def _count( self, counter ):
+    """
+    ---------------------------------------------------------------------------
+    bump a counter in shared memory, runs in the reader process
+    """
+    self._counters[ _COUNTERS.index( counter ) ] += 1
@@ -0,0 +1,420 @@
+import os
+import numpy as np
+#recorder.py
+
+"""
+###############################################################################
+Append-only chunked recording of timestamped frames
+
+file layout, all little endian:
+  file header   HEADER_BYTES, int64 MAGIC_VALUE, ndim, MAX_DIMS dims, then
+                the frame and timestamp dtype strings, zero padded
+  chunk         int64 CHUNK_MAGIC, int64 count, first and last timestamp,
+                count timestamps, count frames
+
+timestamps are float64 seconds or int64 nanoseconds, 8 bytes either way.
+
+the index file next to it (path + '.idx') holds one row per chunk:
+offset, count, first and last timestamp. It is appended after the chunk is
+on disk, a reader scans the chunk headers for chunks the index is missing.
+"""
+
+MAGIC_VALUE  = 0x7079646163720002 # 'pydacr' + format version
+CHUNK_MAGIC  = 0x6368756e6b000001
+MAX_DIMS     = 8
+DTYPE_BYTES  = 16
+HEADER_BYTES = 8 * ( 2 + MAX_DIMS ) + 2 * DTYPE_BYTES
+TIMESTAMP_DTYPES = ( np.dtype( '<f8' ), np.dtype( '<i8' ) )
+
+def chunk_dtypes( timestamp_dtype ):
+  """
+  -----------------------------------------------------------------------------
+  ( chunk header, index row ) dtypes for timestamps of timestamp_dtype
+  """
+  return (
+    np.dtype( [ ( 'magic', '<i8' ), ( 'count', '<i8' ),
+      ( 'first', timestamp_dtype ), ( 'last', timestamp_dtype ) ] ),
+    np.dtype( [ ( 'offset', '<i8' ), ( 'count', '<i8' ),
+      ( 'first', timestamp_dtype ), ( 'last', timestamp_dtype ) ] )
+  )
+
+# float64 second timestamps, the sizes are the same for nanoseconds
+CHUNK_HEADER, INDEX_ROW = chunk_dtypes( '<f8' )
+
+def index_path( path ):
+  """
+  -----------------------------------------------------------------------------
+  chunk index file of the recording at path
+  """
+  return path + '.idx'
+
+
+class Recorder():
+  """
+  #############################################################################
+  Streaming recorder sink
+
+  add_new / add_many collect frames in a preallocated chunk and write it
+  with a few large writes once chunk_size frames are in, so recording runs
+  at disk bandwidth instead of a system call per packet. Timestamps are
+  expected to increase. Call it from a write / write_batch override.
+  """
+
+  _path        = None
+  _chunk_size  = 4096 # frames per chunk
+  _shape       = None # frame shape
+  _dtype       = None # frame dtype
+  _timestamp_dtype = None # '<f8' seconds or '<i8' nanoseconds
+  _chunk_header = None # CHUNK_HEADER / INDEX_ROW for _timestamp_dtype
+  _index_row   = None
+  _file        = None
+  _index       = None # index file
+  _timestamps  = None # pending chunk, preallocated
+  _frames      = None
+  _pending     = 0 # frames in the pending chunk
+  _frames_written = 0
+  _chunks_written = 0
+
+  def __init__( self, path, chunk_size = None ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._path = path
+    if chunk_size:
+      self._chunk_size = chunk_size
+    pass
+
+  def __del__( self ):
+    """
+    ---------------------------------------------------------------------------
+    Make sure the pending frames reach the file
+    """
+    self.close()
+    pass
+
+  def open( self, shape, dtype = float, timestamp_dtype = float ):
+    """
+    ---------------------------------------------------------------------------
+    start a new recording of frames with shape and dtype, truncates the file
+
+    timestamp_dtype = np.int64 records integer nanoseconds as they are,
+    returns False for bad settings
+    """
+    self.close()
+
+    shape = tuple( int( dim ) for dim in np.atleast_1d( shape ) )
+    timestamp_dtype = np.dtype( timestamp_dtype ).newbyteorder( '<' )
+    if len( shape ) > MAX_DIMS or timestamp_dtype not in TIMESTAMP_DTYPES:
+      return False
+    self._shape = shape
+    self._dtype = np.dtype( dtype ).newbyteorder( '<' )
+    self._timestamp_dtype = timestamp_dtype
+    self._chunk_header, self._index_row = chunk_dtypes( timestamp_dtype )
+
+    header = np.zeros( 2 + MAX_DIMS, dtype = '<i8' )
+    header[0] = MAGIC_VALUE
+    header[1] = len( shape )
+    header[ 2:2 + len( shape ) ] = shape
+    dtype_names = b''.join( name.str.encode( 'ascii' ).ljust( DTYPE_BYTES,
+      b'\0' ) for name in ( self._dtype, timestamp_dtype ) )
+
+    self._file = open( self._path, 'wb' )
+    self._file.write( header.tobytes() + dtype_names )
+    self._index = open( index_path( self._path ), 'wb' )
+
+    self._timestamps = np.zeros( self._chunk_size, dtype = timestamp_dtype )
+    self._frames = np.zeros( ( self._chunk_size, ) + shape,
+      dtype = self._dtype )
+    self._pending = 0
+    self._frames_written = 0
+    self._chunks_written = 0
+
+    return True
+
+  def add_new( self, new_timestamp, new_data ):
+    """
+    ---------------------------------------------------------------------------
+    record one frame
+    """
+    if self._file is None or np.shape( new_data ) != self._shape or \
+        not self._check_timestamps( new_timestamp ):
+      return False
+
+    self._timestamps[ self._pending ] = new_timestamp
+    self._frames[ self._pending ] = new_data
+    self._pending += 1
+    if self._pending == self._chunk_size:
+      self.flush()
+    return True
+
+  def add_many( self, new_timestamps, new_block ):
+    """
+    ---------------------------------------------------------------------------
+    record a block of frames, oldest first
+
+    full chunks of a long block are written straight from the block
+    """
+    new_timestamps = np.asarray( new_timestamps )
+    new_block = np.asarray( new_block )
+    count = np.shape( new_timestamps )[0]
+    if self._file is None or \
+        np.shape( new_block ) != ( count, ) + self._shape or \
+        not self._check_timestamps( new_timestamps ):
+      return False
+
+    done = 0
+    while done < count:
+      if not self._pending and count - done >= self._chunk_size:
+        # nothing pending, skip the copy into the chunk
+        self._write_chunk( new_timestamps[ done:done + self._chunk_size ],
+          new_block[ done:done + self._chunk_size ] )
+        done += self._chunk_size
+        continue
+
+      taken = min( count - done, self._chunk_size - self._pending )
+      self._timestamps[ self._pending:self._pending + taken ] = \
+        new_timestamps[ done:done + taken ]
+      self._frames[ self._pending:self._pending + taken ] = \
+        new_block[ done:done + taken ]
+      self._pending += taken
+      done += taken
+      if self._pending == self._chunk_size:
+        self.flush()
+
+    return True
+
+  def flush( self ):
+    """
+    ---------------------------------------------------------------------------
+    write the pending frames as a chunk
+    """
+    if self._file is None or not self._pending:
+      return
+    self._write_chunk( self._timestamps[ :self._pending ],
+      self._frames[ :self._pending ] )
+    self._pending = 0
+
+  def close( self ):
+    """
+    ---------------------------------------------------------------------------
+    flush and close the recording
+    """
+    if self._file is None:
+      return
+    self.flush()
+    self._file.close()
+    self._index.close()
+    self._file = None
+    self._index = None
+
+  def frames_written( self ):
+    return self._frames_written
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _check_timestamps( self, timestamps ):
+    """
+    ---------------------------------------------------------------------------
+    False for float timestamps into a nanosecond recording, never truncated
+    """
+    return np.can_cast( np.asarray( timestamps ).dtype, self._timestamp_dtype,
+      'same_kind' )
+
+  def _write_chunk( self, timestamps, frames ):
+    """
+    ---------------------------------------------------------------------------
+    append one chunk, then its index row
+    """
+    header = np.zeros( 1, dtype = self._chunk_header )
+    header[ 'magic' ] = CHUNK_MAGIC
+    header[ 'count' ] = len( timestamps )
+    header[ 'first' ] = timestamps[0]
+    header[ 'last' ] = timestamps[-1]
+
+    offset = self._file.tell()
+    self._file.write( header.tobytes() )
+    self._file.write( np.ascontiguousarray( timestamps,
+      dtype = self._timestamp_dtype ).data )
+    self._file.write( np.ascontiguousarray( frames, dtype = self._dtype ).data )
+    self._file.flush()
+
+    row = np.zeros( 1, dtype = self._index_row )
+    row[ 'offset' ] = offset
+    row[ 'count' ] = len( timestamps )
+    row[ 'first' ] = timestamps[0]
+    row[ 'last' ] = timestamps[-1]
+    self._index.write( row.tobytes() )
+    self._index.flush()
+
+    self._frames_written += len( timestamps )
+    self._chunks_written += 1
+
+
+class RecordingReader():
+  """
+  #############################################################################
+  Read back a Recorder file
+
+  the file is memory mapped, get_chunk returns views, get_range finds the
+  chunks of a time range from the index and copies out only those frames
+  """
+
+  _path       = None
+  _map        = None # np.memmap of the whole file
+  _shape      = None
+  _dtype      = None
+  _timestamp_dtype = None
+  _chunk_header = None # CHUNK_HEADER / INDEX_ROW for _timestamp_dtype
+  _index_row  = None
+  _index      = None # _index_row array, one row per complete chunk
+
+  def __init__( self, path ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._path = path
+    pass
+
+  def open( self ):
+    """
+    ---------------------------------------------------------------------------
+    map the recording and load its index, False if it is not a recording
+
+    the mapping covers the file as it is now, open again to see chunks
+    recorded since
+    """
+    self.close()
+
+    if not os.path.exists( self._path ) or \
+        os.path.getsize( self._path ) < HEADER_BYTES:
+      return False
+
+    mapped = np.memmap( self._path, dtype = np.uint8, mode = 'r' )
+    header = mapped[ :8 * ( 2 + MAX_DIMS ) ].view( '<i8' )
+    if header[0] != MAGIC_VALUE:
+      return False
+
+    self._shape = tuple( int( dim ) for dim in header[ 2:2 + header[1] ] )
+    dtype_names = mapped[ 8 * ( 2 + MAX_DIMS ):HEADER_BYTES ].tobytes()
+    self._dtype, self._timestamp_dtype = [ np.dtype( dtype_names[ start:start +
+      DTYPE_BYTES ].rstrip( b'\0' ).decode( 'ascii' ) )
+      for start in ( 0, DTYPE_BYTES ) ]
+    self._chunk_header, self._index_row = chunk_dtypes( self._timestamp_dtype )
+    self._map = mapped
+    self._index = self._load_index()
+
+    return True
+
+  def close( self ):
+    self._map = None
+    self._index = None
+
+  def shape( self ):
+    return self._shape
+
+  def dtype( self ):
+    return self._dtype
+
+  def timestamp_dtype( self ):
+    return self._timestamp_dtype
+
+  def chunks( self ):
+    """
+    ---------------------------------------------------------------------------
+    index of the complete chunks, fields offset, count, first and last
+    """
+    return self._index
+
+  def count( self ):
+    """
+    ---------------------------------------------------------------------------
+    number of frames in complete chunks
+    """
+    return int( self._index[ 'count' ].sum() )
+
+  def get_chunk( self, chunk ):
+    """
+    ---------------------------------------------------------------------------
+    ( timestamps, frames ) of a chunk as read only views of the mapping
+    """
+    offset = int( self._index[ 'offset' ][ chunk ] ) + \
+      self._chunk_header.itemsize
+    count = int( self._index[ 'count' ][ chunk ] )
+    frame_bytes = int( np.prod( self._shape ) ) * self._dtype.itemsize
+    timestamps = self._map[ offset:offset + 8 * count ].view(
+      self._timestamp_dtype )
+    offset += 8 * count
+    frames = self._map[ offset:offset + frame_bytes * count ].view(
+      self._dtype ).reshape( ( count, ) + self._shape )
+    return timestamps, frames
+
+  def get_range( self, start, end ):
+    """
+    ---------------------------------------------------------------------------
+    ( timestamps, frames ) with start <= timestamp < end, oldest first
+
+    only the chunks overlapping the range are touched
+    """
+    # chunks are in time order, find the overlapping ones by bisection
+    first = np.searchsorted( self._index[ 'last' ], start, 'left' )
+    last = np.searchsorted( self._index[ 'first' ], end, 'left' )
+
+    timestamps = []
+    frames = []
+    for chunk in range( first, last ):
+      chunk_timestamps, chunk_frames = self.get_chunk( chunk )
+      low = np.searchsorted( chunk_timestamps, start, 'left' )
+      high = np.searchsorted( chunk_timestamps, end, 'left' )
+      timestamps.append( chunk_timestamps[ low:high ] )
+      frames.append( chunk_frames[ low:high ] )
+
+    if not timestamps:
+      return np.zeros( 0, dtype = self._timestamp_dtype ), \
+        np.zeros( ( 0, ) + self._shape, dtype = self._dtype )
+    return np.concatenate( timestamps ), np.concatenate( frames )
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _load_index( self ):
+    """
+    ---------------------------------------------------------------------------
+    the index file rows of complete chunks, plus any chunks written after
+    the last row, found by scanning their headers
+    """
+    frame_bytes = int( np.prod( self._shape ) ) * self._dtype.itemsize
+    size = len( self._map )
+
+    def chunk_end( offset, count ):
+      return offset + self._chunk_header.itemsize + \
+        ( 8 + frame_bytes ) * int( count )
+
+    rows = []
+    path = index_path( self._path )
+    if os.path.exists( path ):
+      index = np.fromfile( path, dtype = self._index_row,
+        count = os.path.getsize( path ) // self._index_row.itemsize )
+      rows = [ tuple( row ) for row in index
+        if chunk_end( row[ 'offset' ], row[ 'count' ] ) <= size ]
+
+    # the index is written after its chunk, scan past its last row, a torn
+    # last chunk is left out
+    offset = chunk_end( rows[-1][0], rows[-1][1] ) if rows else HEADER_BYTES
+    while offset + self._chunk_header.itemsize <= size:
+      header = self._map[ offset:offset + self._chunk_header.itemsize ].view(
+        self._chunk_header )[0]
+      if header[ 'magic' ] != CHUNK_MAGIC or \
+          chunk_end( offset, header[ 'count' ] ) > size:
+        break
+      rows.append( ( offset, header[ 'count' ], header[ 'first' ],
+        header[ 'last' ] ) )
+      offset = chunk_end( offset, header[ 'count' ] )
+
+    return np.array( rows, dtype = self._index_row )
@@ -1,6 +1,25 @@
-import threading as th
 import numpy as np
-import copy
+
+try:
+  from . import locks
+  from . import metrics
+  from .decimation import MinMaxTiers, merge_points
+  from .rolling_stats import RollingStats
+except ( ImportError, ValueError ):
+  import locks
+  import metrics
+  from decimation import MinMaxTiers, merge_points
+  from rolling_stats import RollingStats
+
+# timestamp storage, float seconds or integer nanoseconds
+TIMESTAMP_DTYPES = ( np.dtype( np.float64 ), np.dtype( np.int64 ) )
+
+def item_shape( dimensions ):
+  """
+  -----------------------------------------------------------------------------
+  item shape as a tuple, dimensions may be an int for one dimensional items
+  """
+  return tuple( int( dim ) for dim in np.atleast_1d( dimensions ) )
 
 class RollingBuffer:
   """
@@ -9,115 +28,689 @@ class RollingBuffer:
   """
 
   _lock       = None
+  _concurrency = None # name of the lock strategy, see locks.LOCKS
 
   _timestamps = None # array of scalars containing the data timestamps
   _data       = None # array of numpy arrays containing the data
   _dimensions = None # tuple describing shape of data arrays
+  _dtype      = None # item dtype, may be a structured record
   _rollcount  = None # how many times data has been added 
+  _first      = 0 # sequence number of the oldest item that may be held
+  _length     = None # number of items held by the buffer
+  _ring       = None # True if storage is circular, indexed by _head
+  _head       = None # ring mode: slot the next item will be written to
+  _snapshot   = None # last published ( stamp, timestamps, data ), read only
+  _generation = 0 # bumped by every write and reset, never goes back
+  _snap_timestamps = None # ring mode snapshot block, oldest first
+  _snap_data  = None
+  _snap_end   = 0 # the block holds the buffer in [ end - length, end )
+  _tiers      = None # MinMaxTiers for get_decimated, None if not kept
+  _rolling_stats = None # RollingStats for get_stats, None if not kept
+
+  # instrumentation, see stats()
+  _reset_time   = None # clock at the last reset
+  _lock_wait    = None # writers waiting for the lock
+  _lock_hold    = None # writers holding the lock
+  _read_wait    = None # readers waiting for the lock
+  _read_hold    = None # readers copying
+  _read_retries = 0    # seqlock reads repeated because a write got in
 
-  def __init__( self ):
+  def __init__( self, concurrency = 'lock' ):
     """
     ---------------------------------------------------------------------------
     Constructor
+
+    concurrency selects the lock strategy:
+      'lock'    one mutex, readers and the writer take turns
+      'rwlock'  readers share the lock, the writer waits for them to finish
+      'seqlock' single writer, readers copy optimistically and never block it
     """
-    self._lock = th.Lock()
+    if concurrency not in locks.LOCKS:
+      raise ValueError( 'unknown concurrency strategy %r' % ( concurrency, ) )
+    self._concurrency = concurrency
+    self._lock = locks.LOCKS[ concurrency ]()
+
+    self._lock_wait = metrics.Histogram()
+    self._lock_hold = metrics.Histogram()
+    self._read_wait = metrics.Histogram()
+    self._read_hold = metrics.Histogram()
+    self._reset_stats()
     pass
 
-  def reset( self, length = 100, dimensions = (1) ):
+  def reset( self, length = 100, dimensions = (1), ring = False,
+      decimation = None, rolling_stats = False, dtype = float,
+      timestamp_dtype = float, snapshots = False ):
     """
     ---------------------------------------------------------------------------
     reset all of the data structures
+
+    ring = True keeps the data in place and moves a write head instead of
+    rolling the whole array on every add, reads are reordered newest first
+
+    decimation = factor keeps min/max tiers of factor, factor**2, ... items
+    up to date on every add, for get_decimated
+
+    rolling_stats = True keeps per element mean, variance, min and max of
+    the buffer up to date on every add, for get_stats
+
+    dtype sets the item storage, e.g. int16 for raw ADC counts or a
+    structured record for mixed channels (no decimation or rolling_stats
+    then), timestamp_dtype = np.int64 stores integer nanoseconds, returns
+    False for bad settings
+
+    snapshots = True makes get_snapshot of a ring buffer copy free, at the
+    cost of twice the buffer's memory again and a second write of every
+    item, see get_snapshot
     """
+    dimensions = item_shape( dimensions )
+    dtype = np.dtype( dtype )
+    timestamp_dtype = np.dtype( timestamp_dtype )
+    if timestamp_dtype not in TIMESTAMP_DTYPES:
+      return False
+    if dtype.names and ( decimation or rolling_stats ):
+      return False
 
     # lock up the data
     self._lock.acquire()
 
-    # initialize the timestamps and data to proper shape and length
-    self._timestamps = np.zeros( length )
-    self._data = np.array([ np.zeros( dimensions ) ]*length)
+    # allocate the timestamps and data in their final shape and dtype
+    self._timestamps = np.zeros( length, dtype = timestamp_dtype )
+    self._data = np.zeros( ( length, ) + dimensions, dtype = dtype )
 
     # keep track of the requested dimensions
     self._dimensions = dimensions
+    self._dtype = dtype
+    self._length = length
+
+    # storage mode, ring buffers start writing at the first slot
+    self._ring = ring
+    self._head = 0
 
     # keep track of data rolls, for debugging
     self._rollcount = 0
+    self._first = 0
+
+    # plot envelope tiers
+    self._tiers = None
+    if decimation:
+      self._tiers = MinMaxTiers( length, dimensions, decimation,
+        timestamp_dtype )
+    self._rolling_stats = None
+    if rolling_stats:
+      self._rolling_stats = RollingStats( length, dimensions )
+
+    # drop snapshots of the old data
+    self._snapshot = None
+    self._snap_timestamps = None
+    self._snap_data = None
+    self._snap_end = 0
+    if ring and snapshots:
+      # the buffer is all zeros, so is the block
+      self._snap_timestamps = np.zeros( 2 * length, dtype = timestamp_dtype )
+      self._snap_data = np.zeros( ( 2 * length, ) + dimensions, dtype = dtype )
+      self._snap_end = length
+    self._generation += 1
+
+    # measure the new data from now on
+    self._reset_stats()
 
     # unlock the data
     self._lock.release()
 
-    pass
+    return True
 
   def add_new( self, new_timestamp, new_data ):
     """
     ---------------------------------------------------------------------------
     Add a new data item to the buffer
+
+    the item must have the buffer's dimensions and a dtype that casts to
+    the buffer's within its kind (floats are not truncated into an integer
+    buffer), it is copied straight into the storage
     """    
 
-    if np.rank( new_data )==1:
-      if np.shape( new_data )[0] != self._dimensions:
-        return False
-    else:
-      # make sure incoming data has correct shape
-      if np.shape( new_data ) != self._dimensions:
-        return False
+    # make sure incoming data has correct shape and dtype
+    new_data = self._check( new_data, self._dimensions, self._dtype )
+    if new_data is None or self._check( new_timestamp, (),
+        self._timestamps.dtype ) is None:
+      return False
     
-    self._lock.acquire()
+    acquired = self._acquire_write()
 
-    # roll the arrays forward by one
-    self._data = np.roll( self._data, 1 , 0 )
-    self._timestamps = np.roll( self._timestamps, 1 , 0 )
-    
-    # insert the new data at the head 
-    self._data[0] = copy.deepcopy( new_data )
-    self._timestamps[0] = copy.deepcopy( new_timestamp ) 
+    evicted = None
+    if self._rolling_stats and self._rollcount >= self._length:
+      # the oldest item is about to drop off the end
+      if self._ring:
+        evicted = self._data[ self._head:self._head + 1 ].copy()
+      else:
+        evicted = self._data[ -1: ].copy()
+
+    if self._ring:
+      # overwrite the oldest slot and advance the write head
+      self._data[ self._head ] = new_data
+      self._timestamps[ self._head ] = new_timestamp
+      self._head = ( self._head + 1 ) % self._length
+      if self._snap_data is not None:
+        self._extend_snapshot( np.asarray( new_timestamp )[ np.newaxis ],
+          new_data[ np.newaxis ] )
+    else:
+      # roll the arrays forward by one
+      self._data = np.roll( self._data, 1 , 0 )
+      self._timestamps = np.roll( self._timestamps, 1 , 0 )
+      
+      # insert the new data at the head, the assignment copies it
+      self._data[0] = new_data
+      self._timestamps[0] = new_timestamp
+
+    if self._tiers:
+      self._tiers.add_one( self._rollcount, new_timestamp, new_data )
 
     # increment the rollcounter
     self._rollcount += 1
+    self._generation += 1
+
+    if self._rolling_stats:
+      self._rolling_stats.add( new_data[ np.newaxis ], evicted )
 
     # release the lock    
-    self._lock.release()
+    self._release_write( acquired )
     
     return True
 
-  def get_latest( self ):
+  def add_many( self, new_timestamps, new_block ):
     """
     ---------------------------------------------------------------------------
-    Retrieve the latest item from the data buffer
+    Add a block of items to the buffer, oldest first
+
+    new_timestamps has shape (n,), new_block has shape (n,)+dimensions,
+    if n exceeds the buffer length only the newest items are kept
     """
 
-    # acquire a lock on the data 
-    self._lock.acquire()
+    # make sure the incoming block has correct shape, once for all items
+    count = np.shape( new_timestamps )[0]
+    new_timestamps = self._check( new_timestamps, ( count, ),
+      self._timestamps.dtype )
+    new_block = self._check( new_block, ( count, ) + self._dimensions,
+      self._dtype )
+    if new_timestamps is None or new_block is None:
+      return False
+
+    # only the newest `length` items can survive the write
+    kept = min( count, self._length )
+    new_timestamps = new_timestamps[ count - kept: ]
+    new_block = new_block[ count - kept: ]
+
+    acquired = self._acquire_write()
+
+    evicted = None
+    if self._rolling_stats:
+      # the oldest items the block is about to push off the end
+      held = self._held()
+      if held + kept > self._length:
+        oldest_first = self._order( held )[ ::-1 ]
+        evicted = self._data[ oldest_first[ :held + kept - self._length ] ]
+
+    if self._ring:
+      # write from the head to the end of storage, wrap the rest to the start
+      first = min( kept, self._length - self._head )
+      self._data[ self._head:self._head + first ] = new_block[ :first ]
+      self._timestamps[ self._head:self._head + first ] = new_timestamps[ :first ]
+      self._data[ :kept - first ] = new_block[ first: ]
+      self._timestamps[ :kept - first ] = new_timestamps[ first: ]
+      self._head = ( self._head + kept ) % self._length
+      if self._snap_data is not None:
+        self._extend_snapshot( new_timestamps, new_block )
+    else:
+      # roll the arrays forward by the block length
+      self._data = np.roll( self._data, kept, 0 )
+      self._timestamps = np.roll( self._timestamps, kept, 0 )
+
+      # insert the block at the head, newest first
+      self._data[ :kept ] = new_block[ ::-1 ]
+      self._timestamps[ :kept ] = new_timestamps[ ::-1 ]
+
+    if self._tiers:
+      self._tiers.add( self._rollcount + count - kept, new_timestamps,
+        new_block )
+
+    # count every item handed in, including the ones that never fit
+    self._rollcount += count
+    self._generation += 1
+
+    if self._rolling_stats:
+      self._rolling_stats.add( new_block, evicted )
 
-    # deepcopy the latest (first) item in the buffer
-    data_out = (
-      copy.deepcopy( self._timestamps[0]     ),
-      copy.deepcopy( self._data[0]  )
-    )
-    
     # release the lock
-    self._lock.release()  
+    self._release_write( acquired )
+
+    return True
 
-    # return the data
-    return data_out
+  def get_latest( self ):
+    """
+    ---------------------------------------------------------------------------
+    Retrieve the latest item from the data buffer
+    """
+    return self._read( self._copy_latest )
 
   def get_all( self ):
     """
     ---------------------------------------------------------------------------
     Retrieve the full data buffer
     """ 
-    
+    return self._read( self._copy_all )
+
+  def get_snapshot( self ):
+    """
+    ---------------------------------------------------------------------------
+    Retrieve the full data buffer as read only arrays, newest first
+
+    the arrays are never written to again and are stamped with the
+    generation, readers of the same generation share them. A rolled buffer
+    gets new arrays on every add anyway, so they are views. A ring buffer
+    gathers one copy per generation, unless it was reset with snapshots =
+    True: then it keeps a block of twice its length that the writer appends
+    every item to, and snapshots are views of it. That costs twice the
+    buffer's memory again, a second write of every item and a copy of the
+    buffer whenever the block fills, whether anyone reads or not
+    """
+    snapshot = self._read( self._copy_snapshot )
+
+    # one installed late carries an older stamp, the next reader replaces it
+    self._snapshot = snapshot
+    return snapshot[1], snapshot[2]
+
+  def get_sequence( self ):
+    """
+    ---------------------------------------------------------------------------
+    Sequence number of the buffer, the total number of items added so far
+    """
+    return self._read( self._copy_sequence )
+
+  def get_since( self, sequence ):
+    """
+    ---------------------------------------------------------------------------
+    Retrieve only the items added after `sequence`, newest first
+
+    returns ( timestamps, data, new_sequence, lost ), lost is True if more
+    items arrived than the buffer holds (or the buffer was reset) and some
+    of them are gone, everything still in the buffer is returned then
+    """
+    return self._read( self._copy_since, sequence )
+
+  def get_range( self, start, end ):
+    """
+    ---------------------------------------------------------------------------
+    Retrieve the items with start <= timestamp < end, newest first
+
+    timestamps must increase from item to item, the bounds are found by
+    binary search and only the matching items are copied
+    """
+    return self._read( self._copy_range, start, end )
+
+  def get_last_seconds( self, seconds ):
+    """
+    ---------------------------------------------------------------------------
+    Retrieve the items at most `seconds` older than the latest, newest first
+
+    timestamps must increase from item to item, see get_range
+    """
+    return self._read( self._copy_last_seconds, seconds )
+
+  def get_decimated( self, n_points ):
+    """
+    ---------------------------------------------------------------------------
+    min/max envelope of the buffer in at most n_points points, newest first
+
+    returns ( timestamps, mins, maxs ), per point the element wise min and
+    max over a block of items and the newest timestamp in it. The cost
+    depends on n_points, not the buffer length. A buffer holding no more
+    than n_points items comes back as is, with mins and maxs equal to the
+    data. None unless the buffer was reset with decimation, or for
+    n_points < 1.
+    """
+    if not self._tiers or n_points < 1:
+      return None
+    return self._read( self._copy_decimated, n_points )
+
+  def get_stats( self ):
+    """
+    ---------------------------------------------------------------------------
+    per element statistics of the items in the buffer, in constant time
+
+    returns a dict of count, mean, var, std, min and max (NaN while empty),
+    None unless the buffer was reset with rolling_stats
+    """
+    if not self._rolling_stats:
+      return None
+    return self._read( self._rolling_stats.get )
+
+  def stats( self ):
+    """
+    ---------------------------------------------------------------------------
+    instrumentation since the last reset, as a dict
+
+      items, elapsed, add_rate      items added, seconds, items per second
+      lock_wait, lock_hold          writer time waiting for / holding the lock
+      read_wait, read_hold          reader time waiting for the lock / copying
+      read_retries                  seqlock reads repeated after a write
+
+    times are histogram summaries in seconds, see metrics.Histogram
+    """
+    elapsed = metrics.clock() - self._reset_time
+    items = self._rollcount or 0
+    return {
+      'items'        : items,
+      'elapsed'      : elapsed,
+      'add_rate'     : items / elapsed if elapsed > 0 else 0.0,
+      'lock_wait'    : self._lock_wait.summary(),
+      'lock_hold'    : self._lock_hold.summary(),
+      'read_wait'    : self._read_wait.summary(),
+      'read_hold'    : self._read_hold.summary(),
+      'read_retries' : self._read_retries,
+    }
+
+  def _read( self, copy_fn, *args ):
+    """
+    ---------------------------------------------------------------------------
+    run a copy function against the storage on the read side of the lock
+    """
+
+    if self._concurrency == 'seqlock':
+      # optimistic read, never blocks the writer, repeat if it got in the way
+      while True:
+        waited = metrics.clock()
+        sequence = self._lock.read_begin()
+        began = metrics.clock()
+        try:
+          data_out = copy_fn( *args )
+        except Exception:
+          # a torn read can fail, only a clean one may raise
+          if self._lock.read_retry( sequence ):
+            self._read_retries += 1
+            continue
+          raise
+        if not self._lock.read_retry( sequence ):
+          self._read_wait.add( began - waited )
+          self._read_hold.add( metrics.clock() - began )
+          return data_out
+        self._read_retries += 1
+
     # acquire a lock on the data 
+    waited = metrics.clock()
+    self._lock.acquire_read()
+    acquired = metrics.clock()
+    try:
+      return copy_fn( *args )
+    finally:
+      # release the lock
+      self._lock.release_read()
+      released = metrics.clock()
+      self._read_wait.add( acquired - waited )
+      self._read_hold.add( released - acquired )
+
+  def _check( self, values, shape, dtype ):
+    """
+    ---------------------------------------------------------------------------
+    values as an array of shape and a dtype that casts to dtype, None if not
+
+    arrays are not copied, a record may be given as a tuple of its fields,
+    integers that do not fit an integer dtype are refused, not wrapped
+    """
+    try:
+      values = np.asarray( values, dtype = dtype if dtype.names else None )
+    except ( TypeError, ValueError ):
+      return None
+    if values.shape != shape or \
+        not np.can_cast( values.dtype, dtype, 'same_kind' ):
+      return None
+    if dtype.kind in 'iu' and values.size and \
+        not np.can_cast( values.dtype, dtype ):
+      # e.g. int64 or python ints into int16, only if every value fits
+      if not ( np.can_cast( np.min_scalar_type( values.min() ), dtype ) and
+          np.can_cast( np.min_scalar_type( values.max() ), dtype ) ):
+        return None
+    return values
+
+  def _acquire_write( self ):
+    """
+    ---------------------------------------------------------------------------
+    take the writer lock, returns the clock when it was acquired
+    """
+    waited = metrics.clock()
     self._lock.acquire()
+    acquired = metrics.clock()
+    self._lock_wait.add( acquired - waited )
+    return acquired
+
+  def _release_write( self, acquired ):
+    """
+    ---------------------------------------------------------------------------
+    release the writer lock taken at `acquired`
+    """
+    self._lock.release()
+    self._lock_hold.add( metrics.clock() - acquired )
 
-    # deepcopy the entire buffer
-    data_out = (
-      copy.deepcopy( self._timestamps ),
-      copy.deepcopy( self._data       )
+  def _reset_stats( self ):
+    """
+    ---------------------------------------------------------------------------
+    zero the instrumentation
+    """
+    self._reset_time = metrics.clock()
+    self._read_retries = 0
+    for histogram in ( self._lock_wait, self._lock_hold, self._read_wait,
+        self._read_hold ):
+      histogram.reset()
+
+  def _copy_latest( self ):
+    """
+    ---------------------------------------------------------------------------
+    copy of the latest item
+    """
+    if self._ring:
+      # copy the item just behind the write head
+      index = ( self._head - 1 ) % self._length
+      return (
+        self._timestamps[ index ].copy(),
+        self._data[ index ].copy()
+      )
+
+    # copy the latest (first) item in the buffer
+    return (
+      self._timestamps[0].copy(),
+      self._data[0].copy()
     )
 
-    # release the lock
-    self._lock.release()  
-    return data_out
+  def _copy_all( self ):
+    """
+    ---------------------------------------------------------------------------
+    copy of the full buffer, newest first
+    """
+    if self._ring:
+      # gather the ring newest first, fancy indexing returns a copy
+      order = self._order( self._length )
+      return (
+        self._timestamps[ order ],
+        self._data[ order ]
+      )
+
+    # copy the entire buffer
+    return (
+      self._timestamps.copy(),
+      self._data.copy()
+    )
+
+  def _copy_snapshot( self ):
+    """
+    ---------------------------------------------------------------------------
+    current snapshot, or new views if the first reader of a generation
+    """
+    # the sequence number also changes with writes by another process
+    stamp = ( self._generation, self._rollcount )
+    snapshot = self._snapshot
+    if snapshot is not None and snapshot[0] == stamp:
+      return snapshot
+
+    if not self._ring:
+      # the next add rolls into new arrays, these are never written again
+      timestamps = self._timestamps.view()
+      data = self._data.view()
+    elif self._snap_data is not None:
+      # the window of the block, the writer only appends after it
+      start = self._snap_end - self._length
+      timestamps = self._snap_timestamps[ start:self._snap_end ][ ::-1 ]
+      data = self._snap_data[ start:self._snap_end ][ ::-1 ]
+    else:
+      # no block, gather a copy newest first
+      order = self._order( self._length )
+      timestamps = self._timestamps[ order ]
+      data = self._data[ order ]
+    timestamps.flags.writeable = False
+    data.flags.writeable = False
+    return ( stamp, timestamps, data )
+
+  def _extend_snapshot( self, timestamps, items ):
+    """
+    ---------------------------------------------------------------------------
+    append at most length items, oldest first, to the snapshot block
+
+    a full block is left to the views handed out and the buffer carries on
+    in a new one, so published snapshots are never written to
+    """
+    count = len( items )
+    if self._snap_end + count > len( self._snap_data ):
+      keep = self._length - count
+      snap_timestamps = np.empty_like( self._snap_timestamps )
+      snap_data = np.empty_like( self._snap_data )
+      snap_timestamps[ :keep ] = \
+        self._snap_timestamps[ self._snap_end - keep:self._snap_end ]
+      snap_data[ :keep ] = self._snap_data[ self._snap_end - keep:self._snap_end ]
+      self._snap_timestamps = snap_timestamps
+      self._snap_data = snap_data
+      self._snap_end = keep
+
+    end = self._snap_end + count
+    self._snap_timestamps[ self._snap_end:end ] = timestamps
+    self._snap_data[ self._snap_end:end ] = items
+    self._snap_end = end
+
+  def _copy_range( self, start, end ):
+    """
+    ---------------------------------------------------------------------------
+    copy of the items with start <= timestamp < end
+    """
+    first = self._bisect( start )
+    last = self._bisect( end )
+
+    # storage indices of items first..last-1, counted from the oldest
+    count = self._held()
+    if self._ring:
+      order = ( self._head - count + np.arange( last - 1, first - 1, -1 ) ) \
+        % self._length
+    else:
+      order = np.arange( count - last, count - first )
+    return (
+      self._timestamps[ order ],
+      self._data[ order ]
+    )
+
+  def _copy_last_seconds( self, seconds ):
+    """
+    ---------------------------------------------------------------------------
+    copy of the items at most `seconds` older than the latest
+    """
+    if not self._rollcount:
+      return self._copy_range( 0, 0 )
+    latest = self._timestamps[ self._order( 1 )[0] ]
+    if self._timestamps.dtype.kind == 'i':
+      # integer nanoseconds
+      seconds = int( round( seconds * 1e9 ) )
+    return self._copy_range( latest - seconds, np.inf )
+
+  def _bisect( self, timestamp ):
+    """
+    ---------------------------------------------------------------------------
+    number of items, counted from the oldest, with a timestamp below
+    `timestamp`, in O(log n) reads that follow the ring wrap around
+    """
+    count = self._held()
+    low = 0
+    high = count
+    while low < high:
+      middle = ( low + high ) // 2
+      # storage index of the middle item, counted from the oldest
+      if self._ring:
+        index = ( self._head - count + middle ) % self._length
+      else:
+        index = count - 1 - middle
+      if self._timestamps[ index ] < timestamp:
+        low = middle + 1
+      else:
+        high = middle
+    return low
+
+  def _copy_decimated( self, n_points ):
+    """
+    ---------------------------------------------------------------------------
+    envelope from the tiers, or the items themselves if they are few enough
+    """
+    envelope = self._tiers.envelope( self._rollcount, n_points )
+    if envelope is not None:
+      return envelope
+
+    # a buffer shorter than the factor has no tiers, merge the items then
+    order = self._order( self._held() )
+    return merge_points(
+      self._timestamps[ order ],
+      self._data[ order ],
+      self._data[ order ],
+      n_points
+    )
+
+  def _copy_sequence( self ):
+    """
+    ---------------------------------------------------------------------------
+    current sequence number
+    """
+    return self._rollcount
+
+  def _copy_since( self, sequence ):
+    """
+    ---------------------------------------------------------------------------
+    copy of the items added after `sequence`
+    """
+    new_sequence = self._rollcount
+    count = new_sequence - sequence
+
+    # the caller fell behind the buffer, or holds a stale sequence
+    held = self._held()
+    lost = count < 0 or count > held
+    if lost:
+      count = held
+
+    # fancy indexing copies just the new items
+    order = self._order( count )
+    return (
+      self._timestamps[ order ],
+      self._data[ order ],
+      new_sequence,
+      lost
+    )
+
+  def _held( self ):
+    """
+    ---------------------------------------------------------------------------
+    number of valid items in storage
+    """
+    return min( self._rollcount - self._first, self._length )
+
+  def _order( self, count ):
+    """
+    ---------------------------------------------------------------------------
+    storage indices of the newest `count` items, newest first
+    """
+    if self._ring:
+      return ( self._head - 1 - np.arange( count ) ) % self._length
+    return np.arange( count )
     
 """
 ###############################################################################
@@ -0,0 +1,323 @@
+import numpy as np
+#rolling_stats.py
+
+class RollingStats():
+  """
+  #############################################################################
+  Element wise statistics over the newest `length` items of a stream
+
+  mean and variance follow every add and evict with Welford updates (Chan's
+  formulas for blocks), min and max use the van Herk / Gil-Werman scheme:
+  the stream is cut into blocks of half the window, a running min/max
+  covers the items of the current block, the min/max of the previous block
+  covers that one whole and suffix min/max arrays cover what is left of the
+  one before. The suffixes of a finished block are built backwards a few
+  items per add while the next block fills, so every query is O(1) and
+  every add O(1) per element, with no rebuild of the whole window at a
+  block boundary. At each boundary mean and variance are set from per
+  block sums, which stops rounding drift. The items of the last two blocks
+  are kept, about the window's length again.
+  """
+
+  _length       = None # window length
+  _block        = None # items per block, half the window rounded up
+  _added        = 0    # items added so far
+  _count        = 0    # items in the mean and variance
+  _mean         = None
+  _m2           = None # sum of squared differences from the mean
+
+  # current block, its first item is number _added - _filled
+  _items        = None # its items so far
+  _filled       = 0
+  _prefix_min   = None # min/max of its items so far
+  _prefix_max   = None
+  _block_sum    = None # sums of its items' differences from its first item
+  _block_squares = None # and of their squares
+
+  # the block before, _block items from _added - _filled - _block on
+  _newer_items  = None
+  _newer_min    = None # min/max of the whole block
+  _newer_max    = None
+  _newer_sum    = None # as _block_sum and _block_squares, whole block
+  _newer_squares = None
+  _newer_suffix_min = None # min/max from each item to the end of the block,
+  _newer_suffix_max = None # filled in from the end while the current fills
+  _newer_done   = 0    # suffix entries from here on are built
+
+  # the block before that, only its suffixes are still needed
+  _older_suffix_min = None
+  _older_suffix_max = None
+
+  def __init__( self, length, item_shape ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    self._length = length
+    self._block = ( length + 1 ) // 2
+    self._added = 0
+    self._count = 0
+    self._mean = np.zeros( item_shape )
+    self._m2 = np.zeros( item_shape )
+    pass
+
+  def add( self, block, evicted ):
+    """
+    ---------------------------------------------------------------------------
+    account for a block of new items, oldest first, pushing out `evicted`,
+    the oldest items of the window
+    """
+    if not len( block ):
+      return
+    if self._items is None:
+      self._allocate( block )
+
+    taken = 0
+    removed = 0
+    while taken < len( block ):
+      if self._filled == self._block:
+        self._rotate()
+      # up to the end of the current block
+      part = block[ taken:taken + self._block - self._filled ]
+      taken += len( part )
+
+      # make room in the window first, so the two stay in step
+      evict = max( 0, self._count + len( part ) - self._length )
+      if evict and evicted is not None:
+        self._remove( evicted[ removed:removed + evict ] )
+        removed += evict
+      self._combine( part )
+
+      self._items[ self._filled:self._filled + len( part ) ] = part
+      self._add_sums( part )
+      if not self._filled:
+        self._prefix_min = part.min( 0 )
+        self._prefix_max = part.max( 0 )
+      elif len( part ) == 1:
+        np.minimum( self._prefix_min, part[0], out = self._prefix_min )
+        np.maximum( self._prefix_max, part[0], out = self._prefix_max )
+      else:
+        np.minimum( self._prefix_min, part.min( 0 ), out = self._prefix_min )
+        np.maximum( self._prefix_max, part.max( 0 ), out = self._prefix_max )
+      self._filled += len( part )
+      self._added += len( part )
+      self._advance( len( part ) )
+
+  def get( self ):
+    """
+    ---------------------------------------------------------------------------
+    dict of count, mean, var, std, min and max over the window, copies
+    """
+    count = self._count
+    if not count:
+      empty = np.full( np.shape( self._mean ), np.nan )
+      return { 'count' : 0, 'mean' : empty, 'var' : empty.copy(),
+        'std' : empty.copy(), 'min' : empty.copy(), 'max' : empty.copy() }
+
+    minimum = self._prefix_min.copy()
+    maximum = self._prefix_max.copy()
+    oldest = self._added - count
+    newer_start = self._added - self._filled - self._block
+    if oldest < newer_start + self._block:
+      # part of the window is in the previous block
+      if oldest <= newer_start:
+        np.minimum( minimum, self._newer_min, out = minimum )
+        np.maximum( maximum, self._newer_max, out = maximum )
+      else:
+        np.minimum( minimum, self._newer_suffix_min[ oldest - newer_start ],
+          out = minimum )
+        np.maximum( maximum, self._newer_suffix_max[ oldest - newer_start ],
+          out = maximum )
+    if oldest < newer_start:
+      # and in the one before
+      older_start = newer_start - self._block
+      np.minimum( minimum, self._older_suffix_min[ oldest - older_start ],
+        out = minimum )
+      np.maximum( maximum, self._older_suffix_max[ oldest - older_start ],
+        out = maximum )
+
+    # rounding may take a constant channel just below zero
+    var = np.maximum( self._m2 / count, 0 )
+    return {
+      'count' : count,
+      'mean'  : self._mean.copy(),
+      'var'   : var,
+      'std'   : np.sqrt( var ),
+      'min'   : minimum,
+      'max'   : maximum,
+    }
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _allocate( self, block ):
+    """
+    ---------------------------------------------------------------------------
+    block sized arrays in the dtype of the first items
+    """
+    shape = ( self._block, ) + np.shape( self._mean )
+    self._items = np.empty( shape, block.dtype )
+    self._newer_items = np.empty( shape, block.dtype )
+    self._newer_suffix_min = np.empty( shape, block.dtype )
+    self._newer_suffix_max = np.empty( shape, block.dtype )
+    self._older_suffix_min = np.empty( shape, block.dtype )
+    self._older_suffix_max = np.empty( shape, block.dtype )
+    self._block_sum = np.zeros( shape[ 1: ] )
+    self._block_squares = np.zeros( shape[ 1: ] )
+    self._newer_sum = np.zeros( shape[ 1: ] )
+    self._newer_squares = np.zeros( shape[ 1: ] )
+    self._filled = 0
+
+  def _rotate( self ):
+    """
+    ---------------------------------------------------------------------------
+    the current block is full, it becomes the previous one
+    """
+    # done by now, as many items were added as the block holds
+    self._advance( self._block )
+    if self._count == self._length:
+      self._resync()
+
+    self._older_suffix_min, self._newer_suffix_min = \
+      self._newer_suffix_min, self._older_suffix_min
+    self._older_suffix_max, self._newer_suffix_max = \
+      self._newer_suffix_max, self._older_suffix_max
+    self._newer_items, self._items = self._items, self._newer_items
+    self._newer_min = self._prefix_min
+    self._newer_max = self._prefix_max
+    self._newer_sum, self._block_sum = self._block_sum, self._newer_sum
+    self._newer_squares, self._block_squares = \
+      self._block_squares, self._newer_squares
+    self._newer_done = self._block
+
+    self._filled = 0
+    self._prefix_min = None
+    self._prefix_max = None
+    self._block_sum[...] = 0
+    self._block_squares[...] = 0
+
+  def _advance( self, steps ):
+    """
+    ---------------------------------------------------------------------------
+    build `steps` more suffix entries of the previous block, backwards
+    """
+    done = self._newer_done
+    if self._newer_max is None or not done:
+      return
+    low = max( 0, done - steps )
+    if low == done - 1 and done < self._block:
+      # one more item, as on every add_new
+      np.minimum( self._newer_items[ low ], self._newer_suffix_min[ done ],
+        out = self._newer_suffix_min[ low ] )
+      np.maximum( self._newer_items[ low ], self._newer_suffix_max[ done ],
+        out = self._newer_suffix_max[ low ] )
+      self._newer_done = low
+      return
+    for suffix, function in ( ( self._newer_suffix_min, np.minimum ),
+        ( self._newer_suffix_max, np.maximum ) ):
+      part = function.accumulate( self._newer_items[ low:done ][ ::-1 ] )
+      if done < self._block:
+        function( part, suffix[ done ], out = part )
+      suffix[ low:done ] = part[ ::-1 ]
+    self._newer_done = low
+
+  def _resync( self ):
+    """
+    ---------------------------------------------------------------------------
+    mean and variance of the full window from the per block sums, the window
+    is the current block and the end of the previous one
+    """
+    count, mean, m2 = self._block_stats( self._items[0], self._block,
+      self._block_sum, self._block_squares )
+    if self._length > self._block:
+      # an odd length leaves out the previous block's first item, which
+      # adds nothing to sums of differences from itself
+      added, other_mean, other_m2 = self._block_stats( self._newer_items[0],
+        self._length - self._block, self._newer_sum, self._newer_squares )
+      total = count + added
+      delta = other_mean - mean
+      mean = mean + delta * added / total
+      m2 = m2 + other_m2 + delta ** 2 * count * added / total
+      count = total
+    self._count = count
+    self._mean = mean
+    self._m2 = m2
+
+  def _block_stats( self, first, count, total, squares ):
+    """
+    ---------------------------------------------------------------------------
+    ( count, mean, m2 ) of a block from its first item and its sums
+    """
+    return ( count, first + total / count, squares - total ** 2 / count )
+
+  def _add_sums( self, block ):
+    """
+    ---------------------------------------------------------------------------
+    add items to the current block's sums
+    """
+    if len( block ) == 1:
+      # in floats, unsigned items would wrap
+      difference = np.subtract( block[0], self._items[0],
+        dtype = self._block_sum.dtype )
+      self._block_sum += difference
+      self._block_squares += difference * difference
+      return
+    differences = np.subtract( block, self._items[0],
+      dtype = self._block_sum.dtype )
+    self._block_sum += differences.sum( 0 )
+    self._block_squares += ( differences * differences ).sum( 0 )
+
+  def _combine( self, block ):
+    """
+    ---------------------------------------------------------------------------
+    add items to the mean and variance
+    """
+    count = self._count
+    if len( block ) == 1:
+      # Welford
+      self._count += 1
+      delta = block[0] - self._mean
+      self._mean += delta / self._count
+      self._m2 += delta * ( block[0] - self._mean )
+      return
+
+    # Chan, combining the window with the block
+    added = len( block )
+    total = count + added
+    block_mean = block.mean( 0 )
+    delta = block_mean - self._mean
+    self._m2 += ( ( block - block_mean ) ** 2 ).sum( 0 ) + \
+      delta ** 2 * count * added / total
+    self._mean += delta * added / total
+    self._count = total
+
+  def _remove( self, evicted ):
+    """
+    ---------------------------------------------------------------------------
+    take items out of the mean and variance
+    """
+    count = self._count
+    removed = len( evicted )
+    kept = count - removed
+    self._count = max( kept, 0 )
+    if kept <= 0:
+      self._mean[...] = 0
+      self._m2[...] = 0
+      return
+
+    if removed == 1:
+      # Welford in reverse
+      delta = evicted[0] - self._mean
+      self._mean -= delta / kept
+      self._m2 -= delta * ( evicted[0] - self._mean )
+      return
+
+    # Chan in reverse
+    evicted_mean = evicted.mean( 0 )
+    kept_mean = ( count * self._mean - removed * evicted_mean ) / kept
+    delta = evicted_mean - kept_mean
+    self._m2 -= ( ( evicted - evicted_mean ) ** 2 ).sum( 0 ) + \
+      delta ** 2 * kept * removed / count
+    self._mean[...] = kept_mean
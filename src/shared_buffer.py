@@ -0,0 +1,332 @@
+import os
+import tempfile
+import time
+import numpy as np
+#shared_buffer.py
+
+try:
+  from . import locks
+  from .rolling_buffer import RollingBuffer, TIMESTAMP_DTYPES, item_shape
+except ( ImportError, ValueError ):
+  import locks
+  from rolling_buffer import RollingBuffer, TIMESTAMP_DTYPES, item_shape
+
+# header layout, int64 slots at the start of the mapping
+MAGIC       = 0  # set last when the creator finished the layout
+LENGTH      = 1  # number of items held by the buffer
+HEAD        = 2  # slot the next item will be written to
+ROLLCOUNT   = 3  # shared sequence number, items added so far
+SEQUENCE    = 4  # seqlock counter, odd while a write is in progress
+NDIM        = 5  # number of item dimensions
+DIMS        = 6  # item dimensions, up to MAX_DIMS slots
+MAX_DIMS    = 8
+DTYPE       = 14 # item dtype string, e.g. '<i2', packed into the slot
+TIMESTAMP_DTYPE = 15 # '<f8' seconds or '<i8' nanoseconds
+FIRST       = 16 # sequence number of the oldest item that may be held
+PENDING_HEAD = 17 # HEAD before the write in progress
+PENDING_ROLLCOUNT = 18 # ROLLCOUNT before the write in progress
+PENDING_COUNT = 19 # slots the write in progress covers from PENDING_HEAD
+HEADER_SIZE = 20 # slots, keeps the data 8 byte aligned
+
+MAGIC_VALUE = 0x7079646163710003 # 'pydacq' + layout version
+
+def shared_path( name ):
+  """
+  -----------------------------------------------------------------------------
+  file backing the shared buffer `name`, in shared memory where available
+  """
+  directory = '/dev/shm' if os.path.isdir( '/dev/shm' ) else \
+    tempfile.gettempdir()
+  return os.path.join( directory, 'pydacq_%s' % name )
+
+def pack_dtype( dtype ):
+  """
+  -----------------------------------------------------------------------------
+  dtype string of a plain dtype as one int64 header slot
+  """
+  return np.frombuffer( np.dtype( dtype ).str.encode( 'ascii' ).ljust( 8,
+    b'\0' ), dtype = np.int64 )[0]
+
+def unpack_dtype( value ):
+  """
+  -----------------------------------------------------------------------------
+  dtype from a header slot written by pack_dtype
+  """
+  name = np.array( value, dtype = np.int64 ).tobytes().rstrip( b'\0' )
+  return np.dtype( name.decode( 'ascii' ) )
+
+
+class MappedSeqLock( locks.SeqLock ):
+  """
+  #############################################################################
+  SeqLock with its sequence in a mapped header, readable by other processes
+
+  publish is called at the end of every write, while the sequence is still
+  odd, to copy the writer's state into the header
+  """
+
+  _header  = None
+  _publish = None
+
+  def __init__( self, header, publish = None ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    locks.SeqLock.__init__( self )
+    self._header = header
+    self._publish = publish
+    pass
+
+  def acquire( self ):
+    self._lock.acquire()
+    self._header[ SEQUENCE ] += 1
+
+  def release( self ):
+    if self._publish:
+      self._publish()
+    self._header[ SEQUENCE ] += 1
+    self._lock.release()
+
+  def read_begin( self ):
+    sequence = self._header[ SEQUENCE ]
+    while sequence & 1:
+      # yield to the writer
+      time.sleep( 0 )
+      sequence = self._header[ SEQUENCE ]
+    return sequence
+
+  def read_retry( self, sequence ):
+    return self._header[ SEQUENCE ] != sequence
+
+
+class SharedRollingBuffer( RollingBuffer ):
+  """
+  #############################################################################
+  Ring mode RollingBuffer in named shared memory
+
+  one process creates the buffer with reset( length, dimensions ) and is
+  the only writer, other processes attach() to it by name and read through
+  the usual getters or zero copy read only views. Writes are published
+  with a seqlock in the shared header, readers never block the writer.
+  """
+
+  _name    = None # name other processes attach with
+  _path    = None # file backing the mapping
+  _map     = None # np.memmap of the whole file
+  _header  = None # int64 header slots
+  _owner   = False # True in the creating (writing) process
+
+  def __init__( self, name ):
+    """
+    ---------------------------------------------------------------------------
+    Constructor
+    """
+    RollingBuffer.__init__( self, 'seqlock' )
+    self._name = name
+    self._path = shared_path( name )
+    pass
+
+  def __del__( self ):
+    """
+    ---------------------------------------------------------------------------
+    Make sure the shared memory is released
+    """
+    self.close()
+    pass
+
+  def reset( self, length = 100, dimensions = (1), ring = True, dtype = float,
+      timestamp_dtype = float ):
+    """
+    ---------------------------------------------------------------------------
+    create (or recreate) the shared buffer, this process becomes the writer
+
+    shared buffers are always rings, the ring argument is ignored, dtype
+    must be a plain (not structured) dtype of at most 8 characters
+    """
+    self.close()
+
+    shape = item_shape( dimensions )
+    dtype = np.dtype( dtype )
+    timestamp_dtype = np.dtype( timestamp_dtype )
+    if len( shape ) > MAX_DIMS or dtype.names or len( dtype.str ) > 8 or \
+        timestamp_dtype not in TIMESTAMP_DTYPES:
+      return False
+
+    # header, timestamps and data back to back in one zero filled file
+    size = 8 * ( HEADER_SIZE + length ) + \
+      length * int( np.prod( shape ) ) * dtype.itemsize
+    self._map = np.memmap( self._path, dtype = np.uint8, mode = 'w+',
+      shape = ( size, ) )
+    self._owner = True
+    self._layout( length, shape, dtype, timestamp_dtype )
+
+    self._header[ LENGTH ] = length
+    self._header[ NDIM ] = len( shape )
+    self._header[ DIMS:DIMS + len( shape ) ] = shape
+    self._header[ DTYPE ] = pack_dtype( dtype )
+    self._header[ TIMESTAMP_DTYPE ] = pack_dtype( timestamp_dtype )
+
+    # keep track of the requested dimensions
+    self._dimensions = shape
+    self._reset_stats()
+
+    # attached readers may look at the buffer from now on
+    self._header[ MAGIC ] = MAGIC_VALUE
+
+    return True
+
+  def attach( self ):
+    """
+    ---------------------------------------------------------------------------
+    attach to a buffer created by another process, read only
+    """
+    self.close()
+
+    if not os.path.exists( self._path ):
+      return False
+
+    self._map = np.memmap( self._path, dtype = np.uint8, mode = 'r' )
+    header = self._map[ :8 * HEADER_SIZE ].view( np.int64 )
+    if header[ MAGIC ] != MAGIC_VALUE:
+      self._map = None
+      return False
+
+    self._owner = False
+    self._layout_from( header )
+    self._reset_stats()
+
+    return True
+
+  def close( self ):
+    """
+    ---------------------------------------------------------------------------
+    drop the mapping, the creator also removes the shared memory
+    """
+    if self._map is None:
+      return
+
+    self._timestamps = None
+    self._data = None
+    self._header = None
+    self._map = None
+
+    if self._owner and os.path.exists( self._path ):
+      os.remove( self._path )
+    self._owner = False
+
+  def add_new( self, new_timestamp, new_data ):
+    """
+    ---------------------------------------------------------------------------
+    Add a new data item to the buffer, creator only
+    """
+    if not self._owner:
+      return False
+    self._begin_write( 1 )
+    return RollingBuffer.add_new( self, new_timestamp, new_data )
+
+  def add_many( self, new_timestamps, new_block ):
+    """
+    ---------------------------------------------------------------------------
+    Add a block of items to the buffer, creator only
+    """
+    if not self._owner:
+      return False
+    self._begin_write( np.shape( new_timestamps )[0] )
+    return RollingBuffer.add_many( self, new_timestamps, new_block )
+
+  def get_views( self ):
+    """
+    ---------------------------------------------------------------------------
+    live read only views of the storage, no copy at all
+
+    returns ( timestamps, data, head, sequence ), the newest item sits at
+    head - 1, the views keep changing under the caller, compare sequence
+    with get_sequence() after use to know the data was not overwritten
+    """
+    head, sequence = self._read( self._copy_position )
+    timestamps = self._timestamps.view()
+    data = self._data.view()
+    timestamps.flags.writeable = False
+    data.flags.writeable = False
+    return timestamps, data, head, sequence
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _layout( self, length, shape, dtype, timestamp_dtype ):
+    """
+    ---------------------------------------------------------------------------
+    carve header, timestamps and data views out of the mapping
+    """
+    header_end = 8 * HEADER_SIZE
+    data_start = header_end + 8 * length
+
+    self._header = self._map[ :header_end ].view( np.int64 )
+    self._timestamps = self._map[ header_end:data_start ].view(
+      timestamp_dtype )
+    self._data = self._map[ data_start: ].view( dtype ).reshape(
+      ( length, ) + tuple( shape ) )
+    self._dtype = np.dtype( dtype )
+
+    self._length = length
+    self._ring = True
+    self._head = int( self._header[ HEAD ] )
+    self._rollcount = int( self._header[ ROLLCOUNT ] )
+    self._first = int( self._header[ FIRST ] )
+    self._snapshot = None
+    self._generation += 1
+    self._lock = MappedSeqLock( self._header, self._publish )
+
+  def _layout_from( self, header ):
+    """
+    ---------------------------------------------------------------------------
+    layout of an existing buffer as its header describes it
+    """
+    shape = tuple( int( dim ) for dim in header[ DIMS:DIMS + header[ NDIM ] ] )
+    self._layout( int( header[ LENGTH ] ), shape,
+      unpack_dtype( header[ DTYPE ] ), unpack_dtype( header[ TIMESTAMP_DTYPE ] ) )
+    self._dimensions = shape
+
+  def _begin_write( self, count ):
+    """
+    ---------------------------------------------------------------------------
+    record the slots the next write covers, only looked at if the write is
+    cut short and leaves the seqlock odd, see MappedRollingBuffer.open
+    """
+    self._header[ PENDING_HEAD ] = self._head
+    self._header[ PENDING_ROLLCOUNT ] = self._rollcount
+    self._header[ PENDING_COUNT ] = min( count, self._length )
+
+  def _publish( self ):
+    """
+    ---------------------------------------------------------------------------
+    copy write head and sequence number into the shared header
+    """
+    self._header[ HEAD ] = self._head
+    self._header[ ROLLCOUNT ] = self._rollcount
+
+  def _read( self, copy_fn, *args ):
+    """
+    ---------------------------------------------------------------------------
+    attached readers pick up the writer's position inside the read section
+    """
+    if self._owner:
+      return RollingBuffer._read( self, copy_fn, *args )
+
+    def mapped_copy( *args ):
+      self._head = int( self._header[ HEAD ] )
+      self._rollcount = int( self._header[ ROLLCOUNT ] )
+      self._first = int( self._header[ FIRST ] )
+      return copy_fn( *args )
+
+    return RollingBuffer._read( self, mapped_copy, *args )
+
+  def _copy_position( self ):
+    """
+    ---------------------------------------------------------------------------
+    current write head and sequence number
+    """
+    return self._head, self._rollcount
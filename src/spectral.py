@@ -0,0 +1,206 @@
+import numpy as np
+#spectral.py
+
+try:
+  from .polling_acquisition import stack_packets
+except ( ImportError, ValueError ):
+  from polling_acquisition import stack_packets
+
+# window functions by name, periodic versions as used for spectral estimates
+WINDOWS = {
+  'hann'    : lambda n: 0.5 - 0.5 * np.cos( 2 * np.pi * np.arange( n ) / n ),
+  'hamming' : lambda n: 0.54 - 0.46 * np.cos( 2 * np.pi * np.arange( n ) / n ),
+  'boxcar'  : lambda n: np.ones( n ),
+}
+
+class WelchAnalyzer():
+  """
+  #############################################################################
+  Streaming Welch power spectral density estimate
+
+  samples are collected into overlapping segments, each segment is
+  transformed once when it completes and its periodogram replaces the
+  oldest in a running average of the last `averages` segments. Readers get
+  the latest average without any computation, so the cost follows the input
+  rate, not how often the spectrum is displayed. Feed it from a RollingBuffer
+  (attach / update), a PollingAquisition (write_batch, e.g. as a subscriber)
+  or directly with add_samples.
+  """
+
+  _segment_length = 256
+  _hop            = 128 # samples between segment starts
+  _sample_rate    = 1.0
+  _averages       = 8 # segments in the average
+  _detrend        = True # remove each segment's mean
+
+  # cached per setup
+  _window         = None # window function, shaped to broadcast over channels
+  _scale          = None # periodogram scaling, one sided density
+  _frequencies    = None
+
+  # segment in progress
+  _pending        = None
+  _filled         = 0
+
+  # running average
+  _periodograms   = None # ring of the last `averages` periodograms
+  _sum            = None
+  _segments       = 0 # segments completed so far
+  _spectrum       = None # published ( segments, psd ), read only
+
+  # RollingBuffer source
+  _source         = None
+  _sequence       = 0
+
+  def setup( self, segment_length = None, overlap = 0.5, sample_rate = None,
+      averages = None, window = 'hann', channels = (), detrend = True ):
+    """
+    ---------------------------------------------------------------------------
+    setup function, segments of segment_length samples overlapping by
+    `overlap`, averaged over the last `averages` segments
+
+    channels is the shape of one sample, () for a single channel, returns
+    False for bad settings
+    """
+    if segment_length:
+      self._segment_length = segment_length
+    if sample_rate:
+      self._sample_rate = sample_rate
+    if averages:
+      self._averages = averages
+    if window not in WINDOWS or not 0 <= overlap < 1:
+      return False
+    self._detrend = detrend
+    self._hop = max( 1, int( round( self._segment_length * ( 1 - overlap ) ) ) )
+
+    channels = tuple( int( dim ) for dim in np.atleast_1d( channels ) ) \
+      if channels != () else ()
+    length = self._segment_length
+    values = WINDOWS[ window ]( length )
+    self._window = values.reshape( ( length, ) + ( 1, ) * len( channels ) )
+
+    # one sided density, interior bins count for both halves of the spectrum
+    frequencies = np.fft.rfftfreq( length, 1.0 / self._sample_rate )
+    scale = np.full( len( frequencies ), 2.0 / ( self._sample_rate *
+      np.sum( values ** 2 ) ) )
+    scale[0] /= 2
+    if length % 2 == 0:
+      scale[-1] /= 2
+    self._scale = scale.reshape( ( len( frequencies ), ) + ( 1, ) *
+      len( channels ) )
+    self._frequencies = frequencies
+    self._frequencies.flags.writeable = False
+
+    self._pending = np.zeros( ( length, ) + channels )
+    self._filled = 0
+    self._periodograms = np.zeros( ( self._averages, len( frequencies ) ) +
+      channels )
+    self._sum = np.zeros( ( len( frequencies ), ) + channels )
+    self._segments = 0
+    self._spectrum = None
+
+    return True
+
+  def add_samples( self, block ):
+    """
+    ---------------------------------------------------------------------------
+    feed samples, oldest first, shape (n,)+channels
+    """
+    block = np.asarray( block )
+    if np.shape( block )[1:] != self._pending.shape[1:]:
+      return False
+
+    done = 0
+    length = self._segment_length
+    while done < len( block ):
+      taken = min( len( block ) - done, length - self._filled )
+      self._pending[ self._filled:self._filled + taken ] = \
+        block[ done:done + taken ]
+      self._filled += taken
+      done += taken
+
+      if self._filled == length:
+        self._add_segment( self._pending )
+        # keep the overlap for the next segment
+        kept = length - self._hop
+        if kept > 0:
+          self._pending[ :kept ] = self._pending[ self._hop: ].copy()
+        self._filled = max( kept, 0 )
+
+    return True
+
+  def write_batch( self, packets ):
+    """
+    ---------------------------------------------------------------------------
+    PollingAquisition write_batch / subscriber callback, one sample per packet
+    """
+    block = stack_packets( packets )
+    if block is None:
+      block = np.array( packets )
+    self.add_samples( block )
+
+  def attach( self, rbuffer ):
+    """
+    ---------------------------------------------------------------------------
+    take samples from a RollingBuffer, one per item, from now on
+    """
+    self._source = rbuffer
+    self._sequence = rbuffer.get_sequence()
+
+  def update( self ):
+    """
+    ---------------------------------------------------------------------------
+    feed the items added to the attached RollingBuffer since the last update
+
+    returns the number of new samples, a gap (items lost because update was
+    called too rarely) restarts the segment in progress
+    """
+    if self._source is None:
+      return 0
+    timestamps, data, self._sequence, lost = self._source.get_since(
+      self._sequence )
+    if lost:
+      self._filled = 0
+    self.add_samples( data[ ::-1 ] )
+    return len( data )
+
+  def get_spectrum( self ):
+    """
+    ---------------------------------------------------------------------------
+    ( frequencies, psd, segments ) of the latest average, read only arrays
+
+    psd has shape (n_frequencies,)+channels and averages the last
+    min( segments, averages ) segments, None before the first segment
+    """
+    spectrum = self._spectrum
+    if spectrum is None:
+      return None
+    return self._frequencies, spectrum[1], spectrum[0]
+
+  """
+  *****************
+  PRIVATES
+  """
+
+  def _add_segment( self, segment ):
+    """
+    ---------------------------------------------------------------------------
+    periodogram of a completed segment into the running average
+    """
+    if self._detrend:
+      segment = segment - segment.mean( 0 )
+    spectrum = np.fft.rfft( segment * self._window, axis = 0 )
+    periodogram = ( spectrum.real ** 2 + spectrum.imag ** 2 ) * self._scale
+
+    slot = self._segments % self._averages
+    self._sum += periodogram - self._periodograms[ slot ]
+    self._periodograms[ slot ] = periodogram
+    self._segments += 1
+    if slot == self._averages - 1:
+      # once around the ring, drop the rounding drift of the running sum
+      self._sum = self._periodograms.sum( 0 )
+
+    # publish a new read only average, readers never see a partial one
+    psd = self._sum / min( self._segments, self._averages )
+    psd.flags.writeable = False
+    self._spectrum = ( self._segments, psd )
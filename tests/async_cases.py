@@ -0,0 +1,99 @@
+import unittest
+import asyncio
+import pydacq.async_acquisition
+#async_cases.py
+
+# async def is a syntax error on Python 2, so these are not a test_ module,
+# test_async_acquisition imports them on interpreters that can compile them
+
+class TestAsyncAcquisition( unittest.TestCase ):
+  """
+  #############################################################################
+  asyncio counterpart of PollingAquisition
+  """
+
+  def test_polling_tasks( self ):
+    pacq = pydacq.async_acquisition.AsyncPollingAquisition()
+    pacq.setup( 10 )
+    self.read_count = 0
+    self.written = []
+
+    async def read_fn():
+      self.read_count += 1
+      await asyncio.sleep( 0.001 )
+      return self.read_count
+
+    async def write_fn( packet ):
+      self.written.append( packet )
+
+    pacq.read = read_fn
+    pacq.write = write_fn
+
+    async def run():
+      await pacq.start()
+      await asyncio.sleep( 0.1 )
+      await pacq._queue.join()
+      await pacq.stop()
+
+    asyncio.run( run() )
+
+    self.assertTrue( len( self.written ) > 0, 'nothing was written' )
+    self.assertEqual( self.written, list( range( 1, len( self.written ) + 1 ) ),
+      'packets lost or out of order' )
+    self.assertEqual( pacq._packets_written, len( self.written ),
+      'write counter does not match' )
+    self.assertFalse( pacq._running, 'still running after stop' )
+    pass
+
+  def test_overflow_when_consumer_stalls( self ):
+    pacq = pydacq.async_acquisition.AsyncPollingAquisition()
+    pacq.setup( 2 )
+    pacq._data_in_timeout = 1
+
+    async def read_fn():
+      await asyncio.sleep( 0 )
+      return 1
+
+    async def write_fn( packet ):
+      await asyncio.sleep( 10 )
+
+    pacq.read = read_fn
+    pacq.write = write_fn
+
+    async def run():
+      await pacq.start()
+      await asyncio.sleep( 0.05 )
+      await pacq.stop()
+
+    asyncio.run( run() )
+
+    self.assertTrue( pacq._overflows > 0, 'overflows not counted' )
+    pass
+
+  def test_many_sources_one_loop( self ):
+    sources = [ pydacq.async_acquisition.AsyncPollingAquisition()
+      for i in range( 200 ) ]
+    self.total = 0
+
+    async def read_fn():
+      await asyncio.sleep( 0.005 )
+      return 1
+
+    async def write_fn( packet ):
+      self.total += packet
+
+    async def run():
+      for source in sources:
+        source.setup( 10 )
+        source.read = read_fn
+        source.write = write_fn
+        await source.start()
+      await asyncio.sleep( 0.1 )
+      for source in sources:
+        await source.stop()
+
+    asyncio.run( run() )
+
+    self.assertTrue( all( source._packets_read > 0 for source in sources ),
+      'a source was starved' )
+    pass
@@ -0,0 +1,175 @@
+import unittest
+import os
+import socket
+import threading
+import time
+import pydacq.acquisition_manager
+#test_acquisition_manager.py
+
+class TestAcquisitionManager( unittest.TestCase ):
+  """
+  #############################################################################
+  many sources on one selector thread and a worker pool
+  """
+
+  def setUp( self ):
+    self.manager = pydacq.acquisition_manager.AcquisitionManager( workers = 4 )
+    self.pairs = []
+    pass
+
+  def tearDown( self ):
+    self.manager.stop()
+    for pair in self.pairs:
+      for end in pair:
+        end.close()
+    pass
+
+  def add_socket_source( self, received ):
+    """
+    ---------------------------------------------------------------------------
+    a socketpair source, returns the sending end
+    """
+    pair = socket.socketpair()
+    self.pairs.append( pair )
+    reader = pair[0]
+    self.manager.add( lambda: reader.recv( 64 ), received.append,
+      fileobj = reader )
+    return pair[1]
+
+  def test_many_sockets_few_threads( self ):
+    threads = threading.active_count()
+    outputs = [ [] for i in range( 200 ) ]
+    senders = [ self.add_socket_source( output ) for output in outputs ]
+    self.manager.start()
+    # workers, the selector thread and the pool's three handler threads
+    self.assertTrue( threading.active_count() - threads <= 4 + 4,
+      'threads grow with the sources' )
+
+    for round in range( 3 ):
+      for i, sender in enumerate( senders ):
+        sender.send( b'%d:%d;' % ( i, round ) )
+      time.sleep( 0.05 )
+    time.sleep( 0.2 )
+    self.manager.stop()
+
+    # each source has its own output and counters, in order
+    for i, output in enumerate( outputs ):
+      self.assertEqual( b''.join( output ), b''.join( b'%d:%d;' % ( i, round )
+        for round in range( 3 ) ), 'source %d out of order or incomplete' % i )
+    stats = self.manager.stats()
+    self.assertEqual( len( stats[ 'sources' ] ), 200 )
+    self.assertEqual( sum( source[ 'packets_written' ]
+      for source in stats[ 'sources' ] ), sum( len( output )
+      for output in outputs ) )
+    self.assertTrue( stats[ 'sources' ][0][ 'schedule_delay' ][ 'count' ] > 0 )
+    pass
+
+  def test_polled_source( self ):
+    counter = [ 0 ]
+    batches = []
+
+    def read_fn():
+      counter[0] += 1
+      return counter[0]
+
+    source = self.manager.add( read_fn, write_batch = batches.append,
+      period = 10, batch_size = 10 )
+    self.manager.start()
+    time.sleep( 0.2 )
+    self.manager.stop()
+
+    values = [ value for batch in batches for value in batch ]
+    self.assertEqual( values, list( range( 1, len( values ) + 1 ) ) )
+    # about 20 reads in 0.2 s, not a busy loop
+    self.assertTrue( 5 < source.stats()[ 'packets_read' ] < 40,
+      'period not followed' )
+    pass
+
+  def test_block_waits_without_spinning( self ):
+    counter = [ 0 ]
+    written = []
+
+    def read_fn():
+      counter[0] += 1
+      return counter[0]
+
+    def write_fn( packet ):
+      written.append( packet )
+      time.sleep( 0.02 )
+
+    source = self.manager.add( read_fn, write_fn, period = 1, size = 1,
+      overflow = 'block' )
+    self.manager.start()
+    began = os.times()
+    time.sleep( 0.3 )
+    ended = os.times()
+    self.manager.stop()
+
+    # the slow writer sets the pace, nothing is dropped or spun on
+    busy = ( ended[0] + ended[1] ) - ( began[0] + began[1] )
+    self.assertTrue( busy < 0.15, 'waited for space in a busy loop' )
+    self.assertEqual( written, list( range( 1, len( written ) + 1 ) ),
+      'packets lost or out of order' )
+    stats = source.stats()
+    self.assertEqual( stats[ 'overflows' ], 0, 'packets dropped' )
+    self.assertTrue( stats[ 'packets_read' ] <= len( written ) + 2,
+      'reads not held back by the writer' )
+    pass
+
+  def test_read_errors_back_off( self ):
+    def read_fn():
+      raise IOError( 'sensor gone' )
+    source = self.manager.add( read_fn, period = 1 )
+    self.manager.start()
+    time.sleep( 0.2 )
+    self.manager.stop()
+    # 1, 2, 4, ... 100 ms instead of a read every ms
+    self.assertTrue( 3 < source.stats()[ 'read_errors' ] < 20,
+      'errors not backed off' )
+    pass
+
+  def test_remove( self ):
+    kept = []
+    removed = []
+    keep = self.add_socket_source( kept )
+    drop = self.add_socket_source( removed )
+    self.manager.start()
+    keep.send( b'a' )
+    drop.send( b'a' )
+    time.sleep( 0.05 )
+
+    self.assertTrue( self.manager.remove( self.manager.sources()[1] ) )
+    self.assertEqual( len( self.manager.sources() ), 1 )
+    keep.send( b'b' )
+    drop.send( b'b' )
+    time.sleep( 0.05 )
+    self.manager.stop()
+
+    self.assertEqual( b''.join( kept ), b'ab' )
+    self.assertEqual( b''.join( removed ), b'a', 'removed source still read' )
+    pass
+
+  def test_oneshot_until_rearmed( self ):
+    poller = pydacq.acquisition_manager._Poller()
+    if not poller.oneshot:
+      poller.close()
+      self.skipTest( 'no epoll' )
+    pair = socket.socketpair()
+    self.pairs.append( pair )
+    poller.register( pair[0], 'source', oneshot = True )
+    pair[1].send( b'a' )
+
+    self.assertEqual( poller.select( 0.05 ), [ 'source' ] )
+    # still readable, not reported while a worker has it
+    self.assertEqual( poller.select( 0.05 ), [] )
+    poller.rearm( pair[0] )
+    self.assertEqual( poller.select( 0.05 ), [ 'source' ] )
+    poller.close()
+    pass
+
+  def test_bad_settings( self ):
+    self.assertIsNone( self.manager.add( lambda: 0 ),
+      'accepted a source with neither fileobj nor period' )
+    self.assertIsNone( self.manager.add( lambda: 0, period = 1,
+      overflow = 'nope' ), 'accepted a bad overflow policy' )
+    pass
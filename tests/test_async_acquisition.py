@@ -0,0 +1,13 @@
+import sys
+import unittest
+#test_async_acquisition.py
+
+# the asyncio tests need async def and asyncio.run, Python 3.7 on
+if sys.version_info >= ( 3, 7 ):
+  try:
+    from .async_cases import TestAsyncAcquisition
+  except ( ImportError, ValueError ):
+    from async_cases import TestAsyncAcquisition
+
+if __name__ == '__main__':
+    unittest.main()
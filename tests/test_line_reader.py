@@ -0,0 +1,140 @@
+import unittest
+import socket
+import threading
+import time
+import numpy as np
+import pydacq.line_reader
+#test_line_reader.py
+
+def sensor_lines( count ):
+  """
+  -----------------------------------------------------------------------------
+  SensorLog style csv lines, date, id, time and three values
+  """
+  return b''.join( ( '2013-12-30 16:14:56.677,%d,%.2f,%d,%d,%d\r\n' % (
+    i, i * 0.01, i, -i, 2 * i ) ).encode( 'ascii' ) for i in range( count ) )
+
+class TestLineParser( unittest.TestCase ):
+  """
+  #############################################################################
+  line reassembly and bulk parsing
+  """
+
+  def test_reassembles_chunks( self ):
+    parser = pydacq.line_reader.LineParser( columns = ( 2, 3, 4, 5 ) )
+    stream = sensor_lines( 500 )
+    blocks = []
+    # chunks that cut lines, numbers and the \r\n pair anywhere
+    start = 0
+    for size in [ 7, 1, 300, 13, 1024 ] * 20:
+      blocks.append( parser.feed( stream[ start:start + size ] ) )
+      start += size
+    blocks.append( parser.feed( stream[ start: ] ) )
+
+    block = np.concatenate( blocks )
+    self.assertEqual( block.shape, ( 500, 4 ) )
+    self.assertTrue( np.array_equal( block[ :, 1 ], np.arange( 500 ) ) )
+    self.assertTrue( np.array_equal( block[ :, 3 ], 2 * np.arange( 500 ) ) )
+    self.assertEqual( parser.pending(), 0 )
+    self.assertEqual( parser.bad_lines(), 0 )
+    pass
+
+  def test_skips_bad_lines( self ):
+    parser = pydacq.line_reader.LineParser()
+    block = parser.feed( b'1,2,3\n4,5\n\n6,x,8\n9,10,11\n12,' )
+    self.assertTrue( np.array_equal( block, [ [ 1, 2, 3 ], [ 9, 10, 11 ] ] ) )
+    self.assertEqual( parser.bad_lines(), 2 )
+    self.assertEqual( parser.pending(), 3 )
+    pass
+
+  def test_no_matching_lines( self ):
+    parser = pydacq.line_reader.LineParser( fields = 3 )
+    block = parser.feed( b'a,b\n' )
+    self.assertEqual( block.shape, ( 0, 3 ) )
+    self.assertEqual( parser.bad_lines(), 1 )
+    pass
+
+  def test_learns_fields_despite_cut_first_line( self ):
+    parser = pydacq.line_reader.LineParser( columns = ( 2, 3, 4, 5 ) )
+    # joined mid line, the tail of a line has too few fields
+    self.assertEqual( parser.feed( b'0,0\r\n' ).shape, ( 0, 4 ) )
+    block = parser.feed( b'0,0\r\n' + sensor_lines( 10 ) )
+    self.assertTrue( np.array_equal( block[ :, 1 ], np.arange( 10 ) ) )
+    self.assertEqual( parser.bad_lines(), 2 )
+
+    # learned again after a reset
+    parser = pydacq.line_reader.LineParser()
+    self.assertEqual( parser.feed( b'1,2,3\n' ).shape, ( 1, 3 ) )
+    parser.reset()
+    self.assertTrue( np.array_equal( parser.feed( b'4,5\n' ), [ [ 4, 5 ] ] ) )
+    pass
+
+class TestSocketAquisition( unittest.TestCase ):
+  """
+  #############################################################################
+  line protocol sources on the loopback interface
+  """
+
+  def collect( self, pacq ):
+    """
+    ---------------------------------------------------------------------------
+    start the acquisition, returns the list it writes blocks to
+    """
+    blocks = []
+    pacq.write = lambda block: blocks.append( block )
+    pacq.setup( 100 )
+    pacq.start()
+    return blocks
+
+  def test_tcp( self ):
+    server = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+    server.bind( ( '127.0.0.1', 0 ) )
+    server.listen( 1 )
+    stream = sensor_lines( 20000 )
+
+    def serve():
+      connection, address = server.accept()
+      for start in range( 0, len( stream ), 999 ):
+        connection.sendall( stream[ start:start + 999 ] )
+      time.sleep( 0.2 )
+      connection.close()
+    thread = threading.Thread( target = serve )
+    thread.start()
+
+    pacq = pydacq.line_reader.SocketAquisition( server.getsockname(),
+      columns = ( 3, 4, 5 ) )
+    blocks = self.collect( pacq )
+    thread.join()
+    time.sleep( 0.1 )
+    pacq.stop()
+    pacq.shutdown()
+    server.close()
+
+    block = np.concatenate( blocks )
+    self.assertEqual( block.shape, ( 20000, 3 ) )
+    self.assertTrue( np.array_equal( block[ :, 0 ], np.arange( 20000 ) ),
+      'samples lost or out of order' )
+    self.assertTrue( len( blocks ) < 20000, 'not batched' )
+    pass
+
+  def test_udp( self ):
+    probe = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+    probe.bind( ( '127.0.0.1', 0 ) )
+    address = probe.getsockname()
+    probe.close()
+
+    pacq = pydacq.line_reader.SocketAquisition( address, udp = True )
+    blocks = self.collect( pacq )
+    sender = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+    for i in range( 0, 100, 4 ):
+      sender.sendto( b''.join( b'%d,%d\n' % ( j, -j )
+        for j in range( i, i + 4 ) ), address )
+      time.sleep( 0.001 )
+    time.sleep( 0.2 )
+    pacq.stop()
+    pacq.shutdown()
+    sender.close()
+
+    block = np.concatenate( blocks )
+    self.assertTrue( np.array_equal( block[ :, 0 ], np.arange( 100 ) ) )
+    pass
@@ -0,0 +1,68 @@
+import unittest
+import threading
+import pydacq.locks
+import time
+#test_locks.py
+
+class TestLocks( unittest.TestCase ):
+  """
+  #############################################################################
+  lock strategies for shared data structures
+  """
+
+  def test_rwlock_shares_readers( self ):
+    lock = pydacq.locks.ReadWriteLock()
+    self.got_read = False
+
+    def read_fn():
+      lock.acquire_read()
+      self.got_read = True
+      lock.release_read()
+
+    # a second reader gets in while the first one holds the lock
+    lock.acquire_read()
+    rt = threading.Thread( target = read_fn )
+    rt.start()
+    rt.join( 1.0 )
+    lock.release_read()
+
+    self.assertTrue( self.got_read, 'reader blocked by another reader' )
+    pass
+
+  def test_rwlock_writer_excludes_readers( self ):
+    lock = pydacq.locks.ReadWriteLock()
+    self.got_read = False
+
+    def read_fn():
+      lock.acquire_read()
+      self.got_read = True
+      lock.release_read()
+
+    # acquire the write side, simulates a writer in progress
+    lock.acquire()
+    rt = threading.Thread( target = read_fn )
+    rt.start()
+    time.sleep( 0.05 )
+
+    self.assertFalse( self.got_read, 'reader got in during a write' )
+
+    # release the writer, reader should finish
+    lock.release()
+    rt.join()
+
+    self.assertTrue( self.got_read, 'reader blocked after write finished' )
+    pass
+
+  def test_seqlock_detects_write( self ):
+    lock = pydacq.locks.SeqLock()
+
+    sequence = lock.read_begin()
+    self.assertFalse( lock.read_retry( sequence ), 'retry without write' )
+
+    lock.acquire()
+    lock.release()
+    self.assertTrue( lock.read_retry( sequence ), 'write went unnoticed' )
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
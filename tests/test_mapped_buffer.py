@@ -0,0 +1,123 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import pydacq.mapped_buffer
+import pydacq.shared_buffer
+#test_mapped_buffer.py
+
+class TestMappedBuffer( unittest.TestCase ):
+  """
+  #############################################################################
+  ring mode RollingBuffer persisted in a memory mapped file
+  """
+
+  def setUp( self ):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join( self.directory, 'history.buf' )
+    self.rbuffer = pydacq.mapped_buffer.MappedRollingBuffer( self.path )
+    self.rbuffer.reset( 10, ( 2, 3 ) )
+    pass
+
+  def tearDown( self ):
+    self.rbuffer.close()
+    shutil.rmtree( self.directory )
+    pass
+
+  def test_reopen_keeps_contents( self ):
+    data_array = np.random.rand( 15, 2, 3 )
+    self.rbuffer.add_many( np.arange( 15 ), data_array )
+    self.rbuffer.close()
+    self.assertTrue( os.path.exists( self.path ), 'close removed the file' )
+
+    reopened = pydacq.mapped_buffer.MappedRollingBuffer( self.path )
+    self.assertTrue( reopened.open(), 'could not reopen' )
+    self.assertEqual( reopened.get_sequence(), 15, 'lost the sequence' )
+    ts, data = reopened.get_all()
+    self.assertTrue( np.array_equal( ts, np.arange( 14, 4, -1 ) ),
+      'incorrect timestamps' )
+    self.assertTrue( np.array_equal( data, data_array[ :4:-1 ] ),
+      'incorrect data' )
+
+    # and carries on writing where it left off
+    self.assertTrue( reopened.add_new( 15, np.ones( ( 2, 3 ) ) ),
+      'reopened buffer refused a write' )
+    self.assertEqual( reopened.get_latest()[0], 15, 'write went missing' )
+    reopened.close()
+    pass
+
+  def test_reopen_after_interrupted_write( self ):
+    self.rbuffer.add_many( np.arange( 3 ), np.ones( ( 3, 2, 3 ) ) )
+    self.rbuffer.flush()
+
+    # the process died inside a write, the seqlock was left odd
+    self.rbuffer._begin_write( 1 )
+    self.rbuffer._header[ pydacq.shared_buffer.SEQUENCE ] += 1
+    self.rbuffer._owner = False
+    self.rbuffer._map.flush()
+    self.rbuffer = pydacq.mapped_buffer.MappedRollingBuffer( self.path )
+
+    self.assertTrue( self.rbuffer.open(), 'could not reopen' )
+    self.assertEqual( self.rbuffer.get_sequence(), 3,
+      'reads blocked on the interrupted write' )
+    pass
+
+  def test_reopen_drops_torn_slots( self ):
+    self.rbuffer.add_many( np.arange( 15 ), np.ones( ( 15, 2, 3 ) ) )
+
+    # the process died after writing the items, before publishing them
+    def crash():
+      raise KeyboardInterrupt()
+    self.rbuffer._lock.release = crash
+    self.assertRaises( KeyboardInterrupt, self.rbuffer.add_many,
+      [ 15, 16 ], 99 * np.ones( ( 2, 2, 3 ) ) )
+    self.rbuffer._owner = False
+    self.rbuffer._map.flush()
+    self.rbuffer = pydacq.mapped_buffer.MappedRollingBuffer( self.path )
+
+    self.assertTrue( self.rbuffer.open(), 'could not reopen' )
+    self.assertEqual( self.rbuffer.get_sequence(), 15,
+      'the torn write was counted' )
+    ts, data, sequence, lost = self.rbuffer.get_since( 0 )
+    self.assertTrue( np.array_equal( ts, np.arange( 14, 6, -1 ) ),
+      'torn slots still held' )
+    self.assertTrue( np.all( data == 1 ), 'torn data returned' )
+    ts, data = self.rbuffer.get_range( 0, 100 )
+    self.assertTrue( np.array_equal( ts, np.arange( 14, 6, -1 ) ) )
+
+    # new items fill the torn slots again
+    self.rbuffer.add_many( np.arange( 15, 18 ), np.ones( ( 3, 2, 3 ) ) )
+    ts, data, sequence, lost = self.rbuffer.get_since( 0 )
+    self.assertTrue( np.array_equal( ts, np.arange( 17, 7, -1 ) ) )
+    pass
+
+  def test_attach_reads_views( self ):
+    self.rbuffer.add_new( 1, np.ones( ( 2, 3 ) ) )
+
+    reader = pydacq.mapped_buffer.MappedRollingBuffer( self.path )
+    self.assertTrue( reader.attach(), 'could not attach' )
+    ts, data, head, sequence = reader.get_views()
+    self.assertTrue( isinstance( data.base, np.memmap ) or
+      isinstance( data, np.memmap ), 'views are not mapped' )
+    self.assertEqual( ts[ head - 1 ], 1, 'incorrect view contents' )
+    self.assertFalse( reader.add_new( 2, np.ones( ( 2, 3 ) ) ),
+      'attached reader accepted a write' )
+    reader.close()
+    self.assertTrue( os.path.exists( self.path ), 'reader removed the file' )
+    pass
+
+  def test_open_rejects_other_files( self ):
+    other = os.path.join( self.directory, 'other' )
+    with open( other, 'wb' ) as f:
+      f.write( b'\0' * 256 )
+    self.assertFalse(
+      pydacq.mapped_buffer.MappedRollingBuffer( other ).open(),
+      'opened a file that is not a buffer' )
+    self.assertFalse( pydacq.mapped_buffer.MappedRollingBuffer(
+      os.path.join( self.directory, 'missing' ) ).open(),
+      'opened a missing file' )
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
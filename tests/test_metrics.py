@@ -0,0 +1,75 @@
+import unittest
+import multiprocessing
+import numpy as np
+import pydacq.metrics
+#test_metrics.py
+
+class TestMetrics( unittest.TestCase ):
+  """
+  #############################################################################
+  Cheap always-on instrumentation
+  """
+
+  def test_histogram_percentiles( self ):
+    histogram = pydacq.metrics.Histogram()
+    # 90 fast samples and 10 slow ones
+    for i in range( 90 ):
+      histogram.add( 10e-6 )
+    for i in range( 10 ):
+      histogram.add( 5e-3 )
+
+    summary = histogram.summary()
+    self.assertEqual( summary[ 'count' ], 100, 'samples not counted' )
+    self.assertAlmostEqual( summary[ 'mean' ], 0.9 * 10e-6 + 0.1 * 5e-3 )
+    self.assertEqual( summary[ 'max' ], 5e-3, 'wrong max' )
+
+    # a percentile is the upper bound of its bucket, within a factor of two
+    self.assertTrue( 10e-6 <= summary[ 'p50' ] < 20e-6, 'wrong p50' )
+    self.assertTrue( 10e-6 <= summary[ 'p90' ] < 20e-6, 'wrong p90' )
+    self.assertTrue( 2.5e-3 <= summary[ 'p99' ] <= 5e-3, 'wrong p99' )
+    pass
+
+  def test_histogram_add_many_matches_add( self ):
+    samples = [ 0.0, 1e-7, 3e-6, 1e-3, 0.25, 1e6 ]
+    one = pydacq.metrics.Histogram()
+    for sample in samples:
+      one.add( sample )
+    many = pydacq.metrics.Histogram()
+    many.add_many( samples )
+
+    self.assertEqual( list( one._storage ), list( many._storage ),
+      'add_many and add disagree' )
+    many.reset()
+    self.assertEqual( many.summary()[ 'count' ], 0, 'reset kept samples' )
+    self.assertEqual( many.percentile( 50 ), 0.0, 'empty percentile not 0' )
+    pass
+
+  def test_histogram_add_many_vectorized_matches_add( self ):
+    # enough samples to skip the short list loop, bucket edges included
+    samples = [ 0.0, 1e-7, 1e-6, 2e-6, 3e-6, 4e-6, 1e-3, 1.024e-3, 0.25,
+      1.0, 2.0 ** -10, 3.5e-5, 7e-2, 60.0, 1e4, 1e6, 5e-6 ]
+    one = pydacq.metrics.Histogram()
+    for sample in samples:
+      one.add( sample )
+
+    for batch in ( samples, np.array( samples ) ):
+      many = pydacq.metrics.Histogram()
+      many.add_many( batch )
+      self.assertEqual( list( one._storage[ :pydacq.metrics.TOTAL ] ),
+        list( many._storage[ :pydacq.metrics.TOTAL ] ),
+        'add_many and add disagree on %s' % type( batch ).__name__ )
+      self.assertAlmostEqual( one._storage[ pydacq.metrics.TOTAL ],
+        many._storage[ pydacq.metrics.TOTAL ] )
+      self.assertEqual( one._storage[ pydacq.metrics.MAX ],
+        many._storage[ pydacq.metrics.MAX ] )
+    pass
+
+  def test_histogram_in_shared_storage( self ):
+    storage = multiprocessing.RawArray( 'd', pydacq.metrics.SLOTS )
+    pydacq.metrics.Histogram( storage ).add( 1e-3 )
+    self.assertEqual( pydacq.metrics.Histogram( storage ).count(), 1,
+      'sample not kept in the storage' )
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import threading
+try:
+  import Queue
+except ImportError:
+  import queue as Queue
+import numpy as np
+import pydacq.packet_ring
+#test_packet_ring.py
+
+class TestPacketRing( unittest.TestCase ):
+  """
+  #############################################################################
+  preallocated single producer / single consumer packet ring
+  """
+
+  def setUp( self ):
+    self.ring = pydacq.packet_ring.PacketRing( 4, ( 2, 3 ) )
+    pass
+
+  def test_put_get_wraps_in_order( self ):
+    for i in range( 10 ):
+      self.ring.put( np.ones( ( 2, 3 ) ) * i )
+      self.assertEqual( self.ring.get()[0, 0], i, 'packet out of order' )
+    self.assertEqual( self.ring.qsize(), 0, 'ring not empty' )
+    pass
+
+  def test_full_and_empty( self ):
+    self.assertRaises( Queue.Empty, self.ring.get, True, 0.01 )
+
+    for i in range( 4 ):
+      self.ring.put_nowait( np.ones( ( 2, 3 ) ) * i )
+    self.assertRaises( Queue.Full, self.ring.put, np.ones( ( 2, 3 ) ), True,
+      0.01 )
+
+    # a taken packet frees its slot
+    self.ring.get()
+    self.ring.put_nowait( np.ones( ( 2, 3 ) ) )
+    pass
+
+  def test_get_many_wraps( self ):
+    for i in range( 3 ):
+      self.ring.put( np.ones( ( 2, 3 ) ) * i )
+      self.ring.get()
+    for i in range( 3, 7 ):
+      self.ring.put( np.ones( ( 2, 3 ) ) * i )
+
+    block = self.ring.get_many( 10 )
+    self.assertEqual( block.shape, ( 4, 2, 3 ), 'incorrect block shape' )
+    self.assertEqual( list( block[ :, 0, 0 ] ), [ 3, 4, 5, 6 ],
+      'block out of order' )
+    pass
+
+  def test_threaded_transfer( self ):
+    ring = pydacq.packet_ring.PacketRing( 16, 8 )
+    received = []
+
+    def consume():
+      while len( received ) < 5000:
+        received.extend( ring.get_many( 100, 1.0 )[ :, 0 ] )
+
+    ct = threading.Thread( target = consume )
+    ct.start()
+    for i in range( 5000 ):
+      ring.put( np.ones( 8 ) * i, True, 1.0 )
+    ct.join()
+
+    self.assertEqual( received, list( range( 5000 ) ),
+      'packets lost or out of order' )
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
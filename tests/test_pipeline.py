@@ -0,0 +1,110 @@
+import unittest
+import time
+import numpy as np
+import pydacq.pipeline
+import pydacq.polling_acquisition
+#test_pipeline.py
+
+def difference( block ):
+  return block[ :, 0 ] - block[ :, 1 ]
+
+def iir_reference( b, a, x ):
+  """
+  -----------------------------------------------------------------------------
+  direct form IIR, y[n] = ( sum b[k] x[n-k] - sum a[k] y[n-k] ) / a[0]
+  """
+  y = np.zeros( x.shape )
+  for n in range( len( x ) ):
+    for k in range( len( b ) ):
+      if n - k >= 0:
+        y[n] += b[k] * x[ n - k ]
+    for k in range( 1, len( a ) ):
+      if n - k >= 0:
+        y[n] -= a[k] * y[ n - k ]
+    y[n] /= a[0]
+  return y
+
+class TestPipeline( unittest.TestCase ):
+  """
+  #############################################################################
+  batch processing stages
+  """
+
+  def setUp( self ):
+    self.samples = np.random.RandomState( 0 ).randn( 300, 3 )
+    pass
+
+  def run_in_batches( self, pipeline, sizes = ( 1, 7, 50, 2, 140, 100 ) ):
+    """
+    ---------------------------------------------------------------------------
+    samples through the pipeline in uneven batches, outputs joined
+    """
+    out = []
+    start = 0
+    for size in sizes:
+      out.append( pipeline.process( self.samples[ start:start + size ] ) )
+      start += size
+    return np.concatenate( out )
+
+  def test_scale_and_derive( self ):
+    pipeline = pydacq.pipeline.Pipeline( [
+      pydacq.pipeline.Scale( [ 2.0, 1.0, 0.5 ], [ 1.0, 0.0, 0.0 ] ),
+      pydacq.pipeline.Derive( difference ) ] )
+    out = self.run_in_batches( pipeline )
+    scaled = self.samples * [ 2.0, 1.0, 0.5 ] + [ 1.0, 0.0, 0.0 ]
+    np.testing.assert_allclose( out[ :, :3 ], scaled )
+    np.testing.assert_allclose( out[ :, 3 ], scaled[ :, 0 ] - scaled[ :, 1 ] )
+
+  def test_filters_keep_state_across_batches( self ):
+    taps = [ 0.25, 0.5, 0.25, 0.1 ]
+    b, a = [ 0.2, 0.3, 0.1 ], [ 1.0, -0.5, 0.2 ]
+    fir = self.run_in_batches( pydacq.pipeline.Pipeline( [
+      pydacq.pipeline.FIRFilter( taps ) ] ) )
+    iir = self.run_in_batches( pydacq.pipeline.Pipeline( [
+      pydacq.pipeline.IIRFilter( b, a ) ] ) )
+    np.testing.assert_allclose( fir, iir_reference( taps, [ 1.0 ], self.samples ) )
+    np.testing.assert_allclose( iir, iir_reference( b, a, self.samples ) )
+
+  def test_decimate_keeps_phase( self ):
+    out = self.run_in_batches( pydacq.pipeline.Pipeline( [
+      pydacq.pipeline.Decimate( 4 ) ] ) )
+    np.testing.assert_array_equal( out, self.samples[ ::4 ] )
+
+  def test_pool_matches_serial( self ):
+    stages = lambda: [ pydacq.pipeline.Scale( 3.0 ),
+      pydacq.pipeline.FIRFilter( [ 0.5, 0.3, 0.2 ] ),
+      pydacq.pipeline.IIRFilter( [ 0.5 ], [ 1.0, -0.4 ] ),
+      pydacq.pipeline.Derive( difference ),
+      pydacq.pipeline.Decimate( 3 ) ]
+    serial = self.run_in_batches( pydacq.pipeline.Pipeline( stages() ) )
+    pooled = pydacq.pipeline.Pipeline( stages(), workers = 3, min_rows = 5 )
+    try:
+      np.testing.assert_allclose( self.run_in_batches( pooled ), serial )
+    finally:
+      pooled.close()
+
+  def test_in_acquisition( self ):
+    pacq = pydacq.polling_acquisition.PollingAquisition()
+    pacq.setup( 1000, batch_size = 16, batch_wait = 5, shape = 2,
+      pipeline = pydacq.pipeline.Pipeline( [ pydacq.pipeline.Scale( 10.0 ),
+        pydacq.pipeline.Decimate( 2 ) ] ) )
+    counter = [ 0 ]
+    received = []
+
+    def read_fn():
+      if counter[0] >= 100:
+        time.sleep( 0.001 )
+        raise IndexError( 'done' )
+      counter[0] += 1
+      return np.array( [ counter[0], -counter[0] ], dtype = float )
+
+    pacq.read = read_fn
+    pacq.write_batch = lambda block: received.append( block.copy() )
+    pacq.start()
+    time.sleep( 0.3 )
+    pacq.stop()
+
+    values = np.concatenate( received )
+    np.testing.assert_array_equal( values[ :, 0 ], np.arange( 1, 101, 2 ) * 10.0 )
+    self.assertEqual( pacq.stats()[ 'packets_written' ], 100 )
+    self.assertTrue( pacq.stats()[ 'process_time' ][ 'count' ] > 0 )
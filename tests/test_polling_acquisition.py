@@ -1,5 +1,6 @@
 import unittest
 import threading
+import numpy as np
 import pydacq.polling_acquisition
 import time 
 #test_polling_acquisition.py
@@ -21,6 +22,78 @@ class TestPollingAcquisition( unittest.TestCase ):
   def test_setup( self ):
     self.pacq.setup(100)
     self.assertEqual( self.pacq._queue_size, 100 )
+    self.assertEqual( self.pacq._queue.maxsize, 100 )
+    pass
+
+  def test_setup_rejects_bad_policy( self ):
+    self.assertFalse( self.pacq.setup( overflow = 'nope' ),
+      'accepted unknown overflow policy' )
+    self.assertFalse( self.pacq.setup( shape = 2, overflow = 'coalesce_latest' ),
+      'accepted coalesce_latest on a packet ring' )
+    pass
+
+  def test_overflow_policies( self ):
+    expected = {
+      'drop_newest'     : ( [ 0, 1, 2 ], [ None ] * 3 + [ 'dropped_newest' ] * 2 ),
+      'drop_oldest'     : ( [ 2, 3, 4 ], [ None ] * 3 + [ 'dropped_oldest' ] * 2 ),
+      'coalesce_latest' : ( [ 0, 1, 4 ], [ None ] * 3 + [ 'coalesced' ] * 2 ),
+    }
+    for shape in ( None, 1 ):
+      for policy in expected:
+        if shape and policy == 'coalesce_latest':
+          continue
+        pacq = pydacq.polling_acquisition.PollingAquisition()
+        pacq.setup( 3, shape = shape, overflow = policy )
+        pacq._data_in_timeout = 1
+        pacq._stop_event = threading.Event()
+
+        # nobody is draining, five packets into three slots
+        outcomes = [ pacq._put( np.ones( 1 ) * i ) for i in range( 5 ) ]
+        queued = []
+        while pacq._queue.qsize():
+          queued.append( int( pacq._queue.get_nowait()[0] ) )
+
+        self.assertEqual( queued, expected[ policy ][0],
+          '%s kept the wrong packets' % policy )
+        self.assertEqual( outcomes, expected[ policy ][1],
+          '%s reported the wrong outcomes' % policy )
+    pass
+
+  def test_stats_count_overflows_by_policy( self ):
+    counters = ( 'blocked', 'dropped_newest', 'dropped_oldest', 'coalesced' )
+    for policy, counter in ( ( 'drop_newest', 'dropped_newest' ),
+        ( 'drop_oldest', 'dropped_oldest' ),
+        ( 'coalesce_latest', 'coalesced' ) ):
+      pacq = pydacq.polling_acquisition.PollingAquisition()
+      pacq.setup( 3, overflow = policy )
+      pacq._data_in_timeout = 1
+      pacq._stop_event = threading.Event()
+      for i in range( 5 ):
+        pacq._publish( i )
+
+      stats = pacq.stats()
+      self.assertEqual( stats[ counter ], 2, '%s not counted' % policy )
+      self.assertEqual( sum( stats[ other ] for other in counters ), 2,
+        '%s counted as another policy' % policy )
+      self.assertEqual( stats[ 'overflows' ], 2 )
+    pass
+
+  def test_block_policy_waits_for_space( self ):
+    self.pacq.setup( 1, overflow = 'block' )
+    self.pacq._data_in_timeout = 10
+    self.pacq._stop_event = threading.Event()
+    self.pacq._put( 1 )
+
+    # free the slot after a few put timeouts
+    def drain():
+      time.sleep( 0.05 )
+      self.pacq._queue.get()
+    dt = threading.Thread( target = drain )
+    dt.start()
+
+    self.assertEqual( self.pacq._put( 2 ), 'blocked', 'put did not block' )
+    dt.join()
+    self.assertEqual( self.pacq._queue.get_nowait(), 2, 'blocked packet lost' )
     pass
 
   def test_polling_loop( self ):
@@ -90,6 +163,228 @@ class TestPollingAcquisition( unittest.TestCase ):
     self.assertTrue( queue_is_draining ,
       'Queue not draining')
 
+  def test_batch_drain( self ):
+    self.pacq.setup( batch_size = 50, batch_wait = 20 )
+    self.read_count = 0
+    self.batches = []
+
+    def read_fn():
+      self.read_count += 1
+      time.sleep( 0.001 )
+      return np.ones( 3 ) * self.read_count
+
+    def write_batch_fn( packets ):
+      self.batches.append( packets )
+
+    self.pacq.read = read_fn
+    self.pacq.write_batch = write_batch_fn
+
+    self.pacq.start()
+    time.sleep( 0.2 )
+    self.pacq.stop()
+
+    # every packet shipped once, in order, several per call
+    written = [ packet[0] for batch in self.batches for packet in batch ]
+    self.assertEqual( written, list( range( 1, len( written ) + 1 ) ),
+      'packets lost or out of order' )
+    self.assertEqual( self.pacq._packets_written, len( written ),
+      'write counter does not match' )
+    self.assertTrue( max( len( batch ) for batch in self.batches ) > 1,
+      'packets were not batched' )
+    self.assertTrue( max( len( batch ) for batch in self.batches ) <= 50,
+      'batch exceeded batch_size' )
+
+  def test_stack_packets( self ):
+    packets = [ np.ones( ( 2, 3 ) ) * i for i in range( 4 ) ]
+    block = pydacq.polling_acquisition.stack_packets( packets )
+
+    self.assertEqual( block.shape, ( 4, 2, 3 ), 'incorrect block shape' )
+    self.assertEqual( block[3, 0, 0], 3, 'incorrect block contents' )
+
+    # mixed shapes can not be stacked
+    packets.append( np.ones( 2 ) )
+    self.assertTrue( pydacq.polling_acquisition.stack_packets( packets ) is None,
+      'stacked packets of mixed shape' )
+
+  def test_packet_ring_transport( self ):
+    self.pacq.setup( size = 64, batch_size = 32, shape = 3 )
+    self.read_count = 0
+    self.blocks = []
+
+    def read_fn():
+      self.read_count += 1
+      time.sleep( 0.001 )
+      return np.ones( 3 ) * self.read_count
+
+    self.pacq.read = read_fn
+    self.pacq.write_batch = self.blocks.append
+
+    self.pacq.start()
+    time.sleep( 0.2 )
+    self.pacq.stop()
+
+    # blocks arrive stacked, in order
+    block = np.concatenate( self.blocks )
+    self.assertEqual( block.shape[1:], ( 3, ), 'incorrect block shape' )
+    self.assertEqual( list( block[ :, 0 ] ), list( range( 1, len( block ) + 1 ) ),
+      'packets lost or out of order' )
+
+  def test_read_errors_back_off( self ):
+    self.pacq.setup( backoff_min = 1, backoff_max = 8 )
+    self.calls = []
+
+    def failing_read():
+      self.calls.append( time.time() )
+      raise IOError( 'device hiccup' )
+
+    self.pacq.read = failing_read
+    self.pacq.start()
+    time.sleep( 0.2 )
+    self.pacq.stop()
+
+    # errors are not overflows, and the backoff stays bounded
+    self.assertEqual( self.pacq._overflows, 0, 'read error counted as overflow' )
+    self.assertEqual( self.pacq._read_errors, len( self.calls ),
+      'read errors not counted' )
+    gaps = [ b - a for a, b in zip( self.calls, self.calls[1:] ) ]
+    self.assertTrue( len( self.calls ) > 10, 'backed off too long' )
+    self.assertTrue( max( gaps ) < 0.05, 'backoff exceeded its bound' )
+
+  def test_stop_interrupts_waits( self ):
+    for shape in ( None, 3 ):
+      self.pacq = pydacq.polling_acquisition.PollingAquisition()
+      self.pacq.setup( shape = shape, backoff_min = 1000, backoff_max = 1000 )
+      self.pacq._data_out_timeout = 5000
+
+      # one packet, then the consumer sits idle on an empty queue
+      self.sent = False
+      def read_once():
+        if self.sent:
+          raise IOError( 'no data' )
+        self.sent = True
+        return np.ones( 3 )
+
+      self.pacq.read = read_once
+      self.pacq.write = lambda packet: None
+      self.pacq.start()
+      time.sleep( 0.05 )
+
+      start = time.time()
+      self.pacq.stop()
+      self.assertTrue( time.time() - start < 0.5, 'stop waited for timeouts' )
+      self.assertEqual( self.pacq._packets_written, 1, 'packet not written' )
+
+  def test_subscribers_are_independent( self ):
+    for shape in ( None, 3 ):
+      self.pacq = pydacq.polling_acquisition.PollingAquisition()
+      self.pacq.setup( shape = shape )
+      self.count = 0
+      def read_fn():
+        self.count += 1
+        time.sleep( 0.001 )
+        return np.ones( 3 ) * self.count
+      self.pacq.read = read_fn
+
+      fast = []
+      batches = []
+      slow = []
+      def slow_fn( packet ):
+        slow.append( packet )
+        time.sleep( 0.05 )
+
+      self.pacq.subscribe( fast.append )
+      self.pacq.subscribe( write_batch = batches.append, batch_size = 10,
+        batch_wait = 5 )
+      slow_sub = self.pacq.subscribe( slow_fn, size = 2,
+        overflow = 'drop_oldest' )
+      self.assertEqual( self.pacq.subscribe( fast.append, overflow = 'nope' ),
+        None, 'accepted a bad overflow policy' )
+
+      self.pacq.start()
+      time.sleep( 0.2 )
+      self.pacq.stop()
+
+      # the slow subscriber drops its own packets without holding up the rest
+      self.assertTrue( len( fast ) > 50, 'fast subscriber held up' )
+      self.assertEqual( [ packet[0] for packet in fast ],
+        list( range( 1, len( fast ) + 1 ) ), 'packets lost or out of order' )
+      self.assertTrue( max( len( batch ) for batch in batches ) > 1,
+        'batch subscriber not batched' )
+      self.assertTrue( len( slow ) < 10, 'slow subscriber not slow' )
+      self.assertTrue( slow_sub._dropped_oldest > 0, 'slow subscriber kept up' )
+      self.assertEqual( self.pacq._overflows, 0, 'main queue overflowed' )
+
+      # packets are shared, not copied per subscriber
+      shared = set( id( packet ) for packet in fast )
+      self.assertTrue( any( id( packet ) in shared
+        for batch in batches for packet in batch ),
+        'packet copied per subscriber' )
+      self.assertEqual( len( self.pacq.stats()[ 'subscribers' ] ), 3,
+        'subscriber stats missing' )
+      self.assertTrue( self.pacq.unsubscribe( slow_sub ), 'unsubscribe failed' )
+      self.assertFalse( self.pacq.unsubscribe( slow_sub ), 'unsubscribed twice' )
+    pass
+
+  def test_slow_subscriber_default_policy( self ):
+    self.pacq = pydacq.polling_acquisition.PollingAquisition()
+    self.pacq.setup()
+    def read_fn():
+      time.sleep( 0.001 )
+      return 1
+    self.pacq.read = read_fn
+    self.pacq.write = lambda packet: None
+
+    slow_sub = self.pacq.subscribe( lambda packet: time.sleep( 0.05 ),
+      size = 2 )
+    self.assertEqual( self.pacq.subscribe( lambda packet: None,
+      overflow = 'block' ), None, 'accepted a blocking subscriber' )
+
+    self.pacq.start()
+    time.sleep( 0.2 )
+    self.pacq.stop()
+
+    # the reader kept its pace, the subscriber dropped its oldest packets
+    self.assertTrue( self.pacq._packets_read > 50, 'reader held up' )
+    self.assertTrue( slow_sub._dropped_oldest > 0, 'slow subscriber kept up' )
+    pass
+
+  def test_stats( self ):
+    for shape in ( None, 3 ):
+      self.pacq = pydacq.polling_acquisition.PollingAquisition()
+      self.pacq.setup( 100, shape = shape )
+
+      def read_fn():
+        time.sleep( 0.001 )
+        return np.ones( 3 )
+
+      def write_fn( packet ):
+        time.sleep( 0.005 )
+
+      self.pacq.read = read_fn
+      self.pacq.write = write_fn
+      self.pacq.start()
+      time.sleep( 0.2 )
+      stats = self.pacq.stats()
+      self.pacq.stop()
+
+      # the slow writer is the busy stage and the queue backs up
+      self.assertTrue( stats[ 'packets_read' ] > stats[ 'packets_written' ] > 0,
+        'packets not counted' )
+      self.assertTrue( stats[ 'read_rate' ] > stats[ 'write_rate' ],
+        'rates do not follow the counters' )
+      self.assertTrue( stats[ 'write_busy' ] > 0.5, 'writer not busy' )
+      self.assertTrue( stats[ 'read_time' ][ 'p50' ] >= 0.001,
+        'read time not measured' )
+      self.assertTrue( stats[ 'write_time' ][ 'mean' ] >= 0.005,
+        'write time not measured' )
+      self.assertTrue( stats[ 'peak_queue_depth' ] >= stats[ 'queue_depth' ] > 1,
+        'queue depth not tracked' )
+      # the packet being written was already taken off the queue
+      self.assertTrue( stats[ 'residency' ][ 'count' ] >=
+        stats[ 'packets_written' ], 'residency not measured per packet' )
+      self.assertTrue( stats[ 'residency' ][ 'max' ] > 0.005,
+        'residency not measured' )
+
 
   """
   *****************
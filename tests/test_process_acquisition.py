@@ -0,0 +1,81 @@
+import unittest
+import os
+import numpy as np
+import pydacq.process_acquisition
+import time
+#test_process_acquisition.py
+
+class TestProcessAcquisition( unittest.TestCase ):
+  """
+  #############################################################################
+  Polling acquisition with read() in its own process
+  """
+
+  def setUp( self ):
+    self.pacq = pydacq.process_acquisition.ProcessPollingAquisition()
+    pass
+
+  def test_setup_requires_shape( self ):
+    self.assertFalse( self.pacq.setup( 100 ), 'setup accepted missing shape' )
+    self.assertTrue( self.pacq.setup( 100, shape = 3 ), 'setup failed' )
+    pass
+
+  def test_read_in_child_process( self ):
+    self.pacq.setup( 100, shape = 3 )
+    self.count = 0
+    self.blocks = []
+    parent = os.getpid()
+
+    # packets carry a counter and the pid of the reading process
+    def read_fn():
+      self.count += 1
+      time.sleep( 0.001 )
+      return np.array( [ self.count, os.getpid(), 0 ] )
+
+    self.pacq.read = read_fn
+    self.pacq.write_batch = self.blocks.append
+
+    self.pacq.start()
+    time.sleep( 0.3 )
+    self.pacq.stop()
+
+    block = np.concatenate( self.blocks )
+    self.assertTrue( len( block ) > 0, 'no packets arrived' )
+    self.assertTrue( np.all( block[ :, 1 ] != parent ),
+      'read ran in the parent process' )
+    self.assertEqual( list( block[ :, 0 ] ), list( range( 1, len( block ) + 1 ) ),
+      'packets lost or out of order' )
+
+    # counters come across the process boundary
+    self.assertTrue( self.pacq._packets_read >= len( block ),
+      'packets read not counted' )
+    self.assertEqual( self.pacq._packets_written, len( block ),
+      'packets written not counted' )
+    stats = self.pacq.stats()
+    self.assertTrue( stats[ 'read_time' ][ 'count' ] >= len( block ),
+      'read time not measured in the reader process' )
+    self.assertEqual( stats[ 'residency' ][ 'count' ], len( block ),
+      'residency not measured' )
+    pass
+
+  def test_subscribers_in_parent( self ):
+    self.pacq.setup( 100, shape = 3 )
+    def read_fn():
+      time.sleep( 0.001 )
+      return np.array( [ os.getpid(), 0, 0 ] )
+    self.pacq.read = read_fn
+    self.pacq.write_batch = lambda packets: None
+
+    received = []
+    self.pacq.subscribe( received.append )
+    self.pacq.start()
+    time.sleep( 0.2 )
+    self.pacq.stop()
+
+    self.assertTrue( len( received ) > 0, 'subscriber got no packets' )
+    self.assertTrue( received[0][0] != os.getpid(),
+      'read ran in the parent process' )
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import pydacq.recorder
+#test_recorder.py
+
+class TestRecorder( unittest.TestCase ):
+  """
+  #############################################################################
+  chunked recording of timestamped frames
+  """
+
+  def setUp( self ):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join( self.directory, 'run.rec' )
+    self.recorder = pydacq.recorder.Recorder( self.path, chunk_size = 10 )
+    self.recorder.open( ( 2, 3 ), np.int16 )
+    pass
+
+  def tearDown( self ):
+    self.recorder.close()
+    shutil.rmtree( self.directory )
+    pass
+
+  def record( self, count ):
+    """
+    ---------------------------------------------------------------------------
+    frames 0..count-1, each filled with its index, at timestamps 0.5 apart
+    """
+    timestamps = np.arange( count ) * 0.5
+    frames = ( np.ones( ( count, 2, 3 ) ) *
+      np.arange( count )[ :, None, None ] ).astype( np.int16 )
+    return timestamps, frames
+
+  def test_round_trip( self ):
+    timestamps, frames = self.record( 47 )
+    # single frames, a short block and a block spanning several chunks
+    for i in range( 5 ):
+      self.assertTrue( self.recorder.add_new( timestamps[i], frames[i] ),
+        'frame rejected' )
+    self.recorder.add_many( timestamps[ 5:8 ], frames[ 5:8 ] )
+    self.recorder.add_many( timestamps[ 8: ], frames[ 8: ] )
+    self.recorder.close()
+
+    reader = pydacq.recorder.RecordingReader( self.path )
+    self.assertTrue( reader.open(), 'could not open the recording' )
+    self.assertEqual( reader.shape(), ( 2, 3 ), 'incorrect shape' )
+    self.assertEqual( reader.dtype(), np.int16, 'incorrect dtype' )
+    self.assertEqual( reader.count(), 47, 'frames lost' )
+    self.assertEqual( list( reader.chunks()[ 'count' ] ), [ 10 ] * 4 + [ 7 ],
+      'incorrect chunking' )
+
+    ts, data = reader.get_range( 0, 100 )
+    self.assertTrue( np.array_equal( ts, timestamps ), 'incorrect timestamps' )
+    self.assertTrue( np.array_equal( data, frames ), 'incorrect frames' )
+    pass
+
+  def test_get_range( self ):
+    timestamps, frames = self.record( 47 )
+    self.recorder.add_many( timestamps, frames )
+    self.recorder.close()
+
+    reader = pydacq.recorder.RecordingReader( self.path )
+    reader.open()
+    ts, data = reader.get_range( 4.5, 12.0 )
+    self.assertTrue( np.array_equal( ts, timestamps[ 9:24 ] ),
+      'incorrect range across chunks' )
+    self.assertTrue( np.array_equal( data, frames[ 9:24 ] ),
+      'incorrect frames across chunks' )
+
+    ts, data = reader.get_range( 100, 200 )
+    self.assertEqual( data.shape, ( 0, 2, 3 ), 'range past the end not empty' )
+
+    chunk_ts, chunk_data = reader.get_chunk( 1 )
+    self.assertFalse( chunk_data.flags.writeable, 'chunk view is writeable' )
+    self.assertEqual( chunk_ts[0], 5.0, 'incorrect chunk' )
+    pass
+
+  def test_rejects_bad_frames( self ):
+    self.assertFalse( self.recorder.add_new( 0, np.ones( 3 ) ),
+      'accepted a bad frame' )
+    self.assertFalse( self.recorder.add_many( [ 0, 1 ], np.ones( ( 3, 2, 3 ) ) ),
+      'accepted a bad block' )
+    pass
+
+  def test_nanosecond_timestamps( self ):
+    recorder = pydacq.recorder.Recorder( self.path, chunk_size = 4 )
+    self.assertFalse( recorder.open( ( 2, 3 ), timestamp_dtype = np.float32 ),
+      'accepted a timestamp dtype it cannot read back' )
+    self.assertTrue( recorder.open( ( 2, 3 ), timestamp_dtype = np.int64 ) )
+    stamps = 10 ** 18 + np.arange( 10 ) * 10 ** 3 + 1
+    recorder.add_many( stamps[ :9 ], np.zeros( ( 9, 2, 3 ) ) )
+    self.assertTrue( recorder.add_new( stamps[9], np.zeros( ( 2, 3 ) ) ) )
+    self.assertFalse( recorder.add_new( 1.5, np.zeros( ( 2, 3 ) ) ),
+      'truncated a float timestamp into nanoseconds' )
+    recorder.close()
+
+    reader = pydacq.recorder.RecordingReader( self.path )
+    self.assertTrue( reader.open(), 'could not open the recording' )
+    self.assertEqual( reader.timestamp_dtype(), np.int64 )
+    ts, data = reader.get_range( stamps[1], stamps[-1] + 1 )
+    self.assertTrue( np.array_equal( ts, stamps[ 1: ] ),
+      'nanoseconds not exact' )
+    self.assertEqual( reader.chunks()[ 'last' ][-1], stamps[-1] )
+    pass
+
+  def test_recovers_without_index( self ):
+    timestamps, frames = self.record( 25 )
+    self.recorder.add_many( timestamps, frames )
+    self.recorder.close()
+
+    # the index lost its last row and the last chunk was torn
+    index = pydacq.recorder.index_path( self.path )
+    with open( index, 'r+b' ) as f:
+      f.truncate( pydacq.recorder.INDEX_ROW.itemsize )
+    with open( self.path, 'r+b' ) as f:
+      f.truncate( os.path.getsize( self.path ) - 1 )
+
+    reader = pydacq.recorder.RecordingReader( self.path )
+    self.assertTrue( reader.open(), 'could not open the recording' )
+    self.assertEqual( reader.count(), 20, 'complete chunks not recovered' )
+
+    os.remove( index )
+    reader.open()
+    ts, data = reader.get_range( 0, 100 )
+    self.assertTrue( np.array_equal( data, frames[ :20 ] ),
+      'chunks not recovered without index' )
+    pass
+
+  def test_open_rejects_other_files( self ):
+    other = os.path.join( self.directory, 'other' )
+    with open( other, 'wb' ) as f:
+      f.write( b'\0' * 256 )
+    self.assertFalse( pydacq.recorder.RecordingReader( other ).open(),
+      'opened a file that is not a recording' )
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -61,6 +61,31 @@ class TestRollingBuffer( unittest.TestCase ):
 
     pass
 
+  def test_add_new_rejects_bad_dtypes( self ):
+    rbuffer = pydacq.rolling_buffer.RollingBuffer()
+    for ring in ( False, True ):
+      rbuffer.reset( 10, 3, ring = ring, dtype = np.int16,
+        timestamp_dtype = np.int64 )
+      counts = np.arange( 15, dtype = np.int16 ).reshape( 5, 3 )
+      stamps = 10 ** 18 + np.arange( 5 ) * 10 ** 8
+      rbuffer.add_many( stamps, counts )
+      rollcount = rbuffer._rollcount
+
+      self.assertFalse( rbuffer.add_new( stamps[-1] + 10 ** 8,
+        np.ones( 3 ) ), 'truncated floats into an int16 buffer' )
+      self.assertFalse( rbuffer.add_new( 1.5, counts[0] ),
+        'truncated a float timestamp into nanoseconds' )
+      self.assertFalse( rbuffer.add_new( stamps[-1] + 10 ** 8,
+        np.array( [ 70000, 2, 3 ] ) ), 'wrapped an int64 into int16' )
+      self.assertFalse( rbuffer.add_many( stamps[ :1 ] + 10 ** 9,
+        [ [ 1, -40000, 3 ] ] ), 'wrapped python ints into int16' )
+
+      self.assertEqual( rbuffer._rollcount, rollcount,
+        'rollcounter incremented in spite of bad data' )
+      self.assertEqual( rbuffer.get_latest()[0], stamps[-1],
+        'buffer accepted badly typed data' )
+    pass
+
   def test_add_new_adds_data( self ):
     data_in1 = np.random.rand( 50, 50 )
     data_in2 = np.random.rand( 50, 50 )
@@ -242,6 +267,427 @@ class TestRollingBuffer( unittest.TestCase ):
     pass
 
 
+  def test_ring_add_new_wraps( self ):
+    self.rbuffer.reset( 5, ( 2, 2 ), ring = True )
+
+    # add more items than the buffer holds
+    for i in range( 7 ):
+        self.rbuffer.add_new( i, np.ones( ( 2, 2 ) ) * i )
+
+    # write head should have wrapped around
+    self.assertEqual( self.rbuffer._head, 2, 'write head did not wrap' )
+    self.assertEqual( self.rbuffer._rollcount, 7, 'incorrect rollcount' )
+
+    ret_data = self.rbuffer.get_latest()
+    self.assertEqual( ret_data[0], 6, 'timestamp was incorrect' )
+    self.assertEqual( np.sum( ret_data[1] ), 24, 'data was incorrect' )
+    pass
+
+  def test_ring_get_all_matches_roll( self ):
+    ring = pydacq.rolling_buffer.RollingBuffer()
+    ring.reset( 100, ( 50, 50 ), ring = True )
+
+    data_array = np.random.rand( 130, 50, 50 )
+
+    # feed both buffers the same data, past the ring boundary
+    for i in range( 130 ):
+        self.rbuffer.add_new( i, data_array[ i ] )
+        ring.add_new( i, data_array[ i ] )
+
+    roll_ts, roll_data = self.rbuffer.get_all()
+    ring_ts, ring_data = ring.get_all()
+
+    # newest first ordering must be identical
+    self.assertTrue( np.array_equal( roll_ts, ring_ts ),
+        'ring timestamps out of order' )
+    self.assertTrue( np.array_equal( roll_data, ring_data ),
+        'ring data out of order' )
+    pass
+
+  def test_add_many_matches_add_new( self ):
+    data_array = np.random.rand( 30, 50, 50 )
+    timestamps = np.arange( 0, 30, 1 )
+
+    for ring in ( False, True ):
+        single = pydacq.rolling_buffer.RollingBuffer()
+        single.reset( 20, ( 50, 50 ), ring = ring )
+        block = pydacq.rolling_buffer.RollingBuffer()
+        block.reset( 20, ( 50, 50 ), ring = ring )
+
+        # one item at a time vs. two blocks, the second wrapping the ring
+        for i in range( 30 ):
+            single.add_new( timestamps[i], data_array[i] )
+        self.assertTrue( block.add_many( timestamps[:12], data_array[:12] ),
+            'got FALSE in spite of good block' )
+        self.assertTrue( block.add_many( timestamps[12:], data_array[12:] ),
+            'got FALSE in spite of good block' )
+
+        self.assertEqual( block._rollcount, 30, 'incorrect rollcount' )
+        self.assertTrue( np.array_equal( single.get_all()[0], block.get_all()[0] ),
+            'block timestamps differ from single adds' )
+        self.assertTrue( np.array_equal( single.get_all()[1], block.get_all()[1] ),
+            'block data differs from single adds' )
+    pass
+
+  def test_add_many_keeps_newest_of_long_block( self ):
+    self.rbuffer.reset( 10, ( 2, ), ring = True )
+    timestamps = np.arange( 0, 25, 1 )
+    data_array = np.random.rand( 25, 2 )
+
+    self.rbuffer.add_many( timestamps, data_array )
+
+    ret_data = self.rbuffer.get_all()
+    self.assertTrue( np.array_equal( ret_data[0], timestamps[ :14:-1 ] ),
+        'long block did not keep the newest timestamps' )
+    self.assertTrue( np.array_equal( ret_data[1], data_array[ :14:-1 ] ),
+        'long block did not keep the newest data' )
+    self.assertEqual( self.rbuffer._rollcount, 25, 'incorrect rollcount' )
+    pass
+
+  def test_add_many_rejects_bad_block( self ):
+    rollcount = self.rbuffer._rollcount
+
+    retval = self.rbuffer.add_many( np.arange( 4 ), np.random.rand( 4, 12, 12 ) )
+    self.assertFalse( retval, 'got TRUE in spite of bad block shape' )
+
+    retval = self.rbuffer.add_many( np.arange( 3 ), np.random.rand( 4, 50, 50 ) )
+    self.assertFalse( retval, 'got TRUE in spite of timestamp count mismatch' )
+
+    self.assertEqual( self.rbuffer._rollcount, rollcount,
+        'rollcounter incremented in spite of bad block' )
+    pass
+
+  def test_get_since_returns_new_items( self ):
+    for ring in ( False, True ):
+        self.rbuffer.reset( 10, ( 2, ), ring = ring )
+        timestamps = np.arange( 0, 8, 1 )
+        data_array = np.random.rand( 8, 2 )
+
+        self.rbuffer.add_many( timestamps[:5], data_array[:5] )
+        sequence = self.rbuffer.get_sequence()
+        self.assertEqual( sequence, 5, 'incorrect sequence number' )
+
+        self.rbuffer.add_many( timestamps[5:], data_array[5:] )
+        ts, data, sequence, lost = self.rbuffer.get_since( sequence )
+
+        self.assertEqual( sequence, 8, 'incorrect new sequence number' )
+        self.assertFalse( lost, 'reported loss without overflow' )
+        self.assertTrue( np.array_equal( ts, timestamps[ :4:-1 ] ),
+            'incorrect new timestamps' )
+        self.assertTrue( np.array_equal( data, data_array[ :4:-1 ] ),
+            'incorrect new data' )
+
+        # nothing new since the last call
+        ts, data, sequence, lost = self.rbuffer.get_since( sequence )
+        self.assertEqual( len( ts ), 0, 'returned items without new data' )
+    pass
+
+  def test_get_since_reports_loss( self ):
+    self.rbuffer.reset( 10, ( 2, ), ring = True )
+    timestamps = np.arange( 0, 25, 1 )
+
+    self.rbuffer.add_many( timestamps, np.random.rand( 25, 2 ) )
+    ts, data, sequence, lost = self.rbuffer.get_since( 3 )
+
+    self.assertTrue( lost, 'did not report lost items' )
+    self.assertEqual( sequence, 25, 'incorrect new sequence number' )
+    self.assertTrue( np.array_equal( ts, timestamps[ :14:-1 ] ),
+        'did not return the whole buffer after loss' )
+    pass
+
+  def test_get_snapshot_is_shared_and_read_only( self ):
+    self.rbuffer.reset( 10, 2, ring = True )
+    self.rbuffer.add_many( np.arange( 0, 5, 1 ), np.random.rand( 5, 2 ) )
+
+    ts1, data1 = self.rbuffer.get_snapshot()
+    ts2, data2 = self.rbuffer.get_snapshot()
+
+    # same generation, same arrays
+    self.assertTrue( data1 is data2, 'snapshot was copied twice' )
+    self.assertFalse( data1.flags.writeable, 'snapshot is writeable' )
+    self.assertTrue( np.array_equal( data1, self.rbuffer.get_all()[1] ),
+        'snapshot differs from buffer contents' )
+
+    # new data publishes a new snapshot, the old one is untouched
+    self.rbuffer.add_new( 5, np.ones( 2 ) )
+    ts3, data3 = self.rbuffer.get_snapshot()
+    self.assertFalse( data3 is data1, 'snapshot not refreshed after add' )
+    self.assertEqual( ts3[0], 5, 'snapshot missing new item' )
+    self.assertEqual( ts1[0], 4, 'published snapshot was modified' )
+
+    # without snapshots = True the writer keeps no block
+    self.assertIsNone( self.rbuffer._snap_data, 'block without snapshots' )
+    pass
+
+  def test_get_snapshot_views_never_change( self ):
+    for ring in ( False, True ):
+      self.rbuffer.reset( 10, 2, ring = ring, snapshots = True )
+      self.rbuffer.add_many( np.arange( 0, 5, 1 ), np.random.rand( 5, 2 ) )
+      ts1, data1 = self.rbuffer.get_snapshot()
+      kept = data1.copy()
+
+      # the next generation views the same memory, nothing was copied
+      self.rbuffer.add_new( 5, np.ones( 2 ) )
+      ts2, data2 = self.rbuffer.get_snapshot()
+      if ring:
+        self.assertTrue( np.shares_memory( data1, data2 ),
+          'snapshot was copied' )
+
+      # enough writes to wrap the ring and fill the block
+      for i in range( 6, 40 ):
+        self.rbuffer.add_new( i, np.ones( 2 ) * i )
+      self.rbuffer.add_many( np.arange( 40, 47 ), np.zeros( ( 7, 2 ) ) )
+      self.assertTrue( np.array_equal( data1, kept ),
+        'published snapshot was modified' )
+      ts3, data3 = self.rbuffer.get_snapshot()
+      self.assertTrue( np.array_equal( ts3, np.arange( 46, 36, -1 ) ),
+        'snapshot does not follow the writes' )
+      self.assertTrue( np.array_equal( data3, self.rbuffer.get_all()[1] ) )
+
+    # a snapshot taken before a reset is never handed out after it
+    self.rbuffer.reset( 10, 2, ring = True )
+    self.rbuffer.add_new( 1, np.ones( 2 ) )
+    self.rbuffer.get_snapshot()
+    stale = self.rbuffer._snapshot
+    self.rbuffer.reset( 10, 2, ring = True )
+    self.rbuffer.add_new( 2, np.ones( 2 ) )
+    self.rbuffer._snapshot = stale
+    self.assertEqual( self.rbuffer.get_snapshot()[0][0], 2,
+      'stale snapshot after reset' )
+    pass
+
+  def test_concurrency_strategies_never_tear_items( self ):
+    for concurrency in ( 'lock', 'rwlock', 'seqlock' ):
+        rbuffer = pydacq.rolling_buffer.RollingBuffer( concurrency )
+        rbuffer.reset( 50, ( 8, 8 ), ring = True, snapshots = True )
+        self.torn = False
+
+        # every item is filled with its own timestamp
+        def add_data():
+            for i in range( 1, 2000 ):
+                rbuffer.add_new( i, np.ones( ( 8, 8 ) ) * i )
+
+        adt = threading.Thread( target = add_data )
+        adt.start()
+        while adt.is_alive():
+            ts, data = rbuffer.get_all()
+            if not np.all( data == ts[ :, None, None ] ):
+                self.torn = True
+            ts, data = rbuffer.get_snapshot()
+            if not np.all( data == ts[ :, None, None ] ):
+                self.torn = True
+        adt.join()
+
+        self.assertFalse( self.torn, '%s read a torn item' % concurrency )
+        self.assertEqual( rbuffer.get_latest()[0], 1999,
+            '%s lost the latest item' % concurrency )
+    pass
+
+  def test_get_range( self ):
+    for ring in ( False, True ):
+      rbuffer = pydacq.rolling_buffer.RollingBuffer()
+      rbuffer.reset( 10, 2, ring = ring )
+      ts, data = rbuffer.get_range( 0, 100 )
+      self.assertEqual( len( ts ), 0, 'empty buffer returned items' )
+
+      # 14 items 0.5 apart, the ring has wrapped
+      data_array = np.random.rand( 14, 2 )
+      rbuffer.add_many( np.arange( 14 ) * 0.5, data_array )
+
+      ts, data = rbuffer.get_range( 2.5, 4.5 )
+      self.assertTrue( np.array_equal( ts, [ 4.0, 3.5, 3.0, 2.5 ] ),
+        'incorrect range' )
+      self.assertTrue( np.array_equal( data, data_array[ 8:4:-1 ] ),
+        'incorrect data' )
+
+      ts, data = rbuffer.get_range( -10, 2.2 )
+      self.assertTrue( np.array_equal( ts, [ 2.0 ] ),
+        'range not clipped to the buffer' )
+
+      ts, data = rbuffer.get_last_seconds( 1.0 )
+      self.assertTrue( np.array_equal( ts, [ 6.5, 6.0, 5.5 ] ),
+        'incorrect last seconds' )
+      self.assertTrue( np.array_equal( data, data_array[ 13:10:-1 ] ),
+        'incorrect last seconds data' )
+    pass
+
+  def test_get_decimated_envelope( self ):
+    for ring in ( False, True ):
+      rbuffer = pydacq.rolling_buffer.RollingBuffer()
+      rbuffer.reset( 100, 2, ring = ring, decimation = 4 )
+      self.assertEqual( rbuffer.get_decimated( 10 )[0].shape, ( 0, ),
+        'empty buffer not empty' )
+
+      # single items and blocks, crossing block boundaries unaligned
+      data_array = np.random.rand( 250, 2 )
+      for i in range( 5 ):
+        rbuffer.add_new( i, data_array[i] )
+      rbuffer.add_many( np.arange( 5, 243 ), data_array[ 5:243 ] )
+      for i in range( 243, 250 ):
+        rbuffer.add_new( i, data_array[i] )
+
+      # 100 items in blocks of 16, the oldest block is partly rolled off
+      ts, mins, maxs = rbuffer.get_decimated( 10 )
+      self.assertEqual( len( ts ), 6, 'incorrect number of points' )
+      for point, block in enumerate( range( 15, 9, -1 ) ):
+        items = data_array[ block * 16:( block + 1 ) * 16 ]
+        self.assertTrue( np.array_equal( mins[ point ], items.min( 0 ) ),
+          'incorrect min' )
+        self.assertTrue( np.array_equal( maxs[ point ], items.max( 0 ) ),
+          'incorrect max' )
+        self.assertEqual( ts[ point ], min( block * 16 + 15, 249 ),
+          'incorrect timestamp' )
+
+      # few enough items come back as they are
+      ts, mins, maxs = rbuffer.get_decimated( 100 )
+      self.assertTrue( np.array_equal( mins, data_array[ :149:-1 ] ),
+        'items not returned as is' )
+      self.assertTrue( np.array_equal( maxs, mins ), 'max differs from items' )
+
+      # two blocks in the coarsest tier, merged into the one point asked for
+      rbuffer.reset( 100, 2, ring = ring, decimation = 4 )
+      rbuffer.add_many( np.arange( 100 ), data_array[ :100 ] )
+      ts, mins, maxs = rbuffer.get_decimated( 1 )
+      self.assertEqual( len( ts ), 1, 'more points than asked for' )
+      self.assertEqual( ts[0], 99, 'incorrect timestamp' )
+      self.assertTrue( np.array_equal( mins[0], data_array[ :100 ].min( 0 ) ) )
+      self.assertTrue( np.array_equal( maxs[0], data_array[ :100 ].max( 0 ) ) )
+    pass
+
+  def test_get_stats_follows_window( self ):
+    for ring in ( False, True ):
+      rbuffer = pydacq.rolling_buffer.RollingBuffer()
+      rbuffer.reset( 10, 2, ring = ring, rolling_stats = True )
+      self.assertEqual( rbuffer.get_stats()[ 'count' ], 0,
+        'empty buffer has items' )
+
+      # large offset, small spread, single items and blocks
+      data_array = 1e6 + np.random.rand( 60, 2 )
+      for i in range( 25 ):
+        rbuffer.add_new( i, data_array[i] )
+      rbuffer.add_many( np.arange( 25, 28 ), data_array[ 25:28 ] )
+      rbuffer.add_many( np.arange( 28, 60 ), data_array[ 28: ] )
+      window = data_array[ 50: ]
+      stats = rbuffer.get_stats()
+      self.assertEqual( stats[ 'count' ], 10, 'incorrect count' )
+      self.assertTrue( np.allclose( stats[ 'mean' ], window.mean( 0 ) ),
+        'incorrect mean' )
+      self.assertTrue( np.allclose( stats[ 'std' ], window.std( 0 ) ),
+        'incorrect std' )
+      self.assertTrue( np.array_equal( stats[ 'min' ], window.min( 0 ) ),
+        'incorrect min' )
+      self.assertTrue( np.array_equal( stats[ 'max' ], window.max( 0 ) ),
+        'incorrect max' )
+
+      # single items sliding through a block boundary
+      for i in range( 60, 75 ):
+        data_array = np.vstack( ( data_array, np.random.rand( 1, 2 ) ) )
+        rbuffer.add_new( i, data_array[i] )
+        window = data_array[ i - 9:i + 1 ]
+        stats = rbuffer.get_stats()
+        self.assertTrue( np.allclose( stats[ 'mean' ], window.mean( 0 ) ),
+          'incorrect sliding mean' )
+        self.assertTrue( np.array_equal( stats[ 'min' ], window.min( 0 ) ),
+          'incorrect sliding min' )
+        self.assertTrue( np.array_equal( stats[ 'max' ], window.max( 0 ) ),
+          'incorrect sliding max' )
+
+    self.assertEqual( self.rbuffer.get_stats(), None,
+      'stats without rolling_stats' )
+    pass
+
+  def test_get_stats_any_length( self ):
+    # odd and even lengths, blocks across one or more block boundaries
+    random = np.random.RandomState( 1 )
+    for length in ( 1, 2, 5, 8 ):
+      rbuffer = pydacq.rolling_buffer.RollingBuffer()
+      rbuffer.reset( length, 3, ring = True, rolling_stats = True )
+      data_array = np.zeros( ( 0, 3 ) )
+      for step in range( 60 ):
+        count = random.randint( 1, 2 * length + 2 ) if step % 3 else 1
+        block = 1e6 + random.rand( count, 3 )
+        rbuffer.add_many( np.arange( len( data_array ),
+          len( data_array ) + count ), block )
+        data_array = np.vstack( ( data_array, block ) )
+
+        window = data_array[ -length: ]
+        stats = rbuffer.get_stats()
+        self.assertEqual( stats[ 'count' ], len( window ), 'incorrect count' )
+        self.assertTrue( np.allclose( stats[ 'mean' ], window.mean( 0 ) ),
+          'incorrect mean' )
+        self.assertTrue( np.allclose( stats[ 'std' ], window.std( 0 ),
+          atol = 1e-6 ), 'incorrect std' )
+        self.assertTrue( np.array_equal( stats[ 'min' ], window.min( 0 ) ),
+          'incorrect min' )
+        self.assertTrue( np.array_equal( stats[ 'max' ], window.max( 0 ) ),
+          'incorrect max' )
+    pass
+
+  def test_get_decimated_needs_tiers( self ):
+    self.assertEqual( self.rbuffer.get_decimated( 10 ), None,
+      'decimated without tiers' )
+    pass
+
+  def test_stats( self ):
+    for concurrency in ( 'lock', 'seqlock' ):
+      rbuffer = pydacq.rolling_buffer.RollingBuffer( concurrency )
+      rbuffer.reset( 10, 2, ring = True )
+      for i in range( 20 ):
+        rbuffer.add_new( i, np.ones( 2 ) )
+      rbuffer.add_many( np.arange( 5 ), np.ones( ( 5, 2 ) ) )
+      rbuffer.get_all()
+      rbuffer.get_latest()
+
+      stats = rbuffer.stats()
+      self.assertEqual( stats[ 'items' ], 25, 'items not counted' )
+      self.assertTrue( stats[ 'add_rate' ] > 0, 'no add rate' )
+      self.assertEqual( stats[ 'lock_wait' ][ 'count' ], 21,
+        '%s writes not timed' % concurrency )
+      self.assertEqual( stats[ 'lock_hold' ][ 'count' ], 21,
+        '%s writes not timed' % concurrency )
+      self.assertEqual( stats[ 'read_hold' ][ 'count' ], 2,
+        '%s reads not timed' % concurrency )
+      self.assertEqual( stats[ 'read_retries' ], 0, 'retried a clean read' )
+
+      # reset starts over
+      rbuffer.reset( 10, 2, ring = True )
+      self.assertEqual( rbuffer.stats()[ 'lock_hold' ][ 'count' ], 0,
+        'reset kept the stats' )
+    pass
+
+  def test_dtypes( self ):
+    rbuffer = pydacq.rolling_buffer.RollingBuffer()
+    for ring in ( False, True ):
+      self.assertTrue( rbuffer.reset( 10, 3, ring = ring, dtype = np.int16,
+        timestamp_dtype = np.int64 ) )
+      self.assertEqual( rbuffer._data.dtype, np.int16, 'data not int16' )
+      self.assertEqual( rbuffer._dimensions, ( 3, ), 'dimensions not a tuple' )
+
+      counts = np.arange( 15, dtype = np.int16 ).reshape( 5, 3 )
+      stamps = 10 ** 18 + np.arange( 5 ) * 10 ** 8
+      self.assertTrue( rbuffer.add_many( stamps, counts ) )
+      self.assertTrue( rbuffer.add_new( stamps[-1] + 10 ** 8, [ 1, 2, 3 ] ),
+        'rejected python ints' )
+
+      ts, data = rbuffer.get_all()
+      self.assertEqual( ts[0], 10 ** 18 + 5 * 10 ** 8, 'nanoseconds not exact' )
+      self.assertTrue( np.array_equal( data[ 1:6 ], counts[ ::-1 ] ) )
+      self.assertEqual( len( rbuffer.get_last_seconds( 0.25 )[0] ), 3,
+        'seconds not converted to nanoseconds' )
+
+    # mixed channels as one record per item
+    record = np.dtype( [ ( 'volts', np.float32 ), ( 'counts', np.int16 ) ] )
+    self.assertTrue( rbuffer.reset( 5, (), dtype = record ) )
+    self.assertTrue( rbuffer.add_new( 1.0, ( 2.5, 7 ) ) )
+    self.assertEqual( rbuffer.get_latest()[1][ 'counts' ], 7 )
+    self.assertFalse( rbuffer.reset( 5, (), dtype = record, rolling_stats = True ),
+      'accepted rolling stats of records' )
+    pass
+
+  def test_unknown_concurrency_strategy( self ):
+    self.assertRaises( ValueError, pydacq.rolling_buffer.RollingBuffer, 'nope' )
+    pass
+
   def tearDown( self ):
     pass
 
@@ -0,0 +1,104 @@
+import unittest
+import multiprocessing
+import os
+import numpy as np
+import pydacq.shared_buffer
+#test_shared_buffer.py
+
+def read_from_child( name, results ):
+  """
+  -----------------------------------------------------------------------------
+  attach in another process and report what it sees
+  """
+  rbuffer = pydacq.shared_buffer.SharedRollingBuffer( name )
+  if not rbuffer.attach():
+    results.put( None )
+    return
+  ts, data = rbuffer.get_all()
+  results.put( ( rbuffer.get_sequence(), list( ts ), data[0].tolist() ) )
+
+class TestSharedBuffer( unittest.TestCase ):
+  """
+  #############################################################################
+  ring mode RollingBuffer in named shared memory
+  """
+
+  def setUp( self ):
+    self.name = 'test_%d' % os.getpid()
+    self.rbuffer = pydacq.shared_buffer.SharedRollingBuffer( self.name )
+    self.rbuffer.reset( 10, ( 2, 3 ) )
+    pass
+
+  def tearDown( self ):
+    self.rbuffer.close()
+    pass
+
+  def test_attach_reads_writer_data( self ):
+    data_array = np.random.rand( 15, 2, 3 )
+    self.rbuffer.add_many( np.arange( 15 ), data_array )
+
+    reader = pydacq.shared_buffer.SharedRollingBuffer( self.name )
+    self.assertTrue( reader.attach(), 'could not attach' )
+
+    self.assertEqual( reader.get_sequence(), 15, 'incorrect shared sequence' )
+    ts, data = reader.get_all()
+    self.assertTrue( np.array_equal( ts, np.arange( 14, 4, -1 ) ),
+      'incorrect timestamps' )
+    self.assertTrue( np.array_equal( data, data_array[ :4:-1 ] ),
+      'incorrect data' )
+
+    # later writes show up without reattaching
+    self.rbuffer.add_new( 15, np.ones( ( 2, 3 ) ) )
+    self.assertEqual( reader.get_latest()[0], 15, 'missed a later write' )
+    pass
+
+  def test_attached_reader_is_read_only( self ):
+    reader = pydacq.shared_buffer.SharedRollingBuffer( self.name )
+    reader.attach()
+
+    self.assertFalse( reader.add_new( 1, np.ones( ( 2, 3 ) ) ),
+      'attached reader accepted a write' )
+
+    ts, data, head, sequence = reader.get_views()
+    self.assertFalse( data.flags.writeable, 'view is writeable' )
+    self.assertEqual( data.shape, ( 10, 2, 3 ), 'incorrect view shape' )
+    pass
+
+  def test_attach_from_other_process( self ):
+    self.rbuffer.add_many( np.arange( 3 ), np.ones( ( 3, 2, 3 ) ) * 7 )
+
+    results = multiprocessing.Queue()
+    child = multiprocessing.Process( target = read_from_child,
+      args = ( self.name, results ) )
+    child.start()
+    sequence, ts, latest = results.get( True, 10 )
+    child.join()
+
+    self.assertEqual( sequence, 3, 'incorrect sequence in other process' )
+    self.assertEqual( ts[ :3 ], [ 2, 1, 0 ], 'incorrect timestamps' )
+    self.assertEqual( latest, [ [ 7 ] * 3 ] * 2, 'incorrect data' )
+    pass
+
+  def test_compact_dtype( self ):
+    self.assertTrue( self.rbuffer.reset( 10, 4, dtype = np.int16,
+      timestamp_dtype = np.int64 ) )
+    self.assertEqual( os.path.getsize( self.rbuffer._path ),
+      8 * ( pydacq.shared_buffer.HEADER_SIZE + 10 ) + 10 * 4 * 2,
+      'storage not compact' )
+    self.rbuffer.add_new( 10 ** 18 + 1, np.arange( 4, dtype = np.int16 ) )
+
+    reader = pydacq.shared_buffer.SharedRollingBuffer( self.name )
+    self.assertTrue( reader.attach(), 'could not attach' )
+    ts, data = reader.get_latest()
+    self.assertEqual( data.dtype, np.int16, 'dtype not shared' )
+    self.assertEqual( ts, 10 ** 18 + 1, 'nanoseconds not shared' )
+    self.assertTrue( np.array_equal( data, np.arange( 4 ) ) )
+    pass
+
+  def test_attach_missing_buffer( self ):
+    reader = pydacq.shared_buffer.SharedRollingBuffer( 'missing_%d' % os.getpid() )
+    self.assertFalse( reader.attach(), 'attached to a missing buffer' )
+    pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import numpy as np
+import pydacq.rolling_buffer
+import pydacq.spectral
+#test_spectral.py
+
+class TestWelchAnalyzer( unittest.TestCase ):
+  """
+  #############################################################################
+  streaming Welch power spectral density
+  """
+
+  def setUp( self ):
+    self.analyzer = pydacq.spectral.WelchAnalyzer()
+    self.analyzer.setup( segment_length = 64, overlap = 0.5, sample_rate = 100.0,
+      averages = 4, channels = 2 )
+    rng = np.random.RandomState( 0 )
+    times = np.arange( 1000 ) / 100.0
+    self.samples = np.column_stack( (
+      np.sin( 2 * np.pi * 12.5 * times ) + 0.1 * rng.randn( 1000 ),
+      rng.randn( 1000 ) ) )
+    pass
+
+  def welch( self, samples, segments ):
+    """
+    ---------------------------------------------------------------------------
+    reference estimate, mean of the periodograms of the last segments
+    """
+    window = 0.5 - 0.5 * np.cos( 2 * np.pi * np.arange( 64 ) / 64 )
+    starts = np.arange( 0, len( samples ) - 63, 32 )[ -segments: ]
+    psds = []
+    for start in starts:
+      segment = samples[ start:start + 64 ]
+      segment = segment - segment.mean( 0 )
+      spectrum = np.fft.rfft( segment * window[ :, None ], axis = 0 )
+      psd = np.abs( spectrum ) ** 2 / ( 100.0 * np.sum( window ** 2 ) )
+      psd[ 1:-1 ] *= 2
+      psds.append( psd )
+    return np.mean( psds, 0 )
+
+  def test_matches_welch( self ):
+    self.assertIsNone( self.analyzer.get_spectrum() )
+    # uneven batches, segments complete inside and across them
+    for start, end in ( ( 0, 10 ), ( 10, 300 ), ( 300, 301 ), ( 301, 1000 ) ):
+      self.analyzer.add_samples( self.samples[ start:end ] )
+
+    frequencies, psd, segments = self.analyzer.get_spectrum()
+    self.assertEqual( segments, 30 )
+    self.assertEqual( psd.shape, ( 33, 2 ) )
+    np.testing.assert_allclose( frequencies, np.fft.rfftfreq( 64, 0.01 ) )
+    np.testing.assert_allclose( psd, self.welch( self.samples, 4 ) )
+    self.assertEqual( frequencies[ np.argmax( psd[ :, 0 ] ) ], 12.5 )
+    self.assertFalse( psd.flags.writeable )
+
+  def test_fewer_segments_than_averages( self ):
+    self.analyzer.add_samples( self.samples[ :130 ] )
+    frequencies, psd, segments = self.analyzer.get_spectrum()
+    self.assertEqual( segments, 3 )
+    np.testing.assert_allclose( psd, self.welch( self.samples[ :130 ], 3 ) )
+
+  def test_follows_rolling_buffer( self ):
+    rbuffer = pydacq.rolling_buffer.RollingBuffer()
+    rbuffer.reset( 200, ( 2, ) )
+    self.analyzer.attach( rbuffer )
+    for start in range( 0, 1000, 50 ):
+      rbuffer.add_many( np.arange( start, start + 50 ) / 100.0,
+        self.samples[ start:start + 50 ] )
+      self.assertEqual( self.analyzer.update(), 50 )
+
+    frequencies, psd, segments = self.analyzer.get_spectrum()
+    np.testing.assert_allclose( psd, self.welch( self.samples, 4 ) )
+
+  def test_write_batch( self ):
+    self.analyzer.write_batch( list( self.samples ) )
+    frequencies, psd, segments = self.analyzer.get_spectrum()
+    np.testing.assert_allclose( psd, self.welch( self.samples, 4 ) )
+
+  def test_bad_settings( self ):
+    analyzer = pydacq.spectral.WelchAnalyzer()
+    self.assertFalse( analyzer.setup( window = 'unknown' ) )
+    self.assertFalse( analyzer.setup( overlap = 1.0 ) )
+    self.assertTrue( analyzer.setup() )
+    self.assertFalse( analyzer.add_samples( np.zeros( ( 10, 2 ) ) ) )